@@ -0,0 +1,223 @@
+"""
+ASGI version of the prediction API (same routes as api_service.py), served by uvicorn.
+
+Downloads run on their own thread pool, at most API_FETCH_CONCURRENCY at a time
+and each limited to API_FETCH_TIMEOUT seconds; feature building and
+predict_proba run on a separate pool of API_INFERENCE_WORKERS threads. The event
+loop itself never blocks. A download keeps its slot until its thread returns
+(the provider request itself times out after PROVIDER_TIMEOUT seconds), so
+downloads never queue behind hung ones and the timeout only counts the download.
+
+Run from the repository root:
+    uvicorn crypto_predictor.asgi_service:app --port 5001 --workers 4
+"""
+import asyncio
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+# uvicorn imports this module from the repository root: make both the crypto_predictor
+# package and its top-level modules (utils, model, ...) importable
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(PACKAGE_DIR))
+sys.path.append(PACKAGE_DIR)
+
+from crypto_predictor import service_core as core
+from crypto_predictor.model.predict_model import predict_latest_batch
+from crypto_predictor.utils.config import (SUPPORTED_COINS, INFERENCE_BACKEND, API_FETCH_CONCURRENCY,
+                                           API_FETCH_TIMEOUT, API_INFERENCE_WORKERS)
+
+fetch_pool = ThreadPoolExecutor(API_FETCH_CONCURRENCY, thread_name_prefix='fetch')
+inference_pool = ThreadPoolExecutor(API_INFERENCE_WORKERS, thread_name_prefix='inference')
+fetch_slots = asyncio.Semaphore(API_FETCH_CONCURRENCY)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the bundle before serving so /ready reflects it from the first request
+    await current_bundle()
+    yield
+    fetch_pool.shutdown(wait=False, cancel_futures=True)
+    inference_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title='Crypto prediction API', lifespan=lifespan)
+
+
+async def fetch_coin_data(coin_name):
+    """
+    Recent bars for one coin, downloaded off the event loop
+
+    Raises:
+        TimeoutError: The download took longer than API_FETCH_TIMEOUT seconds
+    """
+    ticker = SUPPORTED_COINS[coin_name]
+    loop = asyncio.get_running_loop()
+    await fetch_slots.acquire()
+    try:
+        download = loop.run_in_executor(fetch_pool, core.fetch_recent_data, [ticker])
+    except BaseException:
+        fetch_slots.release()
+        raise
+    # The slot is released when the thread finishes, not when the wait below times out
+    download.add_done_callback(_download_finished)
+    data = await asyncio.wait_for(asyncio.shield(download), API_FETCH_TIMEOUT)
+    return data.get(ticker)
+
+
+def _download_finished(download):
+    fetch_slots.release()
+    # Retrieve the error of a download nobody waits for any more
+    if not download.cancelled():
+        download.exception()
+
+
+async def predict_coin(coin_name, bundle):
+    """
+    Response payload for one coin, or None if no data could be fetched
+    """
+    data = await fetch_coin_data(coin_name)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_pool, core.predict_from_data, coin_name, data, bundle)
+
+
+async def current_bundle():
+    # The registry may reload the bundle from disk, which must not block the loop
+    return await asyncio.get_running_loop().run_in_executor(inference_pool, core.registry.get)
+
+
+async def coin_response(coin_name):
+    """
+    Cached, coalesced prediction for one coin (a mock one when no model is loaded)
+    """
+    bundle = await current_bundle()
+    if bundle is None:
+        data = await fetch_coin_data(coin_name)
+        if data is None or data.empty:
+            return None
+        loop = asyncio.get_running_loop()
+        df = await loop.run_in_executor(inference_pool, core.feature_frame, coin_name, data)
+        return core.mock_response(coin_name, df)
+
+    key, ttl = core.prediction_key(coin_name, bundle)
+    return await core.prediction_cache.get_or_compute_async(key, lambda: predict_coin(coin_name, bundle), ttl)
+
+
+def batch_responses(data, bundle):
+    """
+    Responses for the downloaded bars of several coins, predicted with a single
+    model invocation (runs on inference_pool)
+    """
+    frames = {name: core.feature_frame(name, bars, bundle) for name, bars in data.items()}
+    if bundle is None:
+        return {name: core.mock_response(name, df) for name, df in frames.items()}
+    results = predict_latest_batch(frames, bundle)
+    return {name: core.build_response(name, frames[name], *results[name]) for name in frames}
+
+
+def _error(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+
+@app.get('/api/predict/batch')
+async def get_batch_prediction(coins: str = None):
+    """
+    Predict every supported coin (or the comma-separated ?coins= subset): the
+    coins not cached are fetched concurrently and predicted in one pass
+    """
+    coin_names = [name.strip() for name in coins.split(',')] if coins else list(SUPPORTED_COINS)
+    unsupported = [name for name in coin_names if name not in SUPPORTED_COINS]
+    if unsupported:
+        return _error(f'Unsupported coins: {unsupported}. Supported coins are: {list(SUPPORTED_COINS.keys())}', 400)
+
+    bundle = await current_bundle()
+
+    # Coins predicted during the current candle come from the cache
+    cached = {}
+    keys = {}
+    if bundle is not None:
+        for name in coin_names:
+            keys[name] = core.prediction_key(name, bundle)
+            response = core.prediction_cache.get(keys[name][0])
+            if response is not None:
+                cached[name] = response
+    missing = [name for name in coin_names if name not in cached]
+
+    fetched = await asyncio.gather(*(fetch_coin_data(name) for name in missing), return_exceptions=True)
+    data = {}
+    errors = {}
+    for name, result in zip(missing, fetched):
+        if isinstance(result, asyncio.TimeoutError):
+            errors[name] = f'Timed out fetching data for {name}'
+        elif isinstance(result, Exception):
+            errors[name] = str(result)
+        elif result is None or result.empty:
+            errors[name] = f'Could not fetch data for {name}'
+        else:
+            data[name] = result
+
+    computed = {}
+    if data:
+        try:
+            computed = await asyncio.get_running_loop().run_in_executor(inference_pool, batch_responses, data, bundle)
+        except Exception as e:
+            traceback.print_exc()
+            return _error(str(e), 500)
+        if bundle is not None:
+            for name, response in computed.items():
+                core.prediction_cache.set(keys[name][0], response, keys[name][1])
+
+    predictions = [cached.get(name) or computed[name] for name in coin_names if name not in errors]
+
+    return {
+        'predictions': predictions,
+        'errors': errors,
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+@app.get('/api/predict/{coin_name}')
+async def get_prediction(coin_name: str):
+    if coin_name not in SUPPORTED_COINS:
+        return _error(f'Unsupported coin: {coin_name}. Supported coins are: {list(SUPPORTED_COINS.keys())}', 400)
+    try:
+        response = await coin_response(coin_name)
+    except asyncio.TimeoutError:
+        return _error(f'Timed out fetching data for {coin_name}', 504)
+    except Exception as e:
+        traceback.print_exc()
+        return _error(str(e), 500)
+    if response is None:
+        return _error(f'Could not fetch data for {coin_name}', 500)
+    return response
+
+
+@app.get('/api/cache/stats')
+async def get_cache_stats():
+    """
+    Prediction cache hit/miss counters of this worker
+    """
+    return core.prediction_cache.stats()
+
+
+@app.get('/ready')
+async def ready():
+    """
+    Readiness probe: 200 once a model bundle is loaded, 503 before that
+    """
+    bundle = await current_bundle()
+    if bundle is None:
+        return JSONResponse({'ready': False, 'error': 'No model bundle loaded'}, status_code=503)
+    return {'ready': True, 'modelVersion': bundle.version, 'backend': INFERENCE_BACKEND}
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, port=5001)
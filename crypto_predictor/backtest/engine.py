@@ -0,0 +1,135 @@
+"""
+Vectorised backtest engine.
+
+Every column of a position matrix is one strategy variant (a model, a threshold,
+a ticker, a cost assumption, ...). Equity curves and metrics for all variants are
+computed together in a few NumPy passes, with fees and slippage charged on every
+change of position.
+
+Sweep fee/slippage levels over a saved backtest from the crypto_predictor directory:
+    python -m backtest.engine reports/backtest_results.csv --fees 0 5 10 --slippage 0 5
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+METRICS = ['total_return', 'sharpe', 'max_drawdown', 'turnover', 'trades', 'win_rate']
+
+
+def signals_to_positions(signals, size=1.0):
+    """
+    Map 'Buy'/'Sell'/'Hold' signals to positions of +size/-size/0
+
+    Args:
+        signals: Array-like of signal strings, shape (T,) or (T, K)
+        size: Position size, a scalar or one value per column
+
+    Returns:
+        ndarray: float positions with the same shape as signals
+    """
+    signals = np.asarray(signals)
+    positions = np.zeros(signals.shape, dtype=np.float64)
+    positions[signals == 'Buy'] = 1.0
+    positions[signals == 'Sell'] = -1.0
+    return positions * size
+
+
+def run_backtest(returns, positions, fee_bps=0.0, slippage_bps=0.0, periods_per_year=365):
+    """
+    Backtest many position columns at once
+
+    Position t is held over the return from bar t to bar t+1 (the Next_Day_Return
+    convention used in main.backtest_performance).
+
+    Args:
+        returns: Next-period asset returns, shape (T,) shared by all columns or (T, K)
+        positions: Positions per bar and variant, shape (T,) or (T, K)
+        fee_bps: Fee per unit of turnover in basis points, scalar or shape (K,)
+        slippage_bps: Slippage per unit of turnover in basis points, scalar or shape (K,)
+        periods_per_year: Bars per year used to annualise the Sharpe ratio
+
+    Returns:
+        dict: 'strategy_returns' and 'equity' of shape (T, K), plus one array of
+              shape (K,) per metric in METRICS
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64)
+    if positions.ndim == 1:
+        positions = positions[:, None]
+    if returns.ndim == 1:
+        returns = returns[:, None]
+    returns = np.nan_to_num(returns)
+
+    # Turnover: size of every position change, entering from flat on the first bar
+    changes = np.abs(np.diff(positions, axis=0, prepend=0.0))
+    cost_rate = (np.asarray(fee_bps, dtype=np.float64) + np.asarray(slippage_bps, dtype=np.float64)) / 1e4
+
+    strategy_returns = positions * returns
+    strategy_returns -= changes * cost_rate
+    equity = np.cumprod(1.0 + strategy_returns, axis=0)
+
+    running_peak = np.maximum.accumulate(equity, axis=0)
+    max_drawdown = np.min(equity / running_peak - 1.0, axis=0)
+
+    mean = strategy_returns.mean(axis=0)
+    std = strategy_returns.std(axis=0, ddof=1) if len(strategy_returns) > 1 else np.zeros_like(mean)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods_per_year), 0.0)
+
+    in_market = positions != 0
+    trades = in_market.sum(axis=0)
+    wins = (in_market & (strategy_returns > 0)).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.where(trades > 0, wins / np.maximum(trades, 1), 0.0)
+
+    return {
+        'strategy_returns': strategy_returns,
+        'equity': equity,
+        'total_return': equity[-1] - 1.0 if len(equity) else np.zeros(positions.shape[1]),
+        'sharpe': sharpe,
+        'max_drawdown': max_drawdown,
+        'turnover': changes.sum(axis=0),
+        'trades': trades,
+        'win_rate': win_rate,
+    }
+
+
+def summarize(result, names=None):
+    """
+    Metrics of a run_backtest result as a DataFrame with one row per variant
+    """
+    summary = pd.DataFrame({metric: result[metric] for metric in METRICS})
+    if names is not None:
+        summary.index = list(names)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep costs and position sizes over a saved backtest')
+    parser.add_argument('path', help='CSV with Predicted_Signal and Next_Day_Return columns')
+    parser.add_argument('--fees', type=float, nargs='+', default=[0.0], help='Fee levels in basis points')
+    parser.add_argument('--slippage', type=float, nargs='+', default=[0.0], help='Slippage levels in basis points')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1.0], help='Position sizes')
+    parser.add_argument('--periods-per-year', type=int, default=365)
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.path, index_col=0)
+    base = signals_to_positions(data['Predicted_Signal'].to_numpy())
+
+    variants = [(fee, slip, size) for fee in args.fees for slip in args.slippage for size in args.sizes]
+    positions = base[:, None] * np.array([size for _, _, size in variants])
+    result = run_backtest(
+        data['Next_Day_Return'].to_numpy(),
+        positions,
+        fee_bps=np.array([fee for fee, _, _ in variants]),
+        slippage_bps=np.array([slip for _, slip, _ in variants]),
+        periods_per_year=args.periods_per_year,
+    )
+    names = [f"fee={fee:g}bps slip={slip:g}bps size={size:g}" for fee, slip, size in variants]
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_rows', 200):
+        print(summarize(result, names))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Cold start benchmark: time and peak memory for a fresh worker process to load
+the model bundle and make its first prediction, with the pickled estimators
+('sklearn') and with the NumPy-only export ('lite').
+
+Run from the crypto_predictor directory after training:
+    python -m benchmarks.bench_cold_start --model-dir model/saved
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from utils.config import MODEL_DIR
+
+# Executed in a fresh interpreter per backend; prints one JSON line
+WORKER = """
+import json, resource, sys, time
+started = time.perf_counter()
+import numpy as np
+from model.registry import load_bundle
+bundle = load_bundle(sys.argv[1], sys.argv[2])
+loaded = time.perf_counter()
+row = np.asarray(bundle.pipeline.fill_values, dtype=np.float32)[None, :]
+bundle.model.predict_proba(bundle.scaler.transform(row))
+done = time.perf_counter()
+print(json.dumps({
+    'bundle': type(bundle).__name__,
+    'load_seconds': loaded - started,
+    'first_prediction_seconds': done - started,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'imports_sklearn': 'sklearn' in sys.modules,
+    'imports_xgboost': 'xgboost' in sys.modules,
+}))
+"""
+
+
+def measure(model_dir, backend):
+    output = subprocess.run([sys.executable, '-c', WORKER, model_dir, backend],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model-dir', default=MODEL_DIR, help='Bundle directory to load')
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh processes per backend (best is reported)')
+    args = parser.parse_args()
+
+    for backend in ('sklearn', 'lite'):
+        runs = [measure(args.model_dir, backend) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run['first_prediction_seconds'])
+        print(f"{backend:<8} {best['bundle']:<12} load {best['load_seconds']:6.2f}s  "
+              f"first prediction {best['first_prediction_seconds']:6.2f}s  "
+              f"peak RSS {best['peak_rss_mb']:7.1f} MB  "
+              f"sklearn imported: {best['imports_sklearn']}  xgboost imported: {best['imports_xgboost']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Equivalence check and benchmark: features appended to the feature store
+(features/store.py) as bars arrive vs add_features over the whole history
+
+The history is stored once, then bars arrive in small batches whose last bar is
+a partial candle that the next batch corrects. The stored columns are compared
+with a full recomputation, and appends and pruned reads are timed against it.
+
+Run from the crypto_predictor directory:
+    python -m benchmarks.bench_feature_store --rows 1000000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_ohlcv
+from features.engineer_features import add_features
+from features.pipeline import add_derived
+from features.store import FeatureStore, STORED_COLUMNS, training_columns
+
+# Largest allowed difference, relative to the largest absolute value of the column
+# (the same bound as benchmarks/bench_indicators.py)
+TOLERANCE = 1e-7
+
+TICKER = 'BENCH'
+INTERVAL = '1m'
+
+
+def full_recompute(ohlcv):
+    return add_derived(add_features(ohlcv.copy(), compact=False, extended=True))
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Minute bars of history')
+    parser.add_argument('--appends', type=int, default=20, help='Batches of new bars')
+    parser.add_argument('--batch', type=int, default=30, help='Bars per batch')
+    args = parser.parse_args()
+
+    ohlcv = make_ohlcv(args.rows + args.appends * args.batch)
+    rng = np.random.default_rng(1)
+    # A few missing prices, which the store keeps raw for later appends
+    ohlcv.iloc[rng.integers(0, len(ohlcv), 5), 3] = np.nan
+    root = tempfile.mkdtemp()
+    try:
+        store = FeatureStore(root)
+        print(f"Feature store for {args.rows:,} minute bars, then {args.appends} batches of {args.batch}")
+
+        _, build_time = timed(store.update, TICKER, INTERVAL, ohlcv.iloc[:args.rows])
+        print(f"Initial build      {build_time:8.3f}s")
+
+        append_times = []
+        for i in range(args.appends):
+            end = args.rows + (i + 1) * args.batch
+            # Starts at the last bar of the previous batch, which was partial
+            batch = ohlcv.iloc[end - args.batch - 1:end].copy()
+            if i < args.appends - 1:
+                batch.iloc[-1, 3] *= 1.0005
+            append_times.append(timed(store.update, TICKER, INTERVAL, batch)[1])
+        reference, recompute_time = timed(full_recompute, ohlcv)
+        print(f"Append per batch   {np.mean(append_times):8.3f}s  (full recompute {recompute_time:.3f}s, "
+              f"{recompute_time / np.mean(append_times):.0f}x)")
+
+        stored, read_time = timed(store.read, TICKER, INTERVAL, compact=False)
+        _, training_time = timed(store.read, TICKER, INTERVAL, columns=training_columns(), compact=False)
+        _, latest_time = timed(store.read, TICKER, INTERVAL, start=ohlcv.index[-60],
+                               columns=training_columns() + ['Volatility'], compact=False)
+        print(f"Read all columns   {read_time:8.3f}s")
+        print(f"Read training set  {training_time:8.3f}s  ({len(training_columns())} of {len(STORED_COLUMNS)} columns)")
+        print(f"Read last 60 bars  {latest_time:8.3f}s")
+
+        if not stored.index.equals(reference.index):
+            raise SystemExit(f"Stored bars differ: {len(stored)} stored, {len(reference)} expected")
+        failures = []
+        for name in STORED_COLUMNS:
+            expected = reference[name].to_numpy(dtype=np.float64)
+            actual = stored[name].to_numpy(dtype=np.float64)
+            nan_mismatches = int((np.isnan(expected) != np.isnan(actual)).sum())
+            both = np.isfinite(expected) & np.isfinite(actual)
+            scale = max(np.abs(expected[both]).max(initial=0.0), 1e-12)
+            error = np.abs(expected[both] - actual[both]).max(initial=0.0) / scale
+            print(f"  {name:<17} max relative error {error:9.2e}  NaN mismatches {nan_mismatches}")
+            if not error <= TOLERANCE or nan_mismatches:
+                failures.append(name)
+        if failures:
+            raise SystemExit(f"Stored features differ from a full recomputation beyond {TOLERANCE:g} in: "
+                             f"{', '.join(failures)}")
+        print(f"All {len(STORED_COLUMNS)} stored columns within {TOLERANCE:g} of a full recomputation")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Equivalence check and benchmark: the NumPy indicator kernels of add_features
+(features/kernels.py) vs the pandas rolling/ewm implementation they replace
+
+The minute bars include flat stretches and missing closes, where pandas has
+special cases. The extended indicators are checked against pandas versions as
+well, and the labels derived from both indicator sets are compared. Rolling
+standard deviations are compared with an exact two-pass computation instead of
+pandas' rolling().std(), whose running update drifts by up to about 1e-5 of the
+column's scale on long minute series (more than the kernels do).
+
+Run from the crypto_predictor directory:
+    python -m benchmarks.bench_indicators --rows 2000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from features.kernels import compute_indicators, BASE_COLUMNS, EXTENDED_COLUMNS
+from labels.create_labels import label_signals
+from utils.config import (MA_SHORT_WINDOW, MA_LONG_WINDOW, RSI_WINDOW, MACD_FAST_SPAN, MACD_SLOW_SPAN,
+                          MACD_SIGNAL_SPAN, VOLATILITY_WINDOW, BOLLINGER_WINDOW, BOLLINGER_STD,
+                          ATR_WINDOW, OBV_WINDOW, STOCH_WINDOW, STOCH_SMOOTH)
+
+# Largest allowed difference, relative to the largest absolute value of the column
+# (below float32 resolution, in which add_features stores them with COMPACT_DTYPES)
+TOLERANCE = 1e-7
+
+
+def make_bars(rows, seed=0):
+    """
+    make_ohlcv minute bars with flat stretches (no trades) and a few missing closes
+    """
+    df = make_ohlcv(rows, seed)
+    rng = np.random.default_rng(seed + 1)
+    for start in rng.integers(0, rows - 100, max(1, rows // 5000)):
+        df.iloc[start:start + rng.integers(5, 80), :4] = df['Close'].iloc[start]
+    df.iloc[rng.integers(0, rows, max(1, rows // 100000)), 3] = np.nan
+    return df
+
+
+def exact_std(series, window):
+    """
+    Rolling sample standard deviation, two-pass over every window
+    """
+    values = series.to_numpy(dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window).std(axis=1, ddof=1)
+    return pd.Series(out, index=series.index)
+
+
+def pandas_std(series, window):
+    return series.rolling(window=window).std()
+
+
+def reference_indicators(df, extended=False, std=exact_std):
+    """
+    The indicators computed with pandas rolling/ewm, one pass per indicator
+    (timed with std=pandas_std, as add_features computed them before the kernels)
+    """
+    close = df['Close']
+    out = {
+        'MA14': close.rolling(window=MA_SHORT_WINDOW).mean(),
+        'MA50': close.rolling(window=MA_LONG_WINDOW).mean(),
+        'Price_Change': close.pct_change(),
+    }
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=RSI_WINDOW).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=RSI_WINDOW).mean()
+    out['RSI'] = 100 - (100 / (1 + gain / loss))
+    ema_fast = close.ewm(span=MACD_FAST_SPAN, adjust=False).mean()
+    ema_slow = close.ewm(span=MACD_SLOW_SPAN, adjust=False).mean()
+    out['MACD'] = ema_fast - ema_slow
+    out['MACD_Signal'] = out['MACD'].ewm(span=MACD_SIGNAL_SPAN, adjust=False).mean()
+    out['MACD_Hist'] = out['MACD'] - out['MACD_Signal']
+    out['Volatility'] = std(close, VOLATILITY_WINDOW)
+
+    if extended:
+        mean = close.rolling(window=BOLLINGER_WINDOW).mean()
+        band = BOLLINGER_STD * std(close, BOLLINGER_WINDOW)
+        out['BB_Upper'] = mean + band
+        out['BB_Lower'] = mean - band
+        previous = close.shift()
+        true_range = pd.concat([df['High'] - df['Low'], (df['High'] - previous).abs(),
+                                (df['Low'] - previous).abs()], axis=1).max(axis=1)
+        out['ATR'] = true_range.rolling(window=ATR_WINDOW).mean()
+        signed = np.sign(delta.fillna(0)) * df['Volume'].fillna(0)
+        out['OBV'] = signed.rolling(window=OBV_WINDOW).sum()
+        lowest = df['Low'].rolling(window=STOCH_WINDOW).min()
+        highest = df['High'].rolling(window=STOCH_WINDOW).max()
+        out['Stoch_K'] = 100 * (close - lowest) / (highest - lowest)
+        out['Stoch_D'] = out['Stoch_K'].rolling(window=STOCH_SMOOTH).mean()
+    return pd.DataFrame(out).replace([np.inf, -np.inf], np.nan)
+
+
+def compare(df, reference, values, columns):
+    """
+    Largest difference per column relative to the column's scale, and rows where
+    only one side is missing
+    """
+    results = {}
+    for name, column in zip(columns, values):
+        expected = reference[name].to_numpy(dtype=np.float64)
+        actual = np.where(np.isinf(column), np.nan, column)
+        nan_mismatches = int((np.isnan(expected) != np.isnan(actual)).sum())
+        both = ~np.isnan(expected) & ~np.isnan(actual)
+        scale = max(np.abs(expected[both]).max(initial=0.0), 1e-12)
+        results[name] = (np.abs(expected[both] - actual[both]).max(initial=0.0) / scale, nan_mismatches)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000, help='Minute bars')
+    args = parser.parse_args()
+
+    df = make_bars(args.rows)
+    print(f"Indicators for {args.rows:,} minute bars")
+    prices = [df[name].to_numpy(dtype=np.float64) for name in ('Close', 'High', 'Low', 'Volume')]
+
+    failures = []
+    for extended in (False, True):
+        label = 'extended' if extended else 'base'
+        start = time.perf_counter()
+        reference_indicators(df, extended, std=pandas_std)
+        reference_time = time.perf_counter() - start
+        reference = reference_indicators(df, extended)
+
+        start = time.perf_counter()
+        columns, values = compute_indicators(*prices, extended=extended)
+        kernel_time = time.perf_counter() - start
+        print(f"{label:<9} pandas {reference_time:7.3f}s  kernels {kernel_time:7.3f}s  "
+              f"speed-up {reference_time / kernel_time:4.1f}x")
+
+        for name, (error, nan_mismatches) in compare(df, reference, values, columns).items():
+            print(f"  {name:<13} max relative error {error:9.2e}  NaN mismatches {nan_mismatches}")
+            if not error <= TOLERANCE or nan_mismatches:
+                failures.append(name)
+
+    # Labels from the kernel indicators vs the pandas ones
+    reference = reference_indicators(df).fillna(0)
+    columns, values = compute_indicators(*prices)
+    np.copyto(values, 0.0, where=np.isnan(values))
+    kernel = pd.DataFrame(dict(zip(columns, values)), index=df.index)
+    reference['Close'] = kernel['Close'] = df['Close'].fillna(0)
+    agreement = (label_signals(kernel) == label_signals(reference)).mean()
+    print(f"Signal agreement: {agreement:.5%}")
+
+    if failures:
+        raise SystemExit(f"Kernels differ from pandas beyond {TOLERANCE:g} in: {', '.join(sorted(set(failures)))}")
+    print(f"All {len(BASE_COLUMNS) + len(EXTENDED_COLUMNS)} indicators within {TOLERANCE:g} of pandas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Equivalence check and benchmark: vectorised label_signals vs the row-wise label()
+
+Run from the crypto_predictor directory:
+    python -m benchmarks.bench_labels --rows 2000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from labels.create_labels import label, label_signals
+
+
+def make_indicator_frame(rows, seed=42):
+    """
+    Random indicator values covering every vote combination, ties and NaN warm-up rows
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.normal(0, 5, rows)
+    df = pd.DataFrame({
+        'Close': close,
+        'MA14': close + rng.normal(0, 3, rows),
+        'MA50': close + rng.normal(0, 3, rows),
+        'RSI': rng.uniform(0, 100, rows),
+        'MACD': rng.normal(0, 1, rows),
+        'MACD_Signal': rng.normal(0, 1, rows),
+    })
+    # Exact ties and missing values must resolve the same way in both implementations
+    df.loc[df.index[::97], 'MACD_Signal'] = df['MACD'].iloc[::97]
+    df.loc[df.index[::89], 'MA14'] = df['Close'].iloc[::89]
+    df.loc[df.index[:50], ['MA14', 'MA50', 'RSI']] = np.nan
+    df.loc[df.index[::101], 'RSI'] = 30.0
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000, help='Number of rows to label')
+    args = parser.parse_args()
+
+    df = make_indicator_frame(args.rows)
+    print(f"Labelling {args.rows:,} rows")
+
+    start = time.perf_counter()
+    vectorised = label_signals(df)
+    vectorised_time = time.perf_counter() - start
+    print(f"label_signals:      {vectorised_time:8.3f}s")
+
+    start = time.perf_counter()
+    row_wise = df.apply(label, axis=1).to_numpy()
+    row_wise_time = time.perf_counter() - start
+    print(f"apply(label):       {row_wise_time:8.3f}s")
+
+    mismatches = int((vectorised != row_wise).sum())
+    if mismatches:
+        raise SystemExit(f"label_signals disagrees with label() on {mismatches} rows")
+    print(f"Outputs identical; speed-up {row_wise_time / vectorised_time:,.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Memory benchmark for COMPACT_DTYPES: peak and final memory of fetch -> add_features
+-> generate_labels on synthetic minute bars for several tickers, in the default
+float64 mode and in compact mode, plus the compact mode's indicator error and
+label agreement against float64.
+
+Each mode runs in a fresh process so the peak RSS figures are independent.
+
+Run from the crypto_predictor directory:
+    python -m benchmarks.bench_memory --rows 1000000 --tickers 4
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks.synthetic import make_ohlcv
+from features.engineer_features import add_features
+from labels.create_labels import generate_labels
+from utils.compact import compact_ohlcv
+
+INDICATORS = ['MA14', 'MA50', 'Price_Change', 'RSI', 'MACD', 'MACD_Signal', 'MACD_Hist', 'Volatility']
+
+# Executed in a fresh interpreter per mode; prints one JSON line
+WORKER = """
+import json, resource, sys, time, tracemalloc
+from benchmarks.synthetic import make_ohlcv
+from features.engineer_features import add_features
+from labels.create_labels import generate_labels
+from utils.compact import compact_ohlcv
+rows, tickers, compact = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3] == 'compact'
+baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+started = time.perf_counter()
+frames = []
+for seed in range(tickers):
+    df = make_ohlcv(rows, seed)
+    if compact:
+        compact_ohlcv(df)
+    df = generate_labels(add_features(df, compact=compact), compact=compact)
+    frames.append(df)
+seconds = time.perf_counter() - started
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(json.dumps({
+    'seconds': seconds,
+    'frame_mb': sum(df.memory_usage(deep=True).sum() for df in frames) / 2**20,
+    'traced_peak_mb': peak / 2**20,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'baseline_rss_mb': baseline_rss / 1024,
+}))
+"""
+
+
+def measure(rows, tickers, mode):
+    output = subprocess.run([sys.executable, '-c', WORKER, str(rows), str(tickers), mode],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(rows):
+    """
+    Compact indicators and labels against the float64 pipeline on one ticker
+    """
+    reference = generate_labels(add_features(make_ohlcv(rows)), compact=False)
+    compact = generate_labels(add_features(compact_ohlcv(make_ohlcv(rows)), compact=True), compact=True)
+    errors = {}
+    for column in INDICATORS:
+        error = (compact[column].astype('float64') - reference[column]).abs().max()
+        errors[column] = (error, error / reference['Close'].abs().max())
+    agreement = (compact['Signal'].astype(str).to_numpy() == reference['Signal'].to_numpy()).mean()
+    return errors, agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Minute bars per ticker')
+    parser.add_argument('--tickers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{args.tickers} tickers x {args.rows:,} bars")
+    results = {mode: measure(args.rows, args.tickers, mode) for mode in ('float64', 'compact')}
+    for mode, result in results.items():
+        print(f"{mode:<8} {result['seconds']:6.2f}s  frames {result['frame_mb']:8.1f} MB  "
+              f"traced peak {result['traced_peak_mb']:8.1f} MB  "
+              f"peak RSS {result['peak_rss_mb'] - result['baseline_rss_mb']:8.1f} MB above start")
+    print(f"Compact frames use {results['compact']['frame_mb'] / results['float64']['frame_mb']:.0%} "
+          f"of the memory, traced peak {results['compact']['traced_peak_mb'] / results['float64']['traced_peak_mb']:.0%}")
+
+    errors, agreement = compare(args.rows)
+    print("\nMax absolute error vs float64 (and relative to max |Close|):")
+    for column, (error, relative) in errors.items():
+        print(f"  {column:<13} {error:10.3g}  {relative:10.3g}")
+    print(f"Signal agreement: {agreement:.4%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Prediction cache check: many concurrent "dashboard refreshes" for a few coins,
+against the in-memory backend and a Redis backend backed by a local fake client.
+Each (coin, candle) must be computed exactly once.
+
+Run from the crypto_predictor directory:
+    python -m benchmarks.bench_prediction_cache --requests 5000 --threads 32
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.prediction_cache import PredictionCache, MemoryBackend, RedisBackend, candle_window
+
+
+class FakeRedis:
+    """
+    The subset of the redis.Redis client used by RedisBackend, kept in a dict
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None or time.monotonic() >= entry[1]:
+                return None
+            return entry[0]
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._data[name] = (value.encode() if isinstance(value, str) else value,
+                                time.monotonic() + (ex if ex is not None else float('inf')))
+        return True
+
+
+def run(cache, coins, requests, threads, compute_seconds):
+    computed = {}
+    lock = threading.Lock()
+    candle_start, ttl = candle_window('1d')
+
+    def compute(coin):
+        with lock:
+            computed[coin] = computed.get(coin, 0) + 1
+        time.sleep(compute_seconds)  # download + features + inference
+        return {'coinName': coin, 'predictedTrend': 'Hold'}
+
+    def request(i):
+        coin = coins[i % len(coins)]
+        return cache.get_or_compute(f"{coin}|1d|{candle_start.isoformat()}", lambda: compute(coin), ttl)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(request, range(requests)))
+    return time.perf_counter() - started, computed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--coins', type=int, default=8)
+    parser.add_argument('--compute-seconds', type=float, default=0.5, help='Simulated cost of one uncached prediction')
+    args = parser.parse_args()
+
+    coins = [f"coin{i}" for i in range(args.coins)]
+    uncached = args.requests * args.compute_seconds / args.threads
+    print(f"Without a cache: about {uncached:.1f}s for {args.requests} requests "
+          f"({args.requests} downloads)")
+
+    for name, backend in (('memory', MemoryBackend()), ('redis (fake)', RedisBackend(FakeRedis()))):
+        cache = PredictionCache(backend)
+        seconds, computed = run(cache, coins, args.requests, args.threads, args.compute_seconds)
+        stats = cache.stats()
+        assert all(count == 1 for count in computed.values()), computed
+        print(f"{name:<13} {seconds:6.2f}s  computations {sum(computed.values())}  "
+              f"hits {stats['hits']}  coalesced {stats['coalesced']}  misses {stats['misses']}  "
+              f"hit rate {stats['hit_rate']:.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Equivalence check and benchmark: the incremental IndicatorState of
+features/streaming.py vs add_features over the whole history
+
+The state is built with from_history on the first part of the bars, then fed
+the rest one bar at a time, passing through to_json/from_json every
+--checkpoint-every bars as a restarted service would. Every indicator column,
+extended ones included, must stay within TOLERANCE of add_features(extended=True).
+The minute bars have the flat stretches and missing closes of bench_indicators.
+
+Run from the crypto_predictor directory:
+    python -m benchmarks.bench_streaming --rows 200000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_indicators import make_bars
+from features.engineer_features import add_features
+from features.kernels import BASE_COLUMNS, EXTENDED_COLUMNS
+from features.streaming import IndicatorState
+
+# Largest allowed difference, relative to the largest absolute value of the column
+# (as in bench_indicators; the running sums drift far less than this)
+TOLERANCE = 1e-7
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000, help='Minute bars')
+    parser.add_argument('--history', type=float, default=0.5, help='Share of the bars replayed by from_history')
+    parser.add_argument('--checkpoint-every', type=int, default=10_000,
+                        help='Bars between to_json/from_json round trips')
+    args = parser.parse_args()
+
+    df = make_bars(args.rows)
+    split = int(args.rows * args.history)
+    columns = BASE_COLUMNS + EXTENDED_COLUMNS
+    print(f"Streaming indicators for {args.rows:,} minute bars ({split:,} replayed as history)")
+
+    start = time.perf_counter()
+    reference = add_features(df.copy(), compact=False, extended=True)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    state = IndicatorState.from_history(df.iloc[:split], extended=True)
+    history_time = time.perf_counter() - start
+
+    bars = df[PRICE_COLUMNS].to_numpy(dtype=np.float64)[split:]
+    streamed = np.empty((len(columns), len(bars)))
+    round_trips = 0
+    start = time.perf_counter()
+    for i, values in enumerate(bars):
+        if i and i % args.checkpoint_every == 0:
+            state = IndicatorState.from_json(state.to_json())
+            round_trips += 1
+        row = state.update(dict(zip(PRICE_COLUMNS, values)))
+        streamed[:, i] = [row[name] for name in columns]
+    update_time = time.perf_counter() - start
+
+    print(f"add_features (all bars)  {batch_time:8.3f}s")
+    print(f"from_history             {history_time:8.3f}s")
+    print(f"update                   {update_time / max(len(bars), 1) * 1e6:8.1f}us per bar, "
+          f"{round_trips} JSON round trips")
+
+    failures = []
+    for name, actual in zip(columns, streamed):
+        expected = reference[name].to_numpy(dtype=np.float64)[split:]
+        scale = max(np.abs(expected).max(initial=0.0), 1e-12)
+        error = np.abs(expected - actual).max(initial=0.0) / scale
+        print(f"  {name:<13} max relative error {error:9.2e}")
+        if not error <= TOLERANCE:
+            failures.append(name)
+
+    if failures:
+        raise SystemExit(f"IndicatorState differs from add_features beyond {TOLERANCE:g} in: {', '.join(failures)}")
+    print(f"All {len(columns)} indicators within {TOLERANCE:g} of add_features")
+
+
+if __name__ == '__main__':
+    main()
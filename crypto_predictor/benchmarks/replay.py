@@ -0,0 +1,278 @@
+"""
+Market replay: stored bars of the SUPPORTED_COINS are replayed as if they were
+arriving live, and every coin is requested from the Flask prediction route
+(api_service.get_prediction) at each bar, with a local stand-in for yfinance
+
+The service runs on a replayed clock (service_core.clock) with its own OHLCV
+cache and feature store in a temporary directory, so the stored data and model
+are only read. Bars are replayed at --rate bars per second (0 for as fast as
+possible); the requests of a bar are sent by --concurrency client threads, and
+the next bar starts once they are answered. The feature store starts with the
+history before the replay, as training leaves it (--cold-store starts empty).
+Reports throughput, latency percentiles and how often the served predictions
+agree with main.evaluate_model's predictions for the same bars.
+
+Run from the crypto_predictor directory (with bars in the OHLCV cache and a
+trained bundle, or on synthetic bars with a small benchmark bundle):
+    python -m benchmarks.replay --bars 500 --rate 0 --concurrency 8
+    python -m benchmarks.replay --synthetic 3000 --bars 200
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_market, SyntheticFetcher
+from data.cache import OHLCVCache, interval_to_timedelta
+from features.engineer_features import add_features
+from features.store import FeatureStore, stored_features, training_columns
+from labels.create_labels import generate_labels
+from main import evaluate_model
+from model.registry import get_registry
+from utils.config import BASE_DIR, CACHE_DIR, MODEL_DIR, SUPPORTED_COINS, INTERVAL, INFERENCE_BACKEND
+
+# The services import the crypto_predictor package, which resolves from the repository root
+sys.path.append(os.path.dirname(BASE_DIR))
+
+from crypto_predictor import api_service, service_core  # noqa: E402
+from crypto_predictor.data.cache import OHLCVCache as ServiceOHLCVCache  # noqa: E402
+from crypto_predictor.features.store import FeatureStore as ServiceFeatureStore  # noqa: E402
+from crypto_predictor.model.registry import ModelRegistry  # noqa: E402
+from crypto_predictor.utils.prediction_cache import PredictionCache  # noqa: E402
+
+
+def serve_locally(frames, model_dir, workdir, store_history=None):
+    """
+    Point the prediction services at a stand-in for yfinance serving frames, with
+    an OHLCV cache and a feature store in workdir, and the bundle in model_dir
+
+    Args:
+        frames: dict ticker -> OHLCV bars the stand-in serves
+        store_history: Optional dict ticker -> bars to put in the feature store first
+
+    Returns:
+        A Flask test client of api_service.app
+    """
+    # The stand-in serves all of its bars, however old
+    service_core.ohlcv_cache = ServiceOHLCVCache(os.path.join(workdir, 'cache'), fetcher=SyntheticFetcher(frames),
+                                                 history_days={})
+    service_core.feature_store = ServiceFeatureStore(os.path.join(workdir, 'features'))
+    for ticker, bars in (store_history or {}).items():
+        service_core.feature_store.update(ticker, service_core.SERVICE_INTERVAL, bars)
+    api_service.registry = service_core.registry = ModelRegistry(model_dir, backend=INFERENCE_BACKEND)
+    api_service.prediction_cache = PredictionCache()
+    return api_service.app.test_client()
+
+
+def stored_history(coins):
+    """
+    Bars of the coins in the OHLCV cache, for the service interval
+    """
+    cache = OHLCVCache(CACHE_DIR)
+    history = {}
+    for coin in coins:
+        bars = cache.load(SUPPORTED_COINS[coin], INTERVAL)
+        if bars.empty:
+            print(f"No stored {INTERVAL} bars for {coin}, skipped")
+        else:
+            history[SUPPORTED_COINS[coin]] = bars
+    return history
+
+
+def synthetic_history(rows, coins):
+    """
+    make_market bars of the interval, up to the last closed one
+    """
+    step = interval_to_timedelta(INTERVAL)
+    market = make_market(rows, len(SUPPORTED_COINS), freq=step, end=pd.Timestamp.now() - step)
+    return {SUPPORTED_COINS[coin]: market[SUPPORTED_COINS[coin]] for coin in coins}
+
+
+def offline_predictions(history, model_dir, workdir):
+    """
+    main.evaluate_model's predictions per bar for each ticker, from features
+    computed over its whole history as in training
+
+    Returns:
+        dict: ticker -> Series of predicted actions indexed by bar
+    """
+    model = get_registry(model_dir).reload().model
+    store = FeatureStore(os.path.join(workdir, 'offline'))
+    predictions = {}
+    for ticker, bars in history.items():
+        df = generate_labels(stored_features(bars, ticker, INTERVAL, columns=training_columns(), store=store))
+        reports_dir = os.path.join(workdir, 'offline', ticker)
+        evaluate_model(df, model, model_dir, reports_dir)
+        results = pd.read_csv(os.path.join(reports_dir, 'backtest_results.csv'), index_col=0, parse_dates=True)
+        predictions[ticker] = results['Predicted_Signal']
+    return predictions
+
+
+def percentiles(latencies):
+    values = np.percentile(latencies, [50, 95, 99]) * 1000
+    return dict(zip(['p50_ms', 'p95_ms', 'p99_ms'], values.tolist()))
+
+
+def replay(client, history, times, rate, concurrency, requests_per_bar):
+    """
+    Request every coin with a bar at each of times, the service clock set to the
+    bar's close
+
+    Returns:
+        tuple: (list of (bar, coin, predictedTrend, abstained, seconds) per answered
+                request, number of failed requests, seconds, largest lag behind the rate)
+    """
+    step = interval_to_timedelta(INTERVAL)
+    coins = {ticker: coin for coin, ticker in SUPPORTED_COINS.items()}
+    now = {}
+    service_core.clock = lambda: now['time']
+
+    def request(bar, coin):
+        started = time.perf_counter()
+        response = client.get(f'/api/predict/{coin}')
+        seconds = time.perf_counter() - started
+        if response.status_code != 200:
+            return None
+        payload = response.get_json()
+        return bar, coin, payload['predictedTrend'], payload.get('abstained', False), seconds
+
+    answered = []
+    failed = 0
+    lag = 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, bar in enumerate(times):
+            if rate:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                lag = max(lag, -delay)
+            now['time'] = bar + step
+            requested = [coins[ticker] for ticker, bars in history.items() if bar in bars.index]
+            futures = [pool.submit(request, bar, coin) for _ in range(requests_per_bar) for coin in requested]
+            for future in futures:
+                result = future.result()
+                if result is None:
+                    failed += 1
+                else:
+                    answered.append(result)
+    seconds = time.perf_counter() - started
+    service_core.clock = None
+    return answered, failed, seconds, lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--coins', nargs='+', choices=list(SUPPORTED_COINS), default=list(SUPPORTED_COINS))
+    parser.add_argument('--bars', type=int, default=500, help='Most recent bars to replay')
+    parser.add_argument('--rate', type=float, default=0, help='Bars per second (0 for as fast as possible)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads sending requests')
+    parser.add_argument('--requests-per-bar', type=int, default=1, help='Requests per coin and bar')
+    parser.add_argument('--cold-store', action='store_true', help='Start with an empty feature store')
+    parser.add_argument('--synthetic', type=int, metavar='ROWS',
+                        help='Replay ROWS synthetic bars per coin instead of the stored ones')
+    parser.add_argument('--model-dir', help='Bundle to serve (default MODEL_DIR, or a small benchmark '
+                                            'bundle trained on the bars with --synthetic)')
+    parser.add_argument('--min-agreement', type=float, help='Exit with status 1 below this agreement (0-1)')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    parser.add_argument('--verbose', action='store_true', help="Show the services' own output")
+    args = parser.parse_args()
+
+    history = synthetic_history(args.synthetic, args.coins) if args.synthetic else stored_history(args.coins)
+    if not history:
+        raise SystemExit("No bars to replay (fetch some first, or use --synthetic)")
+    # The replayed bars, plus the one before them, which warms the service up
+    times = pd.DatetimeIndex(sorted(set().union(*(bars.index for bars in history.values()))))[-(args.bars + 1):]
+
+    workdir = tempfile.mkdtemp(prefix='replay-')
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                (contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)):
+            model_dir = args.model_dir or MODEL_DIR
+            if args.synthetic and not args.model_dir:
+                from benchmarks.suite import write_bundle
+                model_dir = os.path.join(workdir, 'model')
+                write_bundle(generate_labels(add_features(next(iter(history.values())).copy())), model_dir)
+            if get_registry(model_dir).reload() is None:
+                raise SystemExit(f"No model bundle in {model_dir} (train first, or use --synthetic)")
+            offline = offline_predictions(history, model_dir, workdir)
+
+            before = None if args.cold_store else {ticker: bars[bars.index < times[0]]
+                                                   for ticker, bars in history.items()}
+            client = serve_locally(history, model_dir, workdir, before)
+            replay(client, history, times[:1], 0, args.concurrency, 1)
+            answered, failed, seconds, lag = replay(client, history, times[1:], args.rate, args.concurrency,
+                                                    args.requests_per_bar)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = np.array([result[4] for result in answered])
+    results = {
+        'interval': INTERVAL,
+        'bars': len(times) - 1,
+        'coins': [coin for coin in args.coins if SUPPORTED_COINS[coin] in history],
+        'rate': args.rate,
+        'concurrency': args.concurrency,
+        'requests': len(answered) + failed,
+        'failed': failed,
+        'seconds': seconds,
+        'requests_per_second': len(answered) / seconds,
+        'bars_per_second': (len(times) - 1) / seconds,
+        'max_lag_seconds': lag,
+        'latency': {**percentiles(latencies), 'mean_ms': latencies.mean() * 1000, 'max_ms': latencies.max() * 1000},
+        'prediction_cache': api_service.prediction_cache.stats(),
+    }
+
+    # Served predictions against evaluate_model's, per coin
+    agreement = {}
+    for ticker, predictions in offline.items():
+        coin = next(name for name, symbol in SUPPORTED_COINS.items() if symbol == ticker)
+        served = [(trend, abstained, predictions.get(bar)) for bar, name, trend, abstained, _ in answered
+                  if name == coin]
+        compared = [(trend, expected) for trend, abstained, expected in served if expected is not None]
+        decided = [(trend, expected) for trend, abstained, expected in served if expected is not None and not abstained]
+        agreement[coin] = {
+            'compared': len(compared),
+            'agreement': float(np.mean([trend == expected for trend, expected in compared])) if compared else None,
+            'abstained': sum(abstained for _, abstained, _ in served),
+            'agreement_excluding_abstained': (float(np.mean([trend == expected for trend, expected in decided]))
+                                              if decided else None),
+        }
+    compared = sum(coin['compared'] for coin in agreement.values())
+    results['agreement'] = (sum(coin['agreement'] * coin['compared'] for coin in agreement.values() if coin['compared'])
+                            / compared if compared else None)
+    results['agreement_per_coin'] = agreement
+
+    print(f"Replayed {results['bars']} {INTERVAL} bars of {len(history)} coins: {results['requests']} requests "
+          f"({failed} failed) in {seconds:.2f}s, concurrency {args.concurrency}, "
+          f"rate {args.rate or 'as fast as possible'}")
+    print(f"Throughput  {results['requests_per_second']:8.1f} requests/s  {results['bars_per_second']:8.2f} bars/s"
+          + (f"  (at most {lag:.3f}s behind the rate)" if args.rate else ""))
+    print("Latency     " + "  ".join(f"{name[:-3]} {value:7.1f} ms" for name, value in results['latency'].items()))
+    print(f"Prediction cache: {results['prediction_cache']}")
+    print("Agreement with evaluate_model:")
+    for coin, result in agreement.items():
+        if result['compared']:
+            print(f"  {coin:<13} {result['agreement']:8.2%} of {result['compared']} requests  "
+                  f"({result['abstained']} abstained)")
+    if results['agreement'] is not None:
+        print(f"  {'All':<13} {results['agreement']:8.2%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.min_agreement is not None and (results['agreement'] is None or results['agreement'] < args.min_agreement):
+        raise SystemExit(f"Agreement below {args.min_agreement:g}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Benchmark suite: time and peak memory of every pipeline stage on synthetic OHLCV
+bars (benchmarks/synthetic.py), saved per commit so runs can be compared
+
+Stages: add_features, generate_labels, the training feature matrix (the
+preparation train() does before the searches), predict_action,
+backtest_performance, and the Flask /api/predict/<coin> route with a synthetic
+fetcher in place of yfinance. Every stage and size runs in a fresh process; the
+time is the best of --repeat runs, the memory the tracemalloc peak of one more
+run. Results are written to reports/benchmarks/<commit>.json, and --compare
+exits with status 1 if a stage got slower or uses more memory than --threshold
+times the baseline.
+
+Run from the crypto_predictor directory:
+    python -m benchmarks.suite --rows 1000 100000 1000000 --tickers 4
+    python -m benchmarks.suite --compare reports/benchmarks/<baseline commit>.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import cached_property
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from benchmarks.synthetic import make_market
+from features.engineer_features import add_features
+from labels.create_labels import generate_labels
+from main import backtest_performance
+from model.artifact_store import fingerprint
+from model.export import export_model
+from model.predict_model import predict_action
+from model.registry import write_manifest, load_bundle, BUNDLE_FILES, OPTIONAL_BUNDLE_FILES
+from model.train_model import training_matrix, training_params
+from utils import log_sink
+from utils.config import (REPORTS_DIR, SUPPORTED_COINS, SEARCH_MODE, SEARCH_TIME_BUDGET, RANDOM_STATE,
+                          COMPACT_DTYPES, EXTENDED_INDICATORS, INFERENCE_BACKEND, INTERVAL)
+
+# Bars per ticker of the stages that do not depend on the history length (the API
+# route), and the most recent bars the benchmark model bundle is trained on
+BUNDLE_ROWS = 5000
+
+# Changes smaller than these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_MEGABYTES = 1.0
+
+# Executed in a fresh interpreter per stage and size; prints one JSON line
+WORKER = """
+import json, sys
+from benchmarks.suite import measure_stage
+print(json.dumps(measure_stage(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))))
+"""
+
+
+class Inputs:
+    """
+    Synthetic bars of a stage run and what earlier stages make of them, computed
+    once per process and outside the measurements
+    """
+
+    def __init__(self, rows, tickers, workdir):
+        self.market = make_market(rows, tickers)
+        self.workdir = workdir
+
+    @cached_property
+    def features(self):
+        return {ticker: add_features(df.copy()) for ticker, df in self.market.items()}
+
+    @cached_property
+    def labelled(self):
+        return {ticker: generate_labels(df.copy()) for ticker, df in self.features.items()}
+
+    @cached_property
+    def model_dir(self):
+        model_dir = os.path.join(self.workdir, 'model')
+        write_bundle(next(iter(self.labelled.values())), model_dir)
+        return model_dir
+
+
+def write_bundle(df, model_dir):
+    """
+    Write a small model bundle (a random forest on the last BUNDLE_ROWS rows of
+    df, with the NumPy-only export) so the inference stages run without training
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    X, y, pipeline = training_matrix(df.iloc[-BUNDLE_ROWS:])
+    label_encoder = LabelEncoder()
+    y_encoded = label_encoder.fit_transform(y)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    model = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=RANDOM_STATE, n_jobs=1)
+    model.fit(X_scaled, y_encoded)
+
+    joblib.dump(model, os.path.join(model_dir, BUNDLE_FILES['model']))
+    joblib.dump(scaler, os.path.join(model_dir, BUNDLE_FILES['scaler']))
+    joblib.dump(label_encoder, os.path.join(model_dir, BUNDLE_FILES['label_encoder']))
+    with open(os.path.join(model_dir, BUNDLE_FILES['features']), 'w') as f:
+        f.writelines(f"{feature}\n" for feature in pipeline.features)
+    pipeline.save(os.path.join(model_dir, BUNDLE_FILES['pipeline']))
+    export_model(model, scaler, label_encoder, pipeline, os.path.join(model_dir, OPTIONAL_BUNDLE_FILES['lite']),
+                 X_check=X_scaled[-100:])
+    return write_manifest(model_dir)
+
+
+def stage_add_features(inputs, requests):
+    frames = [df.copy() for df in inputs.market.values()]
+    return lambda: [add_features(df) for df in frames]
+
+
+def stage_generate_labels(inputs, requests):
+    frames = [df.copy() for df in inputs.features.values()]
+    return lambda: [generate_labels(df) for df in frames]
+
+
+def stage_training_matrix(inputs, requests):
+    frames = list(inputs.labelled.values())
+    params = training_params(SEARCH_MODE, SEARCH_TIME_BUDGET)
+
+    def run():
+        # train(): feature matrix and fingerprint; fit_bundle(): label encoding and scaling
+        for df in frames:
+            X, y, pipeline = training_matrix(df)
+            fingerprint(X, y, pipeline.features, params)
+            LabelEncoder().fit_transform(y)
+            StandardScaler().fit_transform(X)
+    return run
+
+
+def stage_predict_action(inputs, requests):
+    frames = list(inputs.labelled.values())
+    bundle = load_bundle(inputs.model_dir)
+    return lambda: [predict_action(None, df, bundle=bundle) for df in frames]
+
+
+def stage_backtest_performance(inputs, requests):
+    runs = [(df, df['Signal'].astype(str).to_numpy()) for df in inputs.labelled.values()]
+    return lambda: [backtest_performance(df, predictions, reports_dir=inputs.workdir)
+                    for df, predictions in runs]
+
+
+def stage_api_get_prediction(inputs, requests):
+    """
+    `requests` uncached GET /api/predict/<coin> requests, with the downloads served
+    by a SyntheticFetcher through an OHLCV cache and a feature store in the work
+    directory (warmed up first, as in a running service)
+    """
+    from benchmarks.replay import serve_locally
+    from crypto_predictor import api_service
+    from crypto_predictor.data.cache import default_end, interval_to_timedelta
+    from crypto_predictor.utils.prediction_cache import PredictionCache
+
+    # Bars up to the end of the range the service requests
+    step = interval_to_timedelta(INTERVAL)
+    end = pd.Timestamp(default_end(INTERVAL)) - step
+    coins = [name for name, ticker in SUPPORTED_COINS.items() if ticker in inputs.market]
+    frames = make_market(BUNDLE_ROWS, len(coins), freq=step, end=end)
+    client = serve_locally(frames, inputs.model_dir, inputs.workdir)
+
+    def request(coin):
+        api_service.prediction_cache = PredictionCache()
+        response = client.get(f'/api/predict/{coin}')
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/predict/{coin} returned {response.status_code}: {response.get_json()}")
+
+    for coin in coins:
+        request(coin)
+    return lambda: [request(coins[i % len(coins)]) for i in range(requests)]
+
+
+# Stage name -> (set-up returning the callable to measure, whether it runs per --rows size)
+STAGES = {
+    'add_features': (stage_add_features, True),
+    'generate_labels': (stage_generate_labels, True),
+    'training_matrix': (stage_training_matrix, True),
+    'predict_action': (stage_predict_action, True),
+    'backtest_performance': (stage_backtest_performance, True),
+    'api_get_prediction': (stage_api_get_prediction, False),
+}
+
+
+def measure_stage(stage, rows, tickers, repeat, requests):
+    """
+    Time (best of repeat runs) and tracemalloc peak (one more run) of a stage,
+    with its inputs prepared beforehand
+    """
+    setup, sized = STAGES[stage]
+    workdir = tempfile.mkdtemp(prefix='bench-suite-')
+    try:
+        # Predictions are logged to the work directory, not the repository's log
+        log_sink._default_sink = log_sink.PredictionLogSink(log_sink.make_backend(log_dir=workdir))
+        inputs = Inputs(rows if sized else BUNDLE_ROWS, tickers, workdir)
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        times = []
+        for _ in range(repeat):
+            run = setup(inputs, requests)
+            gc.collect()
+            started = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - started)
+
+        run = setup(inputs, requests)
+        gc.collect()
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        log_sink._default_sink.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'stage': stage,
+        'rows': rows if sized else None,
+        'tickers': tickers,
+        'items': rows * tickers if sized else requests,
+        'seconds': min(times),
+        'traced_peak_mb': peak / 2**20,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'baseline_rss_mb': baseline_rss / 1024,
+    }
+
+
+def measure(stage, rows, tickers, repeat, requests):
+    output = subprocess.run([sys.executable, '-c', WORKER, stage, str(rows), str(tickers), str(repeat), str(requests)],
+                            capture_output=True, text=True)
+    if output.returncode != 0:
+        raise SystemExit(f"Stage {stage} ({rows} rows) failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """
+    Commit and machine the results were measured on
+    """
+    status = git('status', '--porcelain')
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD') or 'unknown',
+        'dirty': bool(status),
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'versions': {'numpy': np.__version__, 'pandas': pd.__version__, 'sklearn': sklearn.__version__},
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'config': {'COMPACT_DTYPES': COMPACT_DTYPES, 'EXTENDED_INDICATORS': EXTENDED_INDICATORS,
+                   'INFERENCE_BACKEND': INFERENCE_BACKEND, 'INTERVAL': INTERVAL},
+    }
+
+
+def regressions(results, baseline, threshold):
+    """
+    Results slower or using more memory than threshold times the baseline run
+    of the same stage, rows and tickers
+    """
+    previous = {(r['stage'], r['rows'], r['tickers']): r for r in baseline['results']}
+    found = []
+    for result in results:
+        before = previous.get((result['stage'], result['rows'], result['tickers']))
+        if before is None:
+            continue
+        for metric, minimum in (('seconds', MIN_SECONDS), ('traced_peak_mb', MIN_MEGABYTES)):
+            if result[metric] > threshold * before[metric] and result[metric] - before[metric] > minimum:
+                found.append((result, metric, before[metric]))
+    return found
+
+
+def describe(result):
+    size = f"{result['rows']:,} rows" if result['rows'] is not None else f"{result['items']} requests"
+    return f"{result['stage']:<21} {size:>16}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100_000, 1_000_000],
+                        help='Minute bars per ticker (1k to 10M)')
+    parser.add_argument('--tickers', type=int, default=2)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (best is reported)')
+    parser.add_argument('--requests', type=int, default=50, help='API requests per timed run')
+    parser.add_argument('--output', help='Results file (default reports/benchmarks/<commit>.json)')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Slowdown or memory growth that counts as a regression')
+    args = parser.parse_args()
+
+    run = environment()
+    print(f"Commit {run['commit']}{' (uncommitted changes)' if run['dirty'] else ''}, "
+          f"{args.tickers} tickers, {run['cpus']} CPUs")
+    results = []
+    for stage in args.stages:
+        for rows in (args.rows if STAGES[stage][1] else [0]):
+            result = measure(stage, rows, args.tickers, args.repeat, args.requests)
+            results.append(result)
+            print(f"{describe(result)}  {result['seconds']:9.4f}s  "
+                  f"{result['seconds'] / result['items'] * 1e6:9.2f} us/item  "
+                  f"traced peak {result['traced_peak_mb']:8.1f} MB  "
+                  f"peak RSS {result['peak_rss_mb']:8.1f} MB")
+    run['results'] = results
+
+    output = args.output or os.path.join(REPORTS_DIR, 'benchmarks',
+                                         f"{run['commit']}{'-dirty' if run['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.threshold)
+        print(f"\nCompared with {baseline['commit']} (threshold {args.threshold:g}x):")
+        for result, metric, before in found:
+            print(f"  {describe(result)}  {metric} {before:.4g} -> {result[metric]:.4g} "
+                  f"({result[metric] / before:.2f}x)")
+        if found:
+            raise SystemExit(f"{len(found)} regression(s)")
+        print("  No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Deterministic synthetic OHLCV data for the benchmarks: random-walk bars for any
+number of tickers, and a stand-in for the yfinance fetcher of data/cache.py
+that serves them. The same rows, seed and interval always give the same bars.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.config import SUPPORTED_COINS
+
+
+def make_ohlcv(rows, seed=0, freq='min', start='2020-01-01', end=None):
+    """
+    Random-walk bars with whole-unit volumes, as fetch_crypto_data returns them
+
+    Args:
+        rows: Number of bars
+        seed: Random seed (one per ticker)
+        freq: pandas frequency of the bars ('min', 'h', 'D', ...)
+        start: First bar, unless end is given
+        end: Last bar (the bars then lead up to it)
+    """
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, rows)))
+    open_ = close * np.exp(rng.normal(0, 0.0005, rows))
+    spread = np.abs(rng.normal(0, 0.0005, rows))
+    if end is not None:
+        index = pd.date_range(end=pd.Timestamp(end).floor(freq), periods=rows, freq=freq, name='Date')
+    else:
+        index = pd.date_range(start, periods=rows, freq=freq, name='Date')
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Close': close,
+        'Volume': rng.integers(0, 10**9, rows).astype(float),
+    }, index=index)
+
+
+def synthetic_tickers(count):
+    """
+    Ticker symbols for count tickers: the SUPPORTED_COINS tickers first, then SYN<i>-USD
+    """
+    tickers = list(SUPPORTED_COINS.values())[:count]
+    return tickers + [f"SYN{i}-USD" for i in range(len(tickers), count)]
+
+
+def make_market(rows, tickers, freq='min', start='2020-01-01', end=None):
+    """
+    make_ohlcv bars for several tickers, the i-th ticker generated with seed i
+
+    Returns:
+        dict: ticker -> OHLCV DataFrame
+    """
+    return {ticker: make_ohlcv(rows, seed, freq, start, end)
+            for seed, ticker in enumerate(synthetic_tickers(tickers))}
+
+
+class SyntheticFetcher:
+    """
+    Stand-in for data.cache.yfinance_fetcher that serves slices of fixed frames
+    (pass it as OHLCVCache(fetcher=...))
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.requests = 0
+
+    def __call__(self, tickers, start, end, interval):
+        self.requests += 1
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        result = {}
+        for ticker in tickers:
+            frame = self.frames.get(ticker)
+            if frame is None:
+                continue
+            first = frame.index.searchsorted(start, side='left')
+            last = frame.index.searchsorted(end, side='left')
+            result[ticker] = frame.iloc[first:last].copy()
+        return result
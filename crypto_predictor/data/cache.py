@@ -0,0 +1,357 @@
+import json
+import os
+import threading
+from contextlib import ExitStack
+from datetime import datetime
+
+import pandas as pd
+
+from utils.config import CACHE_DIR, PROVIDER_MAX_REQUEST_DAYS, PROVIDER_HISTORY_DAYS, PROVIDER_TIMEOUT
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# pandas understands '1d', '1h', '5m' etc. directly; the calendar intervals need a fixed length
+CALENDAR_INTERVALS = {
+    '1wk': pd.Timedelta(days=7),
+    '1mo': pd.Timedelta(days=31),
+    '3mo': pd.Timedelta(days=92),
+}
+
+# Merge the part files of a ticker back into one once there are more than this many
+MAX_PARTS = 32
+
+
+def interval_to_timedelta(interval):
+    """
+    Convert a Yahoo Finance interval string ('1m', '1h', '1d', '1wk', ...) to a Timedelta
+    """
+    if interval in CALENDAR_INTERVALS:
+        return CALENDAR_INTERVALS[interval]
+    return pd.Timedelta(interval)
+
+
+def is_intraday(interval):
+    return interval not in CALENDAR_INTERVALS and pd.Timedelta(interval) < pd.Timedelta(days=1)
+
+
+def default_end(interval, now=None):
+    """
+    End of the range to load when none is given: today's date for daily and
+    longer bars (the forming daily candle is left out), the current time for
+    intraday bars
+
+    Args:
+        interval: Yahoo Finance bar interval
+        now: Time to use instead of the current time (naive times are UTC)
+    """
+    if is_intraday(interval):
+        now = pd.Timestamp.now(tz='UTC') if now is None else _as_timestamp(now, 'UTC')
+        return now.floor('min').tz_convert(None)
+    return (datetime.now() if now is None else pd.Timestamp(now)).strftime('%Y-%m-%d')
+
+
+def _normalize(data, ticker):
+    """
+    Reduce a downloaded frame to flat OHLCV columns for a single ticker
+    """
+    if isinstance(data.columns, pd.MultiIndex):
+        if ticker in data.columns.get_level_values(0):
+            data = data[ticker]
+        elif ticker in data.columns.get_level_values(-1):
+            data = data.xs(ticker, axis=1, level=-1)
+        else:
+            data.columns = [col[0] for col in data.columns]
+    data = data[OHLCV_COLUMNS].dropna(how='all')
+    data.index.name = 'Date'
+    return data
+
+
+def yfinance_fetcher(tickers, start, end, interval):
+    """
+    Default fetcher: one (multi-ticker) Yahoo Finance download
+
+    Args:
+        tickers: List of ticker symbols
+        start, end: Range to download (end is exclusive)
+        interval: Yahoo Finance bar interval
+
+    Returns:
+        dict: ticker -> DataFrame with OHLCV columns
+    """
+    import yfinance as yf
+
+    data = yf.download(tickers, start=start, end=end, interval=interval,
+                       group_by='ticker', progress=False, timeout=PROVIDER_TIMEOUT)
+    if data is None or data.empty:
+        return {}
+    return {ticker: _normalize(data, ticker) for ticker in tickers}
+
+
+def _as_timestamp(value, tz):
+    """
+    Convert a date string/datetime to a Timestamp comparable with an index in timezone `tz`
+    """
+    ts = pd.Timestamp(value)
+    if tz is not None and ts.tzinfo is None:
+        return ts.tz_localize(tz)
+    if tz is None and ts.tzinfo is not None:
+        return ts.tz_convert(None)
+    return ts
+
+
+class OHLCVCache:
+    """
+    On-disk Parquet cache of OHLCV bars, keyed by ticker and interval.
+
+    Each top-up is written as a new part file under <cache_dir>/<interval>/<ticker>/,
+    so only the missing tail of the history ever goes over the network. The fetcher
+    is injectable so the cache can run against a local stand-in instead of yfinance.
+
+    Ranges longer than the provider serves in one request are downloaded in chunks,
+    each stored as soon as it arrives, in an order that keeps the cached range
+    contiguous (new bars oldest first, older history newest first). A load that
+    fails part-way therefore resumes from the last stored chunk on the next call.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, fetcher=None, max_request_days=None, history_days=None):
+        self.cache_dir = cache_dir
+        self.fetcher = fetcher or yfinance_fetcher
+        self.max_request_days = PROVIDER_MAX_REQUEST_DAYS if max_request_days is None else max_request_days
+        self.history_days = PROVIDER_HISTORY_DAYS if history_days is None else history_days
+        self._frames = {}
+        self._lock = threading.Lock()
+        self._ticker_locks = {}
+
+    def _locked(self, tickers, interval):
+        """
+        Hold the locks of several (ticker, interval) series, taken in sorted order
+        so that concurrent calls for overlapping tickers cannot deadlock; calls for
+        other tickers are not blocked
+        """
+        stack = ExitStack()
+        with self._lock:
+            locks = [self._ticker_locks.setdefault((ticker, interval), threading.Lock())
+                     for ticker in sorted(set(tickers))]
+        for lock in locks:
+            stack.enter_context(lock)
+        return stack
+
+    def _dir(self, ticker, interval):
+        return os.path.join(self.cache_dir, interval, ticker)
+
+    def _parts(self, ticker, interval):
+        path = self._dir(ticker, interval)
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.parquet'))
+
+    def _read_meta(self, ticker, interval):
+        try:
+            with open(os.path.join(self._dir(ticker, interval), 'meta.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, ticker, interval, meta):
+        os.makedirs(self._dir(ticker, interval), exist_ok=True)
+        path = os.path.join(self._dir(ticker, interval), 'meta.json')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def load(self, ticker, interval):
+        """
+        Read everything cached for a ticker/interval (empty frame if nothing is cached)
+        """
+        parts = self._parts(ticker, interval)
+        key = (ticker, interval)
+        cached = self._frames.get(key)
+        if cached is not None and cached[0] == parts:
+            return cached[1]
+
+        frames = []
+        for part in parts:
+            try:
+                frames.append(pd.read_parquet(part))
+            except (OSError, ValueError):
+                # Part was removed by a concurrent compaction; the merged file replaces it
+                continue
+        if frames:
+            frame = pd.concat(frames) if len(frames) > 1 else frames[0]
+            del frames
+            # Chunks overlap by the re-fetched last bar; only copy when there is something to fix
+            duplicated = frame.index.duplicated(keep='last')
+            if duplicated.any():
+                frame = frame[~duplicated]
+            if not frame.index.is_monotonic_increasing:
+                frame = frame.sort_index()
+        else:
+            frame = pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+
+        self._frames[key] = (parts, frame)
+        return frame
+
+    def store(self, ticker, interval, data):
+        """
+        Append newly fetched bars as a part file
+        """
+        if data is None or data.empty:
+            return
+        path = self._dir(ticker, interval)
+        os.makedirs(path, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        part = os.path.join(path, f"part-{stamp}-{os.getpid()}.parquet")
+        data[OHLCV_COLUMNS].to_parquet(f"{part}.tmp", engine='pyarrow')
+        os.replace(f"{part}.tmp", part)
+
+        if len(self._parts(ticker, interval)) > MAX_PARTS:
+            self.compact(ticker, interval)
+
+    def compact(self, ticker, interval):
+        """
+        Merge all part files of a ticker/interval into one
+        """
+        parts = self._parts(ticker, interval)
+        frame = self.load(ticker, interval)
+        merged = os.path.join(self._dir(ticker, interval), f"part-{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}.parquet")
+        frame.to_parquet(f"{merged}.tmp", engine='pyarrow')
+        os.replace(f"{merged}.tmp", merged)
+        for part in parts:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+
+    def _missing_ranges(self, ticker, interval, start, end):
+        """
+        Work out which head/tail ranges of [start, end) are not in the cache yet
+
+        Returns:
+            tuple: (head, tail) ranges, either of which may be None
+        """
+        cached = self.load(ticker, interval)
+        if cached.empty:
+            return None, (start, end)
+
+        tz = cached.index.tz
+        step = interval_to_timedelta(interval)
+        first, last = cached.index[0], cached.index[-1]
+        covered_from = self._read_meta(ticker, interval).get('covered_from')
+        covered_from = _as_timestamp(covered_from, tz) if covered_from else first
+
+        head = tail = None
+        if _as_timestamp(start, tz) < covered_from:
+            head = (start, covered_from)
+        # Re-fetch the last cached bar as well: it may have been a partial candle
+        if last + step < _as_timestamp(end, tz):
+            tail = (last, end)
+        return head, tail
+
+    def _chunks(self, start, end, interval, newest_first=False):
+        """
+        Split [start, end) into ranges the provider serves in one request
+        """
+        start, end = _as_timestamp(start, None), _as_timestamp(end, None)
+        limit = self.max_request_days.get(interval)
+        if limit is None:
+            return [(start, end)]
+        step = pd.Timedelta(days=limit)
+        chunks = []
+        if newest_first:
+            while end > start:
+                chunks.append((max(end - step, start), end))
+                end -= step
+        else:
+            while start < end:
+                chunks.append((start, min(start + step, end)))
+                start += step
+        return chunks
+
+    def _fetch(self, tickers, start, end, interval, newest_first=False):
+        """
+        Download [start, end) chunk by chunk, storing each chunk before the next request
+        """
+        chunks = self._chunks(start, end, interval, newest_first)
+        for i, (chunk_start, chunk_end) in enumerate(chunks, 1):
+            progress = f" (chunk {i}/{len(chunks)})" if len(chunks) > 1 else ""
+            print(f"Fetching {interval} data for {', '.join(tickers)} from {chunk_start} to {chunk_end}{progress}")
+            fetched = self.fetcher(tickers, chunk_start, chunk_end, interval)
+            for ticker in tickers:
+                self.store(ticker, interval, fetched.get(ticker))
+                meta = self._read_meta(ticker, interval)
+                if 'covered_from' not in meta or chunk_start < pd.Timestamp(meta['covered_from']):
+                    meta['covered_from'] = chunk_start.isoformat()
+                    self._write_meta(ticker, interval, meta)
+            del fetched
+
+    def _clamp_start(self, start, interval):
+        """
+        Move start forward to the oldest bar the provider still serves for interval
+        """
+        history = self.history_days.get(interval)
+        if history is None:
+            return start
+        oldest = pd.Timestamp.now(tz='UTC').tz_convert(None).floor('D') - pd.Timedelta(days=history)
+        if _as_timestamp(start, None) < oldest:
+            print(f"{interval} bars only go back {history} days, loading from {oldest.date()}")
+            return oldest
+        return start
+
+    def get_many(self, tickers, start, end=None, interval='1d'):
+        """
+        Return cached OHLCV frames for several tickers, fetching only what is missing.
+
+        All tickers whose tail is stale are topped up with a single multi-ticker
+        download starting at the oldest of their last cached bars.
+
+        Returns:
+            dict: ticker -> DataFrame of bars in [start, end)
+        """
+        end = end or default_end(interval)
+        start = self._clamp_start(start, interval)
+
+        with self._locked(tickers, interval):
+            heads = {}
+            tails = {}
+            for ticker in tickers:
+                head, tail = self._missing_ranges(ticker, interval, start, end)
+                if head is not None:
+                    heads.setdefault(head, []).append(ticker)
+                if tail is not None:
+                    tails[ticker] = _as_timestamp(tail[0], None)
+
+            for (head_start, head_end), group in heads.items():
+                self._fetch(group, head_start, head_end, interval, newest_first=True)
+            if tails:
+                self._fetch(list(tails), min(tails.values()), end, interval)
+
+            result = {}
+            for ticker in tickers:
+                cached = self.load(ticker, interval)
+                tz = cached.index.tz
+                # The index is sorted, so the range is a slice; one copy keeps callers
+                # from modifying the cached frame
+                first = cached.index.searchsorted(_as_timestamp(start, tz), side='left')
+                last = cached.index.searchsorted(_as_timestamp(end, tz), side='left')
+                result[ticker] = cached.iloc[first:last].copy()
+            return result
+
+    def get(self, ticker, start, end=None, interval='1d'):
+        """
+        Return cached OHLCV bars for one ticker in [start, end), fetching only what is missing
+        """
+        return self.get_many([ticker], start, end, interval)[ticker]
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """
+    Process-wide cache instance backed by CACHE_DIR and yfinance
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = OHLCVCache()
+    return _default_cache
@@ -1,23 +1,40 @@
-import yfinance as yf
 from utils.config import TICKER, START_DATE, END_DATE, INTERVAL
+from data.cache import get_default_cache, default_end, OHLCV_COLUMNS
+from utils.compact import compact_ohlcv
+from utils.config import COMPACT_DTYPES
 import pandas as pd
-from datetime import datetime
 
-def fetch_crypto_data():
+def fetch_crypto_data(ticker=TICKER, start_date=START_DATE, end_date=END_DATE, interval=INTERVAL, cache=None,
+                      compact=COMPACT_DTYPES):
     """
-    Fetch cryptocurrency data from Yahoo Finance
+    Fetch cryptocurrency data, reading from the local OHLCV cache and
+    downloading only the bars that are not cached yet
+    
+    Args:
+        ticker: Yahoo Finance ticker symbol
+        start_date: First date to fetch
+        end_date: Last date to fetch (None means today, or now for intraday intervals)
+        interval: Bar interval ('1d', '1h', '5m', '1m', ...); long intraday ranges
+                  are downloaded in chunks the provider accepts
+        cache: OHLCVCache to use (defaults to the shared on-disk cache)
+        compact: Return float32 prices and integer Volume (see utils/compact.py)
     
     Returns:
-        DataFrame: Historical OHLCV data for the configured ticker
+        DataFrame: Historical OHLCV data for the ticker
     """
-    # If END_DATE is None, use current date
-    end_date = END_DATE if END_DATE else datetime.now().strftime('%Y-%m-%d')
+    # If end_date is None, use current date (current time for intraday bars)
+    end_date = end_date if end_date else default_end(interval)
+    cache = cache or get_default_cache()
     
-    print(f"Fetching data for {TICKER} from {START_DATE} to {end_date}")
-    data = yf.download(TICKER, start=START_DATE, end=end_date, interval=INTERVAL)
+    print(f"Fetching data for {ticker} from {start_date} to {end_date}")
+    data = cache.get(ticker, start_date, end_date, interval=interval)
     
-    # Make sure you have required columns
-    data = data[['Open', 'High', 'Low', 'Close', 'Volume']]
+    # Make sure you have required columns (the cache already returns exactly these,
+    # so this only copies frames from elsewhere)
+    if list(data.columns) != OHLCV_COLUMNS:
+        data = data[OHLCV_COLUMNS]
+    if compact:
+        data = compact_ohlcv(data)
     
     # Print the first few rows for debugging
     print("\nData sample:")
@@ -1,11 +1,21 @@
+import numpy as np
 import pandas as pd
+from features.kernels import compute_indicators
+from utils.compact import FLOAT_DTYPE, compact_ohlcv
+from utils.config import COMPACT_DTYPES, EXTENDED_INDICATORS
 
-def add_features(df):
+def add_features(df, compact=COMPACT_DTYPES, extended=EXTENDED_INDICATORS):
     """
     Add technical indicators and features to the dataframe
     
+    Indicator windows are counted in bars (utils/config.py), so the same code
+    serves daily and intraday data. The indicators are computed by the NumPy
+    kernels in features/kernels.py and added to df in place.
+    
     Args:
         df: DataFrame with OHLCV data
+        compact: Store float32 indicators and compact OHLCV dtypes (see utils/compact.py)
+        extended: Also add Bollinger bands, ATR, OBV and the stochastic oscillator
         
     Returns:
         DataFrame with added features
@@ -15,31 +25,33 @@ def add_features(df):
         print("Flattening MultiIndex columns...")
         df.columns = [col[0] for col in df.columns]
     
-    # Moving Averages
-    df['MA14'] = df['Close'].rolling(window=14).mean()
-    df['MA50'] = df['Close'].rolling(window=50).mean()
-    df['Price_Change'] = df['Close'].pct_change()
-    
-    # Calculate RSI (14-period)
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    if compact:
+        compact_ohlcv(df)
     
-    # Calculate RS and RSI
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
+    # Computed in float64 (also from float32 prices), stored in one preallocated array
+    close = df['Close'].to_numpy(dtype=np.float64)
+    high = low = volume = None
+    if extended:
+        high, low, volume = (df[name].to_numpy(dtype=np.float64) for name in ('High', 'Low', 'Volume'))
+    columns, values = compute_indicators(close, high, low, volume, extended=extended,
+                                         dtype=FLOAT_DTYPE if compact else np.float64)
     
-    # Calculate MACD
-    ema12 = df['Close'].ewm(span=12, adjust=False).mean()
-    ema26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD'] = ema12 - ema26
-    df['MACD_Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    df['MACD_Hist'] = df['MACD'] - df['MACD_Signal']
+    # Warm-up rows and undefined values (RSI without any move, for example) become 0
+    np.copyto(values, 0.0, where=np.isnan(values))
+    for name, column in zip(columns, values):
+        df[name] = column
     
-    # Add volatility indicator
-    df['Volatility'] = df['Close'].rolling(window=14).std()
-    
-    # Fill NA values after calculating indicators
-    df = df.fillna(0)
+    # Fill the remaining gaps (in the price columns), replacing only the columns that
+    # have any (a frame-wide fillna would copy millions of intraday rows)
+    fill_missing(df)
     
     return df
+
+def fill_missing(df, value=0):
+    """
+    Fill NaNs column by column, replacing only the columns that contain any
+    """
+    for column in df.columns:
+        if df[column].isna().any():
+            df[column] = df[column].fillna(value)
+    return df
@@ -0,0 +1,348 @@
+"""
+NumPy kernels for the technical indicators of add_features.
+
+Every indicator is built from two shared cores working on float64 arrays:
+
+- rolling_stats: moving averages and rolling standard deviations from prefix
+  sums (np.cumsum). One set of prefix sums of a series serves all of its
+  windows, so MA14, MA50, Volatility and the Bollinger bands of Close cost one
+  pass between them; RSI, ATR and OBV run the same routine on their own inputs.
+  The prefix sums restart every ROLLING_BLOCK rows from a value inside the
+  block, which keeps rounding error relative to the price level of the block
+  rather than to the running total of the whole series.
+- ema: exponential moving average with pandas' adjust=False recursion,
+  evaluated in closed form per block (a cumulative sum of geometrically
+  rescaled values) instead of a loop over rows.
+
+Stochastic %K uses rolling extrema from the van Herk/Gil-Werman block scan.
+Rolling windows follow pandas' rolling(window) semantics: the first window-1
+values and every window containing a NaN are NaN, and a window of equal values
+has exactly that value as its mean and 0 as its standard deviation (flat
+stretches of minute bars are common). compute_indicators writes all indicator
+columns into one preallocated array, float32 included for compact frames.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils.config import (MA_SHORT_WINDOW, MA_LONG_WINDOW, RSI_WINDOW, MACD_FAST_SPAN, MACD_SLOW_SPAN,
+                          MACD_SIGNAL_SPAN, VOLATILITY_WINDOW, BOLLINGER_WINDOW, BOLLINGER_STD,
+                          ATR_WINDOW, OBV_WINDOW, STOCH_WINDOW, STOCH_SMOOTH)
+
+# Indicator columns of add_features, in the order compute_indicators returns them
+BASE_COLUMNS = ['MA14', 'MA50', 'Price_Change', 'RSI', 'MACD', 'MACD_Signal', 'MACD_Hist', 'Volatility']
+# Added with extended=True (EXTENDED_INDICATORS in utils/config.py)
+EXTENDED_COLUMNS = ['BB_Upper', 'BB_Lower', 'ATR', 'OBV', 'Stoch_K', 'Stoch_D']
+
+# Rows per block of prefix sums
+ROLLING_BLOCK = 8192
+
+# Largest rescaling factor inside an EMA block (limits the block length for short spans)
+EMA_MAX_SCALE = 1e100
+EMA_BLOCK = 8192
+
+
+def _equal_runs(x):
+    """
+    Number of consecutive values equal to x[i] ending at i
+    """
+    index = np.arange(len(x))
+    change = np.empty(len(x), dtype=bool)
+    change[:1] = True
+    np.not_equal(x[1:], x[:-1], out=change[1:])
+    return index - np.maximum.accumulate(np.where(change, index, 0)) + 1
+
+
+def rolling_stats(x, means=(), stds=(), block=ROLLING_BLOCK):
+    """
+    Rolling means and sample standard deviations of x for several windows at once
+
+    Args:
+        x: float64 array (not one of the outputs)
+        means: (window, out) pairs; out receives the rolling mean over window
+        stds: (window, out) pairs; out receives the rolling standard deviation (ddof=1)
+        block: Rows per block of prefix sums
+    """
+    n = len(x)
+    windows = [window for window, _ in means] + [window for window, _ in stds]
+    if not windows:
+        return
+    for window, out in list(means) + list(stds):
+        out[:window - 1] = np.nan
+
+    longest, shortest = max(windows), min(windows)
+    has_nan = bool(np.isnan(x).any())
+    for start in range(0, n, block):
+        end = min(n, start + block)
+        # Enough earlier rows that every window ending in this block lies in the segment
+        first = max(0, start - longest + 1)
+        segment = x[first:end]
+        anchor = x[start]
+        if has_nan:
+            missing = np.isnan(segment)
+            if np.isnan(anchor):
+                finite = segment[~missing]
+                anchor = finite[0] if finite.size else 0.0
+            shifted = np.where(missing, 0.0, segment - anchor)
+            missing_sums = np.zeros(len(segment) + 1)
+            np.cumsum(missing, out=missing_sums[1:])
+        else:
+            shifted = segment - anchor
+
+        sums = np.zeros(len(segment) + 1)
+        np.cumsum(shifted, out=sums[1:])
+        squares = None
+        if stds:
+            squares = np.zeros(len(segment) + 1)
+            np.cumsum(shifted * shifted, out=squares[1:])
+
+        for window, out in means:
+            lo = max(start, window - 1)
+            if lo >= end:
+                continue
+            upper, lower = slice(lo + 1 - first, end + 1 - first), slice(lo + 1 - window - first, end + 1 - window - first)
+            target = out[lo:end]
+            np.subtract(sums[upper], sums[lower], out=target)
+            target /= window
+            target += anchor
+            if has_nan:
+                target[missing_sums[upper] > missing_sums[lower]] = np.nan
+
+        for window, out in stds:
+            lo = max(start, window - 1)
+            if lo >= end:
+                continue
+            upper, lower = slice(lo + 1 - first, end + 1 - first), slice(lo + 1 - window - first, end + 1 - window - first)
+            total = sums[upper] - sums[lower]
+            target = out[lo:end]
+            np.subtract(squares[upper], squares[lower], out=target)
+            target -= total * total / window
+            target /= window - 1
+            np.maximum(target, 0.0, out=target)
+            np.sqrt(target, out=target)
+            if has_nan:
+                target[missing_sums[upper] > missing_sums[lower]] = np.nan
+
+        # Windows of equal values, exact as in pandas (the segment holds every window
+        # ending in the block, so runs counted from its start are long enough)
+        runs = _equal_runs(segment)[start - first:]
+        if runs.max() >= shortest:
+            for window, out in means:
+                flat = runs >= window
+                out[start:end][flat] = segment[start - first:][flat]
+            for window, out in stds:
+                out[start:end][runs >= window] = 0.0
+
+
+def rolling_mean(x, window, out=None):
+    out = np.empty(len(x)) if out is None else out
+    rolling_stats(x, means=[(window, out)])
+    return out
+
+
+def rolling_std(x, window, out=None):
+    out = np.empty(len(x)) if out is None else out
+    rolling_stats(x, stds=[(window, out)])
+    return out
+
+
+def ema(x, span, out=None):
+    """
+    Exponential moving average, as pandas' ewm(span=span, adjust=False).mean()
+
+    Within a block of m rows following the value y_prev,
+    y_j = r**j * (r * y_prev + alpha * sum_{k<=j} x_k / r**k) with r = 1 - alpha,
+    which is one cumulative sum. Series with missing values are left to pandas,
+    whose recursion reweights the rows after a gap.
+    """
+    out = np.empty(len(x)) if out is None else out
+    n = len(x)
+    if n == 0:
+        return out
+    if np.isnan(x).any():
+        out[:] = pd.Series(x).ewm(span=span, adjust=False).mean().to_numpy()
+        return out
+
+    alpha = 2.0 / (span + 1)
+    r = 1.0 - alpha
+    if r <= 0:
+        # span 1: no smoothing
+        out[:] = x
+        return out
+    block = max(1, min(EMA_BLOCK, int(math.log(EMA_MAX_SCALE) / -math.log(r))))
+    steps = np.arange(block)
+    grow = r ** -steps
+    decay = r ** steps
+
+    previous = x[0]
+    for start in range(0, n, block):
+        end = min(n, start + block)
+        m = end - start
+        target = out[start:end]
+        np.multiply(x[start:end], grow[:m], out=target)
+        np.cumsum(target, out=target)
+        target *= alpha
+        target += r * previous
+        target *= decay[:m]
+        previous = target[-1]
+    return out
+
+
+def _rolling_extreme(x, window, accumulate, combine, out):
+    # van Herk/Gil-Werman: in blocks of `window` rows, the extreme of any window is
+    # the extreme of a suffix scan of one block and a prefix scan of the next
+    n = len(x)
+    out[:window - 1] = np.nan
+    if n < window:
+        out[:] = np.nan
+        return out
+    padded = np.empty(-(-n // window) * window)
+    padded[:n] = x
+    padded[n:] = x[-1]
+    blocks = padded.reshape(-1, window)
+    prefix = accumulate(blocks, axis=1).ravel()
+    suffix = accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    combine(suffix[:n - window + 1], prefix[window - 1:n], out=out[window - 1:])
+    return out
+
+
+def rolling_max(x, window, out=None):
+    out = np.empty(len(x)) if out is None else out
+    return _rolling_extreme(x, window, np.maximum.accumulate, np.maximum, out)
+
+
+def rolling_min(x, window, out=None):
+    out = np.empty(len(x)) if out is None else out
+    return _rolling_extreme(x, window, np.minimum.accumulate, np.minimum, out)
+
+
+def _diff(x):
+    delta = np.empty_like(x)
+    delta[0] = np.nan
+    np.subtract(x[1:], x[:-1], out=delta[1:])
+    return delta
+
+
+def compute_indicators(close, high=None, low=None, volume=None, extended=False, dtype=np.float64):
+    """
+    All indicator columns of add_features for one price series
+
+    Args:
+        close: Close prices
+        high, low: High and low prices (needed with extended)
+        volume: Volumes (needed with extended; missing volume counts as 0)
+        extended: Also compute Bollinger bands, ATR, OBV and the stochastic oscillator
+        dtype: dtype of the returned array; the indicators are computed in float64
+               either way and a narrower dtype is written column by column, so only
+               a few float64 columns exist at a time
+
+    Returns:
+        tuple: (column names, array of shape (n_columns, n_rows)); warm-up rows are NaN
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    columns = BASE_COLUMNS + (EXTENDED_COLUMNS if extended else [])
+    values = np.empty((len(columns), n), dtype=dtype)
+    row = dict(zip(columns, values))
+    if n == 0:
+        return columns, values
+
+    # float64 rows are computed in place, other dtypes through a float64 scratch column
+    direct = values.dtype == np.float64
+
+    def scratch(name):
+        return row[name] if direct else np.empty(n)
+
+    def store(name, column):
+        if not direct:
+            row[name][:] = column
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ma_short, ma_long, volatility = scratch('MA14'), scratch('MA50'), scratch('Volatility')
+        means = [(MA_SHORT_WINDOW, ma_short), (MA_LONG_WINDOW, ma_long)]
+        stds = [(VOLATILITY_WINDOW, volatility)]
+        if extended:
+            bollinger_mean, bollinger_std = np.empty(n), np.empty(n)
+            means.append((BOLLINGER_WINDOW, bollinger_mean))
+            stds.append((BOLLINGER_WINDOW, bollinger_std))
+        rolling_stats(close, means=means, stds=stds)
+        store('MA14', ma_short)
+        store('MA50', ma_long)
+        store('Volatility', volatility)
+        del ma_short, ma_long, volatility, means, stds
+
+        # pct_change: Close / previous Close - 1
+        change = scratch('Price_Change')
+        change[0] = np.nan
+        np.divide(close[1:], close[:-1], out=change[1:])
+        change[1:] -= 1
+        store('Price_Change', change)
+        del change
+
+        # RSI: mean gain over mean loss; the first difference (NaN) counts as neither
+        delta = _diff(close)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        rsi = scratch('RSI')
+        rolling_mean(gain, RSI_WINDOW, out=rsi)
+        rsi /= rolling_mean(loss, RSI_WINDOW)
+        rsi += 1
+        np.divide(100, rsi, out=rsi)
+        np.subtract(100, rsi, out=rsi)
+        store('RSI', rsi)
+        del gain, loss, rsi
+
+        macd, signal = scratch('MACD'), scratch('MACD_Signal')
+        ema(close, MACD_FAST_SPAN, out=macd)
+        macd -= ema(close, MACD_SLOW_SPAN)
+        ema(macd, MACD_SIGNAL_SPAN, out=signal)
+        store('MACD', macd)
+        store('MACD_Signal', signal)
+        np.subtract(macd, signal, out=row['MACD_Hist'])
+        del macd, signal
+
+        if extended:
+            high = np.asarray(high, dtype=np.float64)
+            low = np.asarray(low, dtype=np.float64)
+
+            # Bollinger bands: moving average +/- BOLLINGER_STD standard deviations
+            bollinger_std *= BOLLINGER_STD
+            row['BB_Upper'][:] = bollinger_mean + bollinger_std
+            bollinger_mean -= bollinger_std
+            row['BB_Lower'][:] = bollinger_mean
+            del bollinger_mean, bollinger_std
+
+            # Average true range: mean of max(high - low, |high - prev close|, |low - prev close|)
+            previous = np.empty(n)
+            previous[0] = np.nan
+            previous[1:] = close[:-1]
+            true_range = high - low
+            np.fmax(true_range, np.abs(high - previous), out=true_range)
+            np.fmax(true_range, np.abs(low - previous), out=true_range)
+            atr = scratch('ATR')
+            rolling_mean(true_range, ATR_WINDOW, out=atr)
+            store('ATR', atr)
+            del previous, true_range, atr
+
+            # On-balance volume over the last OBV_WINDOW bars: volume signed by the
+            # direction of the close (windowed, so it does not depend on where the history starts)
+            volume = np.nan_to_num(np.asarray(volume, dtype=np.float64))
+            signed = np.sign(np.nan_to_num(delta)) * volume
+            obv = scratch('OBV')
+            rolling_mean(signed, OBV_WINDOW, out=obv)
+            obv *= OBV_WINDOW
+            store('OBV', obv)
+            del signed, obv
+
+            # Stochastic oscillator: close within the range of the last STOCH_WINDOW bars
+            stoch = scratch('Stoch_K')
+            lowest = rolling_min(low, STOCH_WINDOW)
+            rolling_max(high, STOCH_WINDOW, out=stoch)
+            stoch -= lowest
+            np.divide(close - lowest, stoch, out=stoch)
+            stoch *= 100
+            store('Stoch_K', stoch)
+            row['Stoch_D'][:] = rolling_mean(stoch, STOCH_SMOOTH)
+
+    return columns, values
@@ -0,0 +1,148 @@
+import json
+
+import numpy as np
+
+from utils.config import EXTENDED_INDICATORS
+
+# Indicator columns produced by add_features that the model uses directly
+BASE_FEATURES = [
+    'Close', 'Volume', 'MA14', 'MA50', 'Price_Change',
+    'RSI', 'MACD', 'MACD_Signal', 'MACD_Hist', 'Volatility'
+]
+
+# Ratio/change features derived from the indicators
+DERIVED_FEATURES = ['RSI_Change', 'MACD_Change', 'MA_Ratio', 'Price_MA14_Ratio']
+
+DEFAULT_FEATURES = BASE_FEATURES + DERIVED_FEATURES
+
+# Columns add_features only computes with extended=True (EXTENDED_INDICATORS)
+EXTENDED_FEATURES = ['BB_Upper', 'BB_Lower', 'ATR', 'OBV', 'Stoch_K', 'Stoch_D']
+
+
+def model_features(extended=EXTENDED_INDICATORS):
+    """
+    Features a new model is trained on: the defaults, plus the extended indicators if enabled
+    """
+    return DEFAULT_FEATURES + (EXTENDED_FEATURES if extended else [])
+
+
+def _column(df, name):
+    """
+    Column as a float array: taken from df when present, otherwise derived from the indicators
+    """
+    if name in df.columns:
+        return df[name].to_numpy(dtype=np.float64)
+    if name == 'RSI_Change':
+        return _diff(df['RSI'].to_numpy(dtype=np.float64))
+    if name == 'MACD_Change':
+        return _diff(df['MACD'].to_numpy(dtype=np.float64))
+    if name == 'MA_Ratio':
+        return df['MA14'].to_numpy(dtype=np.float64) / df['MA50'].to_numpy(dtype=np.float64)
+    if name == 'Price_MA14_Ratio':
+        return df['Close'].to_numpy(dtype=np.float64) / df['MA14'].to_numpy(dtype=np.float64)
+    raise ValueError(f"Required feature '{name}' not found in data")
+
+
+def add_derived(df, names=DERIVED_FEATURES):
+    """
+    Add derived feature columns to an add_features DataFrame in place, unfilled,
+    exactly as FeaturePipeline computes them when they are missing
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name in names:
+            df[name] = _column(df, name)
+    return df
+
+
+def _diff(values):
+    out = np.empty_like(values)
+    out[0] = np.nan
+    np.subtract(values[1:], values[:-1], out=out[1:])
+    return out
+
+
+class FeaturePipeline:
+    """
+    Turns an add_features DataFrame into the model's feature matrix.
+
+    This is the one place where the derived features and the inf/NaN cleaning are
+    defined, so training, evaluation and serving all see identical inputs. Columns
+    are written straight into a preallocated C-contiguous float32 matrix in
+    feature order; the DataFrame itself is never copied. Missing and infinite
+    values are replaced with the column means seen at fit time, which are saved
+    with the model bundle.
+    """
+
+    def __init__(self, features=None, fill_values=None):
+        self.features = list(features or DEFAULT_FEATURES)
+        self.fill_values = None if fill_values is None else np.asarray(fill_values, dtype=np.float32)
+
+    def _raw_matrix(self, df):
+        X = np.empty((len(df), len(self.features)), dtype=np.float32)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for j, name in enumerate(self.features):
+                X[:, j] = _column(df, name)
+        return X
+
+    def _clean(self, X):
+        bad = ~np.isfinite(X)
+        if bad.any():
+            fill = self.fill_values if self.fill_values is not None else np.zeros(X.shape[1], dtype=np.float32)
+            rows, cols = np.nonzero(bad)
+            X[rows, cols] = fill[cols]
+        return X
+
+    def fit_transform(self, df):
+        """
+        Learn the per-column fill values from df and return its cleaned feature matrix
+        """
+        X = self._raw_matrix(df)
+        X[np.isinf(X)] = np.nan
+        with np.errstate(invalid='ignore'):
+            means = np.nanmean(X, axis=0, dtype=np.float64)
+        # Columns with no finite value at all fall back to 0
+        self.fill_values = np.nan_to_num(means, nan=0.0).astype(np.float32)
+        return self._clean(X)
+
+    def fit(self, df):
+        self.fit_transform(df)
+        return self
+
+    def transform(self, df):
+        """
+        Cleaned float32 feature matrix for every row of df
+        """
+        return self._clean(self._raw_matrix(df))
+
+    def transform_latest(self, df):
+        """
+        Feature row for the last row of df (uses the previous row for the change features)
+
+        Args:
+            df: DataFrame with at least one row; a Series is treated as a single row
+
+        Returns:
+            ndarray: Shape (1, n_features)
+        """
+        if hasattr(df, 'to_frame') and not hasattr(df, 'columns'):
+            df = df.to_frame().T
+        return self.transform(df.iloc[-2:])[-1:]
+
+    def to_dict(self):
+        return {
+            'features': self.features,
+            'fill_values': None if self.fill_values is None else self.fill_values.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['features'], state.get('fill_values'))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,524 @@
+"""
+Feature store: the output of add_features and the derived features on disk, so
+that training, evaluation and serving read indicators instead of recomputing
+them from the whole OHLCV history.
+
+Layout (hive partitioning, Parquet files named by their first bar, in UTC):
+
+    <FEATURE_STORE_DIR>/<version>/ticker=<ticker>/interval=<interval>/date=<YYYY-MM-DD>/part-<YYYYMMDDTHHMMSS>.parquet
+
+`version` is a hash of the feature definitions (columns, indicator windows and
+FEATURE_REVISION), so changing a window or a formula starts a new store next to
+the old one instead of mixing values. Each file also carries it in its schema
+metadata. A date partition holds a month of bars below hourly intervals and a
+year of hourly or longer bars.
+
+update() appends bars as they arrive: the file holding the first changed bar and
+newer files are rewritten, and new bars go to new files. The last bar of a
+series is written to a file of its own, as its candle may have been partial, so
+an append rewrites that one bar plus the new ones. Once a partition holds more
+than MAX_PART_FILES files, all but its last are merged into one (without
+recomputing them). The indicators of the rewritten bars are computed from the
+raw OHLCV stored with them plus CONTEXT bars before the rewrite. That context covers the longest rolling
+window and lets the EMAs of MACD settle until their starting value weighs less
+than float64 resolution, so appended features match a full recomputation within
+the kernels' rounding (about 1e-9 relative, benchmarks/bench_feature_store.py).
+Bars older than the first stored one rebuild the whole series.
+
+read() loads only the requested columns and lets pyarrow skip the date
+partitions and row groups outside the requested range. The extended indicators
+are always stored; readers that do not use them never load them.
+
+Service workers share the store: update() holds an exclusive lock on a
+.lock file in the ticker/interval directory while it appends, supersedes and
+merges files, and read() holds a shared one, so no reader lists a file that a
+writer in another process is about to remove.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialised
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from data.cache import OHLCV_COLUMNS, interval_to_timedelta
+from features.engineer_features import add_features
+from features.kernels import BASE_COLUMNS, EXTENDED_COLUMNS
+from features.pipeline import DERIVED_FEATURES, add_derived, model_features
+from labels.create_labels import LABEL_INPUTS
+from utils.compact import FLOAT_DTYPE, compact_ohlcv
+from utils.config import (MA_SHORT_WINDOW, MA_LONG_WINDOW, RSI_WINDOW, MACD_FAST_SPAN, MACD_SLOW_SPAN,
+                          MACD_SIGNAL_SPAN, VOLATILITY_WINDOW, BOLLINGER_WINDOW, BOLLINGER_STD,
+                          ATR_WINDOW, OBV_WINDOW, STOCH_WINDOW, STOCH_SMOOTH, FEATURE_STORE_DIR, COMPACT_DTYPES)
+
+# Bump when the formula of a stored column changes (window changes are picked up by themselves)
+FEATURE_REVISION = 1
+# Bump when the file layout changes
+LAYOUT_REVISION = 2
+
+STORED_COLUMNS = OHLCV_COLUMNS + BASE_COLUMNS + EXTENDED_COLUMNS + DERIVED_FEATURES
+
+PARTITION_FIELD = 'date'
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_FIELD, pa.string())]), flavor='hive')
+PART_PREFIX = 'part-'
+PART_SUFFIX = '.parquet'
+
+# Files a date partition may hold before all but its last are merged into one
+MAX_PART_FILES = 16
+
+# Lock file of a ticker/interval directory (dataset discovery skips names starting with '.')
+LOCK_FILE = '.lock'
+
+
+def feature_definition():
+    """
+    Everything the stored values depend on
+    """
+    return {
+        'revision': FEATURE_REVISION,
+        'layout': LAYOUT_REVISION,
+        'columns': STORED_COLUMNS,
+        'windows': {
+            'MA_SHORT_WINDOW': MA_SHORT_WINDOW, 'MA_LONG_WINDOW': MA_LONG_WINDOW, 'RSI_WINDOW': RSI_WINDOW,
+            'MACD_FAST_SPAN': MACD_FAST_SPAN, 'MACD_SLOW_SPAN': MACD_SLOW_SPAN,
+            'MACD_SIGNAL_SPAN': MACD_SIGNAL_SPAN, 'VOLATILITY_WINDOW': VOLATILITY_WINDOW,
+            'BOLLINGER_WINDOW': BOLLINGER_WINDOW, 'BOLLINGER_STD': BOLLINGER_STD, 'ATR_WINDOW': ATR_WINDOW,
+            'OBV_WINDOW': OBV_WINDOW, 'STOCH_WINDOW': STOCH_WINDOW, 'STOCH_SMOOTH': STOCH_SMOOTH,
+        },
+    }
+
+
+def feature_version():
+    """
+    Short hash of feature_definition(), the version directory of the store
+    """
+    payload = json.dumps(feature_definition(), sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+
+def _settle_bars(span):
+    # Bars after which an EMA's starting value weighs less than 2**-53
+    return math.ceil(-53 * math.log(2) / math.log(1 - 2 / (span + 1)))
+
+
+# Bars before a rewritten partition that its indicators are computed from: the
+# longest window (plus the bar its first difference needs, and the stochastic
+# smoothing), then enough bars for the slow EMA and the signal line to settle
+CONTEXT = (max(MA_SHORT_WINDOW, MA_LONG_WINDOW, RSI_WINDOW + 1, VOLATILITY_WINDOW, BOLLINGER_WINDOW,
+               ATR_WINDOW + 1, OBV_WINDOW + 1, STOCH_WINDOW + STOCH_SMOOTH)
+           + _settle_bars(max(MACD_FAST_SPAN, MACD_SLOW_SPAN)) + _settle_bars(MACD_SIGNAL_SPAN) + 1)
+
+
+def partition_unit(interval):
+    """
+    numpy datetime unit of the date partitions: months of bars below hourly
+    intervals, years of hourly or longer bars
+    """
+    if interval_to_timedelta(interval) < pd.Timedelta(hours=1):
+        return 'M'
+    return 'Y'
+
+
+def _utc_values(index):
+    # Naive UTC datetime64 values of a DatetimeIndex (partitions are named in UTC)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.to_numpy()
+
+
+def _partitions_of(index, unit):
+    """
+    Split a sorted DatetimeIndex into date partitions
+
+    Returns:
+        list: (partition name, first row, end row) per partition; the name is the
+              first day of the partition's period
+    """
+    periods = _utc_values(index).astype(f'datetime64[{unit}]')
+    starts = np.r_[0, np.flatnonzero(periods[1:] != periods[:-1]) + 1]
+    ends = np.r_[starts[1:], len(periods)]
+    names = np.datetime_as_string(periods[starts].astype('datetime64[D]'))
+    return [(str(name), lo, hi) for name, lo, hi in zip(names, starts, ends)]
+
+
+def _partition_name(ts, unit):
+    return _partitions_of(pd.DatetimeIndex([ts]), unit)[0][0]
+
+
+def _file_name(ts):
+    # Name of the file whose first bar is ts
+    stamp = np.datetime_as_string(_utc_values(pd.DatetimeIndex([ts])).astype('datetime64[s]'))[0]
+    return f"{PART_PREFIX}{stamp.replace('-', '').replace(':', '')}{PART_SUFFIX}"
+
+
+def _file_start(name):
+    # First bar of a file, as a naive UTC Timestamp
+    return pd.Timestamp(name[len(PART_PREFIX):-len(PART_SUFFIX)])
+
+
+def _naive_utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_convert('UTC').tz_localize(None) if ts.tzinfo is not None else ts
+
+
+def _remove(path):
+    """
+    Delete a superseded file; one that is already gone is no error
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _timestamp(value, tz):
+    ts = pd.Timestamp(value)
+    if tz is not None and ts.tzinfo is None:
+        return ts.tz_localize(tz)
+    if tz is None and ts.tzinfo is not None:
+        return ts.tz_convert(None)
+    return ts
+
+
+def _combine(*frames):
+    # Bars of several frames; for timestamps in more than one, the last frame wins
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return None
+    combined = pd.concat(frames) if len(frames) > 1 else frames[0]
+    combined = combined[~combined.index.duplicated(keep='last')]
+    return combined.sort_index()
+
+
+def _changed(new, stored):
+    """
+    Timestamps of `new` that are missing from `stored` or hold different values
+    """
+    common = new.index.intersection(stored.index)
+    missing = new.index.difference(stored.index)
+    if common.empty:
+        return missing
+    a = new.loc[common, OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+    b = stored.loc[common, OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+    differs = ((a != b) & ~(np.isnan(a) & np.isnan(b))).any(axis=1)
+    return missing.union(common[differs])
+
+
+class FeatureStore:
+    """
+    Parquet feature store for one feature version, keyed by ticker and interval
+
+    Args:
+        root: Store directory (the version directories go below it)
+        version: Feature version to read and write (defaults to feature_version())
+    """
+
+    def __init__(self, root=FEATURE_STORE_DIR, version=None):
+        self.root = root
+        self.version = version or feature_version()
+        self._lock = threading.Lock()
+        self._ticker_locks = {}
+
+    def _ticker_lock(self, ticker, interval):
+        with self._lock:
+            return self._ticker_locks.setdefault((ticker, interval), threading.Lock())
+
+    @contextmanager
+    def _series_lock(self, ticker, interval, exclusive=True):
+        """
+        Lock on the files of a ticker and interval across processes, exclusive
+        for writers and shared for readers (writers in one process also take
+        the ticker's threading lock)
+        """
+        directory = self._dir(ticker, interval)
+        if not exclusive and not os.path.isdir(directory):
+            # Nothing stored yet, nothing to read
+            yield
+            return
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, LOCK_FILE), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _dir(self, ticker, interval):
+        return os.path.join(self.root, self.version, f'ticker={ticker}', f'interval={interval}')
+
+    def _partition_dir(self, ticker, interval, partition):
+        return os.path.join(self._dir(ticker, interval), f'{PARTITION_FIELD}={partition}')
+
+    def _files(self, ticker, interval, partition):
+        """
+        Names of a partition's files, oldest bars first
+        """
+        path = self._partition_dir(ticker, interval, partition)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if name.startswith(PART_PREFIX) and name.endswith(PART_SUFFIX))
+
+    def _partitions(self, ticker, interval):
+        path = self._dir(ticker, interval)
+        if not os.path.isdir(path):
+            return []
+        prefix = f'{PARTITION_FIELD}='
+        return sorted(name[len(prefix):] for name in os.listdir(path)
+                      if name.startswith(prefix) and self._files(ticker, interval, name[len(prefix):]))
+
+    def first_bar(self, ticker, interval):
+        """
+        Timestamp of the oldest stored bar, or None if nothing is stored
+        """
+        partitions = self._partitions(ticker, interval)
+        if not partitions:
+            return None
+        name = self._files(ticker, interval, partitions[0])[0]
+        path = os.path.join(self._partition_dir(ticker, interval, partitions[0]), name)
+        return pq.ParquetFile(path).read(columns=['Date']).column('Date').to_pandas().min()
+
+    def _file_holding(self, ticker, interval, ts):
+        """
+        First bar (naive UTC) of the stored file that holds ts, or the last file before it
+        """
+        ts = _naive_utc(ts)
+        last = _partition_name(ts, partition_unit(interval))
+        start = None
+        for partition in self._partitions(ticker, interval):
+            if partition > last:
+                break
+            for name in self._files(ticker, interval, partition):
+                if _file_start(name) <= ts:
+                    start = _file_start(name)
+        return start
+
+    def read(self, ticker, interval, start=None, end=None, columns=None, compact=COMPACT_DTYPES):
+        """
+        Stored features of the bars in [start, end] (both optional and inclusive)
+
+        Args:
+            columns: Columns to load (default: all of STORED_COLUMNS)
+            compact: Return compact dtypes (see utils/compact.py)
+
+        Returns:
+            DataFrame indexed by Date, as add_features and add_derived would return it
+        """
+        columns = list(STORED_COLUMNS if columns is None else columns)
+        unknown = [name for name in columns if name not in STORED_COLUMNS]
+        if unknown:
+            raise ValueError(f"Columns not in the feature store: {unknown}")
+
+        with self._series_lock(ticker, interval, exclusive=False):
+            df = self._load(ticker, interval, columns, start, end)
+
+        # add_features fills missing prices with 0; the raw values are stored for later appends
+        for name in OHLCV_COLUMNS:
+            if name in df.columns and df[name].isna().any():
+                df[name] = df[name].fillna(0)
+        if compact:
+            compact_ohlcv(df)
+            for name in df.columns:
+                if df[name].dtype == np.float64:
+                    df[name] = df[name].astype(FLOAT_DTYPE)
+        return df
+
+    def update(self, ticker, interval, ohlcv):
+        """
+        Store the features of bars in ohlcv that are new or changed
+
+        Args:
+            ohlcv: DataFrame with OHLCV columns indexed by Date (float64 prices,
+                   as the OHLCV cache returns them)
+
+        Returns:
+            int: Number of bars whose features were (re)written
+        """
+        if ohlcv is None or ohlcv.empty:
+            return 0
+        ohlcv = ohlcv[OHLCV_COLUMNS].astype(np.float64)
+
+        with self._ticker_lock(ticker, interval), self._series_lock(ticker, interval):
+            first = self.first_bar(ticker, interval)
+            if first is None or ohlcv.index[0] < _timestamp(first, ohlcv.index.tz):
+                # New series, or history older than what is stored: rebuild all of it
+                stored = self._load(ticker, interval, OHLCV_COLUMNS) if first is not None else None
+                return self._write(ticker, interval, _combine(stored, ohlcv))
+
+            stored = self._load(ticker, interval, OHLCV_COLUMNS, start=ohlcv.index[0])
+            changed = _changed(ohlcv, stored)
+            if changed.empty:
+                return 0
+
+            # Rewrite from the start of the file holding the first changed bar (when bars
+            # are appended, the file of the last stored bar, whose candle may have been partial)
+            tz = ohlcv.index.tz
+            rewrite_from = self._file_holding(ticker, interval, changed[0])
+            if tz is not None:
+                rewrite_from = rewrite_from.tz_localize('UTC').tz_convert(tz)
+
+            # The stored bars from there on, and CONTEXT bars before them
+            step = interval_to_timedelta(interval)
+            window = self._load(ticker, interval, OHLCV_COLUMNS, start=rewrite_from - 2 * CONTEXT * step)
+            if (window.index < rewrite_from).sum() < CONTEXT:
+                # Gaps in the bars: look for the context in the whole history
+                window = self._load(ticker, interval, OHLCV_COLUMNS)
+            before = window.index < rewrite_from
+            context = window[before].iloc[-CONTEXT:]
+            bars = _combine(context, window[~before], ohlcv[ohlcv.index >= rewrite_from])
+            return self._write(ticker, interval, bars, write_from=rewrite_from)
+
+    def _load(self, ticker, interval, columns, start=None, end=None):
+        """
+        Stored columns of the bars in [start, end], as written (missing prices still NaN)
+        """
+        if not self._partitions(ticker, interval):
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='Date'), dtype=np.float64)
+        dataset = ds.dataset(self._dir(ticker, interval), format='parquet', partitioning=PARTITIONING)
+
+        # Date partitions outside the range are skipped by name, row groups by their statistics
+        date_type = dataset.schema.field('Date').type
+        unit = partition_unit(interval)
+        condition = None
+        for bound, lower in ((start, True), (end, False)):
+            if bound is None:
+                continue
+            bound = _timestamp(bound, date_type.tz)
+            partition = _partition_name(bound, unit)
+            value = pa.scalar(bound, type=date_type)
+            if lower:
+                clause = (ds.field(PARTITION_FIELD) >= partition) & (ds.field('Date') >= value)
+            else:
+                clause = (ds.field(PARTITION_FIELD) <= partition) & (ds.field('Date') <= value)
+            condition = clause if condition is None else condition & clause
+
+        df = dataset.to_table(columns=['Date'] + list(columns), filter=condition).to_pandas().set_index('Date')
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        if not df.index.is_unique:
+            # A file being merged or superseded is briefly listed next to its replacement
+            df = df[~df.index.duplicated(keep='last')]
+        return df
+
+    def _write(self, ticker, interval, bars, write_from=None):
+        """
+        Compute the features of bars and write the partitions from write_from on
+        """
+        bars.index.name = 'Date'
+        features = add_features(bars.copy(), compact=False, extended=True)
+        add_derived(features)
+        # The raw prices are stored (add_features filled missing ones with 0)
+        features[OHLCV_COLUMNS] = bars[OHLCV_COLUMNS]
+        if write_from is not None:
+            features = features[features.index >= write_from]
+        features = features[STORED_COLUMNS]
+
+        self._write_definition()
+        metadata = {b'feature_version': self.version.encode()}
+        partitions = _partitions_of(features.index, partition_unit(interval))
+        written = {}
+        for i, (partition, lo, hi) in enumerate(partitions):
+            files = [(lo, hi)]
+            if i == len(partitions) - 1 and hi - lo > 1:
+                # The last bar on its own: the next update rewrites it if its candle was partial
+                files = [(lo, hi - 1), (hi - 1, hi)]
+            for first, end in files:
+                name = _file_name(features.index[first])
+                table = pa.Table.from_pandas(features.iloc[first:end].reset_index(), preserve_index=False)
+                table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+                self._write_file(ticker, interval, partition, name, table)
+                written.setdefault(partition, set()).add(name)
+
+        # Files from write_from on are superseded by the ones just written
+        write_from = None if write_from is None else _naive_utc(write_from)
+        for partition in self._partitions(ticker, interval):
+            if write_from is not None and partition < _partition_name(write_from, partition_unit(interval)):
+                continue
+            for name in self._files(ticker, interval, partition):
+                if name not in written.get(partition, ()) and (write_from is None or _file_start(name) >= write_from):
+                    _remove(os.path.join(self._partition_dir(ticker, interval, partition), name))
+        for partition in written:
+            self._merge(ticker, interval, partition)
+        return len(features)
+
+    def _write_file(self, ticker, interval, partition, name, table):
+        directory = self._partition_dir(ticker, interval, partition)
+        os.makedirs(directory, exist_ok=True)
+        # Hidden while it is written: dataset discovery skips names starting with '.'
+        tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        # Dictionary encoding only slows the writes down: prices and indicators rarely repeat
+        pq.write_table(table, tmp_path, use_dictionary=False)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    def _merge(self, ticker, interval, partition):
+        """
+        Merge all but the last file of a partition holding more than MAX_PART_FILES
+        """
+        names = self._files(ticker, interval, partition)
+        if len(names) <= MAX_PART_FILES:
+            return
+        directory = self._partition_dir(ticker, interval, partition)
+        tables = [pq.ParquetFile(os.path.join(directory, name)).read() for name in names[:-1]]
+        # Replaces the first file, then the merged ones are removed
+        self._write_file(ticker, interval, partition, names[0], pa.concat_tables(tables))
+        for name in names[1:-1]:
+            _remove(os.path.join(directory, name))
+
+    def _write_definition(self):
+        path = os.path.join(self.root, self.version, '_definition.json')
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(feature_definition(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def training_columns(features=None):
+    """
+    Columns training and evaluation read: the model features and the label inputs
+    """
+    return list(dict.fromkeys(list(features or model_features()) + LABEL_INPUTS))
+
+
+def stored_features(ohlcv, ticker, interval, columns=None, store=None, compact=COMPACT_DTYPES):
+    """
+    Features for the bars of ohlcv (and any newer stored ones), appending what the
+    store lacks first
+
+    Args:
+        ohlcv: OHLCV bars from the cache (float64 prices)
+        columns: Columns to read (default: all stored columns)
+        store: FeatureStore to use (defaults to the shared on-disk store)
+    """
+    store = store or get_default_store()
+    store.update(ticker, interval, ohlcv)
+    if ohlcv.empty:
+        return store.read(ticker, interval, columns=columns, compact=compact).iloc[:0]
+    return store.read(ticker, interval, start=ohlcv.index[0], columns=columns, compact=compact)
+
+
+_default_store = None
+
+
+def get_default_store():
+    """
+    Process-wide feature store backed by FEATURE_STORE_DIR
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = FeatureStore()
+    return _default_store
@@ -0,0 +1,413 @@
+import json
+import math
+from collections import deque
+
+# Window lengths and EMA spans are shared with add_features
+from utils.config import (MA_SHORT_WINDOW, MA_LONG_WINDOW, RSI_WINDOW, VOLATILITY_WINDOW,
+                          MACD_FAST_SPAN, MACD_SLOW_SPAN, MACD_SIGNAL_SPAN, EXTENDED_INDICATORS,
+                          BOLLINGER_WINDOW, BOLLINGER_STD, ATR_WINDOW, OBV_WINDOW, STOCH_WINDOW, STOCH_SMOOTH)
+
+# Running sums are recomputed from their window this often to stop rounding drift
+RESUM_EVERY = 1000
+
+
+class RollingSum:
+    """
+    Sum over the last `window` values, updated in O(1) per value. As in
+    add_features, the mean of a window holding a NaN is NaN.
+    """
+
+    def __init__(self, window, values=None, total=0.0):
+        self.window = window
+        self.values = deque(values or [], maxlen=window)
+        self.total = total
+        self.missing = sum(math.isnan(value) for value in self.values)
+        self.updates = 0
+
+    def push(self, value):
+        if len(self.values) == self.window:
+            oldest = self.values[0]
+            if math.isnan(oldest):
+                self.missing -= 1
+            else:
+                self.total -= oldest
+        self.values.append(value)
+        if math.isnan(value):
+            self.missing += 1
+        else:
+            self.total += value
+
+        self.updates += 1
+        if self.updates % RESUM_EVERY == 0:
+            self.total = math.fsum(value for value in self.values if not math.isnan(value))
+
+    def mean(self):
+        if len(self.values) < self.window or self.missing:
+            return math.nan
+        return self.total / self.window
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values), 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['window'], state['values'], state['total'])
+
+
+class RollingStd:
+    """
+    Sample standard deviation over the last `window` values using Welford's method,
+    with the oldest value removed as each new one arrives. The mean and M2 cover
+    the values that are not NaN; the deviation of a window holding a NaN is NaN.
+
+    As in add_features, a window of equal values has a deviation of exactly 0:
+    the running mean and M2 are reset to it, and they are recomputed from the
+    window every RESUM_EVERY values, so rounding errors do not accumulate.
+    """
+
+    def __init__(self, window, values=None, mean=0.0, m2=0.0):
+        self.window = window
+        self.values = deque(values or [], maxlen=window)
+        self.mean_value = mean
+        self.m2 = m2
+        self.missing = sum(math.isnan(value) for value in self.values)
+        # Number of equal values ending with the newest one
+        self.equal_run = 0
+        for value in reversed(self.values):
+            if value != self.values[-1]:
+                break
+            self.equal_run += 1
+        self.updates = 0
+
+    def push(self, value):
+        full = len(self.values) == self.window
+        oldest = self.values[0] if full else math.nan
+        if full and not self.missing and not math.isnan(value):
+            # Replace the oldest value: mean and M2 shift by the difference
+            self.values.append(value)
+            old_mean = self.mean_value
+            self.mean_value += (value - oldest) / self.window
+            self.m2 += (value - oldest) * (value - self.mean_value + oldest - old_mean)
+        else:
+            # Remove the oldest value and add the new one with plain Welford updates
+            if full:
+                self._remove(oldest)
+            self.values.append(value)
+            self._add(value)
+        self.m2 = max(self.m2, 0.0)
+
+        self.equal_run = self.equal_run + 1 if len(self.values) > 1 and value == self.values[-2] else 1
+        self.updates += 1
+        if self.equal_run >= self.window:
+            self.mean_value, self.m2 = value, 0.0
+        elif self.updates % RESUM_EVERY == 0:
+            self._resum()
+
+    def _resum(self):
+        # Two passes over the window
+        present = [value for value in self.values if not math.isnan(value)]
+        if not present:
+            self.mean_value, self.m2 = 0.0, 0.0
+            return
+        self.mean_value = math.fsum(present) / len(present)
+        self.m2 = math.fsum((value - self.mean_value) ** 2 for value in present)
+
+    def _count(self):
+        return len(self.values) - self.missing
+
+    def _add(self, value):
+        if math.isnan(value):
+            self.missing += 1
+            return
+        delta = value - self.mean_value
+        self.mean_value += delta / self._count()
+        self.m2 += delta * (value - self.mean_value)
+
+    def _remove(self, value):
+        # Called while value is still in the window
+        if math.isnan(value):
+            self.missing -= 1
+            return
+        remaining = self._count() - 1
+        if remaining == 0:
+            self.mean_value = 0.0
+            self.m2 = 0.0
+            return
+        delta = value - self.mean_value
+        self.mean_value -= delta / remaining
+        self.m2 -= delta * (value - self.mean_value)
+
+    def std(self):
+        if len(self.values) < self.window or self.missing:
+            return math.nan
+        if self.equal_run >= self.window:
+            return 0.0
+        return math.sqrt(self.m2 / (self.window - 1))
+
+    def to_dict(self):
+        return {'window': self.window, 'values': list(self.values), 'mean': self.mean_value, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['window'], state['values'], state['mean'], state['m2'])
+
+
+def _ema(previous, value, span, gap=0):
+    """
+    One step of an exponential moving average as pandas' ewm(span, adjust=False)
+
+    The average is seeded with the first value that is not NaN and carried
+    over NaN values; the value after `gap` NaNs is weighted against the
+    previous average decayed over the gap, as pandas does.
+    """
+    if previous is None or math.isnan(previous):
+        return value
+    if math.isnan(value):
+        return previous
+    alpha = 2.0 / (span + 1)
+    if gap == 0:
+        return alpha * value + (1 - alpha) * previous
+    old_weight = (1 - alpha) ** (gap + 1)
+    return (old_weight * previous + alpha * value) / (old_weight + alpha)
+
+
+def _zero_if_nan(value):
+    return 0.0 if math.isnan(value) else value
+
+
+def _fmax(a, b):
+    """
+    Larger of two values, ignoring a NaN (as np.fmax)
+    """
+    if math.isnan(a):
+        return b
+    if math.isnan(b):
+        return a
+    return max(a, b)
+
+
+def _window_mean(values, window):
+    """
+    Mean of a short deque of the last `window` values, NaN until it is full
+    or while it holds a NaN
+    """
+    if len(values) < window:
+        return math.nan
+    return math.fsum(values) / window
+
+
+def _divide(numerator, denominator):
+    """
+    Division with NumPy's results for a zero denominator
+    """
+    if denominator == 0:
+        return math.nan if numerator == 0 or math.isnan(numerator) else math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+class IndicatorState:
+    """
+    Incremental version of add_features for live data.
+
+    Each call to update() takes one new candle and returns the indicator row
+    add_features would produce for it, in O(1) time: running sums for the moving
+    averages and RSI gain/loss, recursive EMAs for MACD and Welford's method for
+    the rolling standard deviation. With extended, the Bollinger bands, ATR and
+    OBV use the same running sums and the stochastic oscillator keeps the last
+    STOCH_WINDOW highs and lows. The state can be serialised with to_json() and
+    restored with from_json() to resume after a restart.
+
+    Args:
+        extended: Also compute the EXTENDED_INDICATORS columns (as add_features(extended=True))
+    """
+
+    def __init__(self, extended=EXTENDED_INDICATORS):
+        self.extended = extended
+        self.prev_close = None
+        # Missing closes since the last one (the EMAs weigh the next close by the gap)
+        self.close_gap = 0
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_signal = None
+        self.ma_short = RollingSum(MA_SHORT_WINDOW)
+        self.ma_long = RollingSum(MA_LONG_WINDOW)
+        self.gains = RollingSum(RSI_WINDOW)
+        self.losses = RollingSum(RSI_WINDOW)
+        self.volatility = RollingStd(VOLATILITY_WINDOW)
+        if extended:
+            self.bollinger_mean = RollingSum(BOLLINGER_WINDOW)
+            self.bollinger_std = RollingStd(BOLLINGER_WINDOW)
+            self.true_range = RollingSum(ATR_WINDOW)
+            self.obv = RollingSum(OBV_WINDOW)
+            self.highs = deque(maxlen=STOCH_WINDOW)
+            self.lows = deque(maxlen=STOCH_WINDOW)
+            self.stoch = deque(maxlen=STOCH_SMOOTH)
+
+    def update(self, bar):
+        """
+        Add one candle and return its features
+
+        Args:
+            bar: dict or Series with Open, High, Low, Close and Volume (only
+                 Close is read, and High, Low and Volume with extended)
+
+        Returns:
+            dict: The candle's OHLCV values plus MA14, MA50, Price_Change, RSI,
+                  MACD, MACD_Signal, MACD_Hist and Volatility, and with extended
+                  BB_Upper, BB_Lower, ATR, OBV, Stoch_K and Stoch_D
+        """
+        close = float(bar['Close'])
+        prev_close = self.prev_close
+
+        if self.prev_close is None:
+            # The first diff is NaN, which add_features counts as neither gain nor loss
+            price_change = math.nan
+            delta = 0.0
+        else:
+            price_change = close / self.prev_close - 1 if self.prev_close != 0 else math.nan
+            delta = close - self.prev_close
+        self.prev_close = close
+
+        self.ma_short.push(close)
+        self.ma_long.push(close)
+        self.gains.push(delta if delta > 0 else 0.0)
+        self.losses.push(-delta if delta < 0 else 0.0)
+        self.volatility.push(close)
+
+        gap = self.close_gap
+        self.close_gap = gap + 1 if math.isnan(close) else 0
+        self.ema_fast = _ema(self.ema_fast, close, MACD_FAST_SPAN, gap)
+        self.ema_slow = _ema(self.ema_slow, close, MACD_SLOW_SPAN, gap)
+        macd = self.ema_fast - self.ema_slow
+        self.macd_signal = _ema(self.macd_signal, macd, MACD_SIGNAL_SPAN)
+
+        gain = self.gains.mean()
+        loss = self.losses.mean()
+        if math.isnan(gain) or (gain == 0 and loss == 0):
+            rsi = math.nan
+        elif loss == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - (100 / (1 + gain / loss))
+
+        row = {column: bar[column] for column in ('Open', 'High', 'Low', 'Close', 'Volume') if column in bar}
+        row.update({
+            'MA14': _zero_if_nan(self.ma_short.mean()),
+            'MA50': _zero_if_nan(self.ma_long.mean()),
+            'Price_Change': _zero_if_nan(price_change),
+            'RSI': _zero_if_nan(rsi),
+            'MACD': _zero_if_nan(macd),
+            'MACD_Signal': _zero_if_nan(self.macd_signal),
+            'MACD_Hist': _zero_if_nan(macd - self.macd_signal),
+            'Volatility': _zero_if_nan(self.volatility.std()),
+        })
+        if self.extended:
+            row.update(self._update_extended(bar, close, prev_close, delta))
+        return row
+
+    def _update_extended(self, bar, close, prev_close, delta):
+        high = float(bar['High'])
+        low = float(bar['Low'])
+        volume = float(bar['Volume'])
+
+        # Bollinger bands: moving average +/- BOLLINGER_STD standard deviations
+        self.bollinger_mean.push(close)
+        self.bollinger_std.push(close)
+        mean = self.bollinger_mean.mean()
+        width = BOLLINGER_STD * self.bollinger_std.std()
+
+        # Average true range: the first bar has no previous close, leaving high - low
+        true_range = high - low
+        if prev_close is not None:
+            true_range = _fmax(_fmax(true_range, abs(high - prev_close)), abs(low - prev_close))
+        self.true_range.push(true_range)
+
+        # On-balance volume over the last OBV_WINDOW bars; a missing volume or move counts as 0
+        direction = (delta > 0) - (delta < 0)
+        self.obv.push(direction * (0.0 if math.isnan(volume) else volume))
+
+        # Stochastic oscillator: close within the range of the last STOCH_WINDOW bars
+        self.highs.append(high)
+        self.lows.append(low)
+        stoch_k = math.nan
+        if len(self.lows) == STOCH_WINDOW:
+            lowest = min(self.lows)
+            stoch_k = 100 * _divide(close - lowest, max(self.highs) - lowest)
+        self.stoch.append(stoch_k)
+
+        return {
+            'BB_Upper': _zero_if_nan(mean + width),
+            'BB_Lower': _zero_if_nan(mean - width),
+            'ATR': _zero_if_nan(self.true_range.mean()),
+            'OBV': _zero_if_nan(self.obv.mean() * OBV_WINDOW),
+            'Stoch_K': _zero_if_nan(stoch_k),
+            'Stoch_D': _zero_if_nan(_window_mean(self.stoch, STOCH_SMOOTH)),
+        }
+
+    @classmethod
+    def from_history(cls, df, extended=EXTENDED_INDICATORS):
+        """
+        Build a state by replaying historical OHLCV bars (oldest first)
+        """
+        state = cls(extended)
+        columns = ['Close', 'High', 'Low', 'Volume'] if extended else ['Close']
+        for values in zip(*(df[column].to_numpy(dtype=float) for column in columns)):
+            state.update(dict(zip(columns, values)))
+        return state
+
+    def to_dict(self):
+        state = {
+            'extended': self.extended,
+            'prev_close': self.prev_close,
+            'close_gap': self.close_gap,
+            'ema_fast': self.ema_fast,
+            'ema_slow': self.ema_slow,
+            'macd_signal': self.macd_signal,
+            'ma_short': self.ma_short.to_dict(),
+            'ma_long': self.ma_long.to_dict(),
+            'gains': self.gains.to_dict(),
+            'losses': self.losses.to_dict(),
+            'volatility': self.volatility.to_dict(),
+        }
+        if self.extended:
+            state.update({
+                'bollinger_mean': self.bollinger_mean.to_dict(),
+                'bollinger_std': self.bollinger_std.to_dict(),
+                'true_range': self.true_range.to_dict(),
+                'obv': self.obv.to_dict(),
+                'highs': list(self.highs),
+                'lows': list(self.lows),
+                'stoch': list(self.stoch),
+            })
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        # States saved before the extended indicators have no 'extended' key
+        indicator_state = cls(state.get('extended', False))
+        indicator_state.prev_close = state['prev_close']
+        indicator_state.close_gap = state.get('close_gap', 0)
+        indicator_state.ema_fast = state['ema_fast']
+        indicator_state.ema_slow = state['ema_slow']
+        indicator_state.macd_signal = state['macd_signal']
+        indicator_state.ma_short = RollingSum.from_dict(state['ma_short'])
+        indicator_state.ma_long = RollingSum.from_dict(state['ma_long'])
+        indicator_state.gains = RollingSum.from_dict(state['gains'])
+        indicator_state.losses = RollingSum.from_dict(state['losses'])
+        indicator_state.volatility = RollingStd.from_dict(state['volatility'])
+        if indicator_state.extended:
+            indicator_state.bollinger_mean = RollingSum.from_dict(state['bollinger_mean'])
+            indicator_state.bollinger_std = RollingStd.from_dict(state['bollinger_std'])
+            indicator_state.true_range = RollingSum.from_dict(state['true_range'])
+            indicator_state.obv = RollingSum.from_dict(state['obv'])
+            indicator_state.highs.extend(state['highs'])
+            indicator_state.lows.extend(state['lows'])
+            indicator_state.stoch.extend(state['stoch'])
+        return indicator_state
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, payload):
+        return cls.from_dict(json.loads(payload))
@@ -1,5 +1,17 @@
 import pandas as pd 
 import numpy as np
+from utils.compact import compact_float
+from utils.config import RSI_OVERSOLD, RSI_OVERBOUGHT, COMPACT_DTYPES
+
+SIGNAL_NAMES = np.array(['Sell', 'Hold', 'Buy'])
+
+# add_features columns the labels are computed from
+LABEL_INPUTS = ['Close', 'MA14', 'MA50', 'RSI', 'MACD', 'MACD_Signal']
+
+# Categories of the compact Signal column, in LabelEncoder order so that the
+# int8 codes equal the encoded labels
+SIGNAL_CATEGORIES = sorted(SIGNAL_NAMES)
+SIGNAL_CODES = np.array([SIGNAL_CATEGORIES.index(name) for name in SIGNAL_NAMES], dtype=np.int8)
 
 def label(row):
     """
@@ -7,6 +19,8 @@ def label(row):
     - Price relation to Moving Averages (MA14, MA50)
     - RSI levels (overbought/oversold)
     - MACD signal line crossovers
+    
+    Row-wise reference implementation; generate_labels uses the vectorised label_signals.
     """
     signals = []
     
@@ -17,9 +31,9 @@ def label(row):
         signals.append('Sell')  # Strong downtrend
     
     # Check RSI signals (traditional levels: >70 overbought, <30 oversold)
-    if row['RSI'] < 30:
+    if row['RSI'] < RSI_OVERSOLD:
         signals.append('Buy')  # Oversold condition
-    elif row['RSI'] > 70:
+    elif row['RSI'] > RSI_OVERBOUGHT:
         signals.append('Sell')  # Overbought condition
     
     # Check MACD signals
@@ -42,7 +56,59 @@ def label(row):
     else:
         return 'Hold'
 
-def generate_labels(df):
+def label_signals(df):
+    """
+    Vectorised equivalent of applying label() to every row.
+    
+    Args:
+        df: DataFrame with Close, MA14, MA50, RSI, MACD and MACD_Signal columns
+    
+    Returns:
+        ndarray: 'Buy', 'Sell' or 'Hold' per row
+    """
+    return SIGNAL_NAMES[signal_index(df)]
+
+def signal_index(df):
+    """
+    Index into SIGNAL_NAMES of each row's label.
+    
+    Each indicator casts a vote of +1 (Buy), -1 (Sell) or 0 as an int8 array; the
+    majority rule of label() is then just the sign of the summed votes.
+    """
+    close = df['Close'].to_numpy()
+    ma14 = df['MA14'].to_numpy()
+    ma50 = df['MA50'].to_numpy()
+    rsi = df['RSI'].to_numpy()
+    macd = df['MACD'].to_numpy()
+    macd_signal = df['MACD_Signal'].to_numpy()
+    
+    # Moving average trend vote
+    votes = ((close > ma14) & (ma14 > ma50)).astype(np.int8)
+    votes -= (close < ma14) & (ma14 < ma50)
+    
+    # RSI oversold/overbought vote
+    votes += rsi < RSI_OVERSOLD
+    votes -= rsi > RSI_OVERBOUGHT
+    
+    # MACD signal line vote
+    votes += macd > macd_signal
+    votes -= macd < macd_signal
+    
+    # Majority rule: sign of the vote total indexes Sell/Hold/Buy
+    return np.sign(votes) + 1
+
+def generate_labels(df, compact=COMPACT_DTYPES):
+    """
+    Add Next_Close, Next_Day_Return and the Signal label
+    
+    Args:
+        df: DataFrame from add_features
+        compact: Store float32 returns and a categorical Signal (int8 codes in
+                 SIGNAL_CATEGORIES order)
+    """
+    if compact:
+        return _generate_labels_compact(df)
+    
     # Debug info
     print("DataFrame shape:", df.shape)
     print("DataFrame columns:", df.columns)
@@ -59,8 +125,18 @@ def generate_labels(df):
     print("Returns shape:", returns.shape)
     df['Next_Day_Return'] = returns.fillna(0)
     
-    # Applying the 'label' function to generate signals
+    # Generating signals with the vectorised labeller
     print("Generating signals...")
-    df['Signal'] = df.apply(label, axis=1)
+    df['Signal'] = label_signals(df)
+    
+    return df
+
+def _generate_labels_compact(df):
+    close = df['Close'].astype('float64')
+    next_close = close.shift(-1)
+    df['Next_Close'] = compact_float(next_close)
+    df['Next_Day_Return'] = compact_float((next_close / close - 1).fillna(0))
+    del close, next_close
     
+    df['Signal'] = pd.Categorical.from_codes(SIGNAL_CODES[signal_index(df)], categories=SIGNAL_CATEGORIES)
     return df
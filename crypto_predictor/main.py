@@ -1,43 +1,70 @@
 from data.fetch_data import fetch_crypto_data
-from features.engineer_features import add_features
+from data.cache import interval_to_timedelta
+from features.store import stored_features, training_columns
 from labels.create_labels import generate_labels
 from model.train_model import train
 from model.predict_model import predict_action
+from model.registry import get_registry
+from backtest.engine import run_backtest, signals_to_positions
+from utils.config import TICKER, INTERVAL, MODEL_DIR, REPORTS_DIR
+from utils.profiler import profiler
+import argparse
 import pandas as pd
-import joblib
 import os
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 
-def main():
+def main(profile=False, trace_allocations=False, reports=False, force_retrain=False):
+    """
+    Fetch, label, train, evaluate and predict
+    
+    Args:
+        profile: Record time and memory per stage, print a summary and write
+                 reports/profile.json
+        trace_allocations: Also record Python allocation peaks (slower)
+        reports: Also draw the report plots (see report())
+        force_retrain: Train even if the stored bundle was trained on the same inputs
+    """
+    if profile:
+        profiler.enable(trace_allocations)
+    
     print("Cryptocurrency Trading Signal Predictor")
     print("======================================")
     
     # Step 1: Fetch Data
     print("\nFetching historical cryptocurrency data...")
-    df = fetch_crypto_data()
+    with profiler.stage('Fetch data'):
+        # float64 prices: the feature store computes from them and compacts what it returns
+        df = fetch_crypto_data(compact=False)
     print(f"Data fetched: {len(df)} records from {df.index.min().date()} to {df.index.max().date()}")
     
-    # Step 2: Feature Engineering
-    print("\nEngineering features...")
-    df = add_features(df)
+    # Step 2: Feature Engineering (only bars the feature store lacks are computed)
+    print("\nLoading features...")
+    with profiler.stage('Features'):
+        df = stored_features(df, TICKER, INTERVAL, columns=training_columns())
     
     # Step 3: Create Labels
     print("\nGenerating trading signals...")
-    df = generate_labels(df)
+    with profiler.stage('Labels'):
+        df = generate_labels(df)
     
     # Step 4: Train Model
     print("\nTraining prediction model...")
-    model = train(df)
+    with profiler.stage('Training'):
+        model = train(df, force=force_retrain)
     
     # Step 5: Evaluate on test data
-    evaluate_model(df, model)
+    with profiler.stage('Evaluation'):
+        evaluate_model(df, model)
+    
+    if reports:
+        with profiler.stage('Reports'):
+            report()
     
     # Step 6: Predict on latest data
     latest_data = df.iloc[-1]
-    action = predict_action(model, latest_data)
+    with profiler.stage('Prediction'):
+        action = predict_action(model, df)
     
     print("\n====== PREDICTION RESULT ======")
     print(f"Latest Date: {df.index[-1].date()}")
@@ -46,49 +73,44 @@ def main():
     print(f"MACD: {latest_data['MACD']:.4f}")
     print(f"Recommended Action: {action}")
     print("===============================")
+    
+    if profile:
+        print("\nTime and memory per stage:")
+        print(profiler.summary())
+        print(f"Profile written to {profiler.write_report()}")
 
-def evaluate_model(df, model):
+def report(full_learning_curve=False, model_dir=MODEL_DIR, reports_dir=REPORTS_DIR):
+    """
+    Draw the feature importance, learning curve and confusion matrix plots for
+    the saved bundle (matplotlib is only imported here)
+    
+    Args:
+        full_learning_curve: Refit the best model on ten training sizes for the
+                             learning curve (fetches the training data again)
+    """
+    from reporting.reports import generate_reports
+    
+    df = None
+    if full_learning_curve:
+        df = generate_labels(stored_features(fetch_crypto_data(compact=False), TICKER, INTERVAL))
+    return generate_reports(model_dir, reports_dir, full_learning_curve=full_learning_curve, df=df)
+
+def evaluate_model(df, model, model_dir=MODEL_DIR, reports_dir=REPORTS_DIR, interval=INTERVAL):
     """
     Evaluate model performance on historical data
+    
+    The history includes the rows the model was trained on, so these figures are
+    in-sample; model/walk_forward.py gives out-of-sample ones. interval is the
+    bar interval of df, which annualises the backtest.
     """
-    # Load the scaler
-    scaler = joblib.load('model/saved/scaler.pkl')
-    
-    # Load the label encoder
-    label_encoder = joblib.load('model/saved/label_encoder.pkl')
-    
-    # Load feature list
-    with open('model/saved/features.txt', 'r') as f:
-        features = [line.strip() for line in f.readlines()]
-    
-    # Add the new features if they don't exist in the dataframe
-    if 'RSI_Change' not in df.columns:
-        df.loc[:, 'RSI_Change'] = df['RSI'].diff()
-    
-    if 'MACD_Change' not in df.columns:
-        df.loc[:, 'MACD_Change'] = df['MACD'].diff()
-        
-    if 'MA_Ratio' not in df.columns:
-        df.loc[:, 'MA_Ratio'] = df['MA14'] / df['MA50']
-        
-    if 'Price_MA14_Ratio' not in df.columns:
-        df.loc[:, 'Price_MA14_Ratio'] = df['Close'] / df['MA14']
-    
-    # Replace infinite values with NaN
-    df = df.replace([np.inf, -np.inf], np.nan)
-    
-    # Prepare the data, fill NaN values with column means
-    col_means = df[features].mean()
-    df = df.fillna(col_means)
-    
-    # Final check for any remaining NaNs
-    X = df[features].fillna(0)
-    y = df['Signal'].fillna('Hold')
+    # Scaler, label encoder and feature pipeline come from the current bundle
+    bundle = get_registry(model_dir).reload()
+    scaler = bundle.scaler
+    label_encoder = bundle.label_encoder
     
-    # Drop rows with NaN values
-    valid_indices = ~X.isna().any(axis=1)
-    X = X[valid_indices]
-    y = y[valid_indices]
+    # Build the feature matrix exactly as in training (means from the training bundle)
+    X = bundle.pipeline.transform(df)
+    y = df['Signal'].fillna('Hold')
     
     # Encode the target labels
     y_encoded = label_encoder.transform(y)
@@ -104,7 +126,7 @@ def evaluate_model(df, model):
     
     # Calculate accuracy
     accuracy = accuracy_score(y, y_pred)
-    print(f"\nHistorical Prediction Accuracy: {accuracy:.4f}")
+    print(f"\nHistorical Prediction Accuracy (in-sample): {accuracy:.4f}")
     
     # Print classification report
     print("\nClassification Report:")
@@ -113,64 +135,73 @@ def evaluate_model(df, model):
     # Create confusion matrix
     cm = confusion_matrix(y, y_pred)
     
-    # Ensure 'reports' directory exists
-    os.makedirs('reports', exist_ok=True)
+    # Ensure the reports directory exists
+    os.makedirs(reports_dir, exist_ok=True)
     
     # Save confusion matrix as CSV
     cm_df = pd.DataFrame(cm, index=label_encoder.classes_, columns=label_encoder.classes_)
-    cm_df.to_csv('reports/confusion_matrix.csv')
+    cm_df.to_csv(os.path.join(reports_dir, 'confusion_matrix.csv'))
     
     # Calculate backtest performance
-    backtest_performance(df, y_pred)
+    backtest_performance(df, y_pred, reports_dir, interval)
 
-def backtest_performance(df, predictions):
+def backtest_performance(df, predictions, reports_dir=REPORTS_DIR, interval=INTERVAL):
     """
-    Simulate trading performance based on predictions
+    Simulate trading performance based on predictions (df holds bars of interval)
     """
-    # Create a copy of dataframe with predictions
-    backtest_df = df.copy()
-    
-    # Map the predictions to dataframe
-    backtest_df = backtest_df.iloc[:len(predictions)]
-    backtest_df['Predicted_Signal'] = predictions
-    
-    # Calculate returns based on signals
-    backtest_df['Strategy_Return'] = 0.0
-    
-    # For Buy signals, we buy at close and sell at next close
-    buy_signals = backtest_df['Predicted_Signal'] == 'Buy'
-    backtest_df.loc[buy_signals, 'Strategy_Return'] = backtest_df.loc[buy_signals, 'Next_Day_Return']
-    
-    # For Sell signals, we short at close and buy back at next close (negative return)
-    sell_signals = backtest_df['Predicted_Signal'] == 'Sell'
-    backtest_df.loc[sell_signals, 'Strategy_Return'] = -backtest_df.loc[sell_signals, 'Next_Day_Return']
-    
-    # Calculate cumulative returns
-    backtest_df['Cumulative_Market_Return'] = (1 + backtest_df['Next_Day_Return']).cumprod() - 1
-    backtest_df['Cumulative_Strategy_Return'] = (1 + backtest_df['Strategy_Return']).cumprod() - 1
+    # Only the rows that have predictions
+    df = df.iloc[:len(predictions)]
+    next_day_return = df['Next_Day_Return'].to_numpy()
+    
+    # Column 0: Buy goes long and Sell goes short from close to next close
+    # Column 1: buy and hold (the market)
+    signal_positions = signals_to_positions(predictions)
+    positions = np.column_stack([signal_positions, np.ones(len(df))])
+    # Crypto trades around the clock, so a year is 365 days of bars of the interval
+    periods_per_year = pd.Timedelta(days=365) / interval_to_timedelta(interval)
+    result = run_backtest(next_day_return, positions, periods_per_year=periods_per_year)
     
     # Calculate some performance metrics
-    total_trades = len(backtest_df[backtest_df['Predicted_Signal'] != 'Hold'])
-    winning_trades = len(backtest_df[(backtest_df['Predicted_Signal'] != 'Hold') & 
-                                    (backtest_df['Strategy_Return'] > 0)])
-    
-    if total_trades > 0:
-        win_rate = winning_trades / total_trades
-    else:
-        win_rate = 0
-        
-    final_market_return = backtest_df['Cumulative_Market_Return'].iloc[-1]
-    final_strategy_return = backtest_df['Cumulative_Strategy_Return'].iloc[-1]
+    total_trades = int(result['trades'][0])
+    win_rate = result['win_rate'][0]
+    final_market_return = result['total_return'][1]
+    final_strategy_return = result['total_return'][0]
     
     print("\nBacktest Results:")
     print(f"Total Trades: {total_trades}")
     print(f"Win Rate: {win_rate:.2%}")
     print(f"Market Return: {final_market_return:.2%}")
     print(f"Strategy Return: {final_strategy_return:.2%}")
+    print(f"Sharpe Ratio: {result['sharpe'][0]:.2f}")
+    print(f"Max Drawdown: {result['max_drawdown'][0]:.2%}")
     
     # Save backtest results
-    backtest_df[['Close', 'Predicted_Signal', 'Next_Day_Return', 'Strategy_Return', 
-                'Cumulative_Market_Return', 'Cumulative_Strategy_Return']].to_csv('reports/backtest_results.csv')
+    backtest_df = pd.DataFrame({
+        'Close': df['Close'].to_numpy(),
+        'Predicted_Signal': predictions,
+        'Next_Day_Return': next_day_return,
+        'Strategy_Return': result['strategy_returns'][:, 0],
+        'Cumulative_Market_Return': result['equity'][:, 1] - 1,
+        'Cumulative_Strategy_Return': result['equity'][:, 0] - 1,
+    }, index=df.index)
+    backtest_df.to_csv(os.path.join(reports_dir, 'backtest_results.csv'))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Train the signal model and predict the latest action')
+    parser.add_argument('command', nargs='?', choices=['train', 'report'], default='train',
+                        help="'train' (default) runs the pipeline, 'report' draws the plots for the saved model")
+    parser.add_argument('--profile', action='store_true',
+                        help='Print time and memory per stage and write reports/profile.json')
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help='With --profile, also trace Python allocation peaks (slower)')
+    parser.add_argument('--reports', action='store_true', help='Draw the report plots after training')
+    parser.add_argument('--force-retrain', action='store_true',
+                        help='Train even if the stored bundle was trained on the same data and parameters')
+    parser.add_argument('--full-learning-curve', action='store_true',
+                        help='report: refit the model for the learning curve instead of using the saved CV scores')
+    args = parser.parse_args()
+    if args.command == 'report':
+        report(full_learning_curve=args.full_learning_curve)
+    else:
+        main(profile=args.profile, trace_allocations=args.trace_allocations, reports=args.reports,
+             force_retrain=args.force_retrain)
@@ -0,0 +1,131 @@
+"""
+Content-addressed store for model bundles.
+
+Every bundle is written to <model_dir>/bundles/<key>, where the key is a
+fingerprint of the training inputs (feature matrix, labels, feature list and
+training parameters). A bundle is assembled in a staging directory and renamed
+into place complete, and the LATEST file, replaced atomically, names the bundle
+that is served. The registry follows that pointer, so a reader never sees files
+from two different trainings.
+
+When a retrain is given the same inputs, the existing bundle is reused and
+nothing is trained.
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from model.registry import BUNDLES_DIR, LATEST_FILE, MANIFEST_FILE
+from utils.config import MODEL_DIR, ARTIFACT_STORE_KEEP
+
+
+def fingerprint(X, y, features, params):
+    """
+    Hash of everything a training run depends on
+
+    Args:
+        X: Feature matrix (before scaling)
+        y: Labels
+        features: Feature names in column order
+        params: JSON-serialisable training parameters (grids, search mode, library versions, ...)
+
+    Returns:
+        str: 16 hex digit key
+    """
+    digest = hashlib.sha256()
+    X = np.ascontiguousarray(X)
+    digest.update(f"{X.dtype.str}{X.shape}".encode())
+    digest.update(X.tobytes())
+    digest.update('\0'.join(map(str, np.asarray(y))).encode())
+    digest.update(json.dumps({'features': list(features), 'params': params},
+                             sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+class ArtifactStore:
+    """
+    Bundles under <root>/bundles/<key>, the served one named by <root>/LATEST
+    """
+
+    def __init__(self, root=MODEL_DIR, keep=ARTIFACT_STORE_KEEP):
+        self.root = root
+        self.keep = keep
+        self.bundles_dir = os.path.join(root, BUNDLES_DIR)
+
+    def bundle_dir(self, key):
+        return os.path.join(self.bundles_dir, key)
+
+    def has(self, key):
+        """
+        True if a complete bundle for key exists
+        """
+        return os.path.exists(os.path.join(self.bundle_dir(key), MANIFEST_FILE))
+
+    def latest(self):
+        """
+        Key of the served bundle, or None
+        """
+        try:
+            with open(os.path.join(self.root, LATEST_FILE), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def staging(self, key):
+        """
+        Directory to write the bundle for key into; it is moved to its final
+        place when the block succeeds and deleted when it raises
+        """
+        os.makedirs(self.bundles_dir, exist_ok=True)
+        tmp_dir = os.path.join(self.bundles_dir, f".{key}.{uuid.uuid4().hex[:8]}.tmp")
+        os.makedirs(tmp_dir)
+        try:
+            yield tmp_dir
+            if self.has(key):
+                # Another run produced the same bundle meanwhile
+                shutil.rmtree(tmp_dir)
+            else:
+                os.replace(tmp_dir, self.bundle_dir(key))
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def publish(self, key):
+        """
+        Point LATEST at the bundle for key and drop old bundles beyond `keep`
+        """
+        if not self.has(key):
+            raise FileNotFoundError(f"No bundle {key} in {self.bundles_dir}")
+        path = os.path.join(self.root, LATEST_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(key)
+        os.replace(tmp_path, path)
+        self.prune()
+
+    def keys(self):
+        """
+        Keys of the complete bundles, newest first
+        """
+        if not os.path.isdir(self.bundles_dir):
+            return []
+        keys = [name for name in os.listdir(self.bundles_dir) if not name.startswith('.') and self.has(name)]
+        return sorted(keys, key=lambda key: os.path.getmtime(os.path.join(self.bundle_dir(key), MANIFEST_FILE)),
+                      reverse=True)
+
+    def prune(self):
+        """
+        Delete all but the `keep` newest bundles (never the served one)
+        """
+        if not self.keep:
+            return
+        latest = self.latest()
+        for key in self.keys()[self.keep:]:
+            if key != latest:
+                shutil.rmtree(self.bundle_dir(key), ignore_errors=True)
@@ -0,0 +1,154 @@
+"""
+Execution layer for the hyperparameter searches in model/train_model.py.
+
+Three things keep a search from wasting the cores it is given:
+
+- The training matrix is written to disk once and opened as a read-only memory
+  map (shared_matrix). joblib passes memory-mapped arrays to its worker
+  processes by file name, so no search pickles X_train again and every worker
+  reads the same pages.
+- Every model family gets an explicit thread budget (thread_plan): a search
+  runs cpus // threads worker processes, each fit uses `threads` threads, and
+  the BLAS/OpenMP pools inside the workers are capped to the same number, so
+  XGBoost's own threads no longer pile up inside every joblib process.
+- Each fit of a search, fold fits and the final refit alike, goes through
+  CachedFit, which stores the fitted estimator in a joblib.Memory cache keyed on
+  the estimator class, its parameters (thread counts excluded), the library
+  version and a hash of the rows it is fitted on. A rerun after an interrupted
+  or partly changed training, or a search over an extended grid, loads the fits
+  it has already done instead of repeating them.
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+from joblib import Memory, effective_n_jobs, parallel_config
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+
+from utils.config import FIT_CACHE_DIR, FIT_CACHE_BYTES_LIMIT, ESTIMATOR_THREADS
+
+# Estimator parameters that set a thread count: they do not change the fitted
+# model, so they are left out of the cache key
+THREAD_PARAMS = ('n_jobs', 'nthread')
+
+
+def thread_plan(name, n_jobs):
+    """
+    Worker processes and threads per fit for the search of one model family
+
+    Args:
+        name: Model family, looked up in ESTIMATOR_THREADS (1 thread if missing)
+        n_jobs: CPU budget of the whole search, joblib style (-1 for all cores)
+
+    Returns:
+        tuple: (search workers, threads per fit), whose product fits the budget
+    """
+    cpus = effective_n_jobs(n_jobs)
+    threads = max(1, min(ESTIMATOR_THREADS.get(name, 1), cpus))
+    return max(1, cpus // threads), threads
+
+
+def with_threads(estimator, threads):
+    """
+    Set the thread count of an estimator that has one (n_jobs); others are
+    returned unchanged
+    """
+    if 'n_jobs' in estimator.get_params(deep=False):
+        estimator.set_params(n_jobs=threads)
+    return estimator
+
+
+@contextmanager
+def search_context(threads):
+    """
+    Run the enclosed search with loky workers whose BLAS/OpenMP pools are
+    limited to `threads` threads each
+    """
+    with parallel_config(backend='loky', inner_max_num_threads=threads):
+        yield
+
+
+def shared_matrix(X, directory, name='X_train'):
+    """
+    Write X to <directory>/<name>.npy and return it as a read-only memory map
+
+    The array stays valid only as long as the file does; the caller owns the
+    directory (a temporary one for the duration of training).
+    """
+    path = os.path.join(directory, f'{name}.npy')
+    np.save(path, np.ascontiguousarray(X))
+    return np.load(path, mmap_mode='r')
+
+
+def fit_memory(cache_dir=FIT_CACHE_DIR):
+    """
+    joblib.Memory for fitted estimators, or None when caching is switched off
+    (cache_dir None)
+    """
+    if not cache_dir:
+        return None
+    return Memory(cache_dir, verbose=0)
+
+
+def prune_fit_cache(cache_dir=FIT_CACHE_DIR, bytes_limit=FIT_CACHE_BYTES_LIMIT):
+    """
+    Delete the least recently used fits until the cache is below bytes_limit
+    """
+    memory = fit_memory(cache_dir)
+    if memory is not None and bytes_limit:
+        memory.reduce_size(bytes_limit=bytes_limit)
+
+
+def _library_version(estimator_class):
+    package = estimator_class.__module__.split('.')[0]
+    return getattr(sys.modules.get(package), '__version__', None)
+
+
+def _fit_estimator(estimator_class, params, library_version, X, y, thread_params):
+    # Cached by CachedFit: everything but thread_params is part of the key
+    return estimator_class(**params, **thread_params).fit(X, y)
+
+
+class CachedFit(ClassifierMixin, BaseEstimator):
+    """
+    Classifier wrapper whose fit() is looked up in the fit cache first
+
+    Searches address the wrapped estimator's parameters with an `estimator__`
+    prefix; the fitted estimator is estimator_.
+
+    Args:
+        estimator: Unfitted classifier
+        cache_dir: joblib.Memory directory (None fits without caching)
+    """
+
+    def __init__(self, estimator, cache_dir=FIT_CACHE_DIR):
+        self.estimator = estimator
+        self.cache_dir = cache_dir
+
+    def fit(self, X, y):
+        memory = fit_memory(self.cache_dir)
+        if memory is None:
+            self.estimator_ = clone(self.estimator).fit(X, y)
+        else:
+            params = self.estimator.get_params(deep=False)
+            thread_params = {name: params.pop(name) for name in THREAD_PARAMS if name in params}
+            fit = memory.cache(_fit_estimator, ignore=['thread_params'])
+            estimator_class = type(self.estimator)
+            self.estimator_ = fit(estimator_class, params, _library_version(estimator_class),
+                                  np.asarray(X), np.asarray(y), thread_params)
+        self.classes_ = self.estimator_.classes_
+        return self
+
+    def predict(self, X):
+        return self.estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.estimator_.predict_proba(X)
+
+
+def unwrap_params(params):
+    """
+    Search parameters of a CachedFit without the `estimator__` prefix
+    """
+    return {name.removeprefix('estimator__'): value for name, value in params.items()}
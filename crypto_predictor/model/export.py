@@ -0,0 +1,383 @@
+"""
+Export a trained model bundle to the NumPy-only format read by model/lite_runtime.py.
+
+Supported models: RandomForestClassifier and ExtraTreesClassifier,
+GradientBoostingClassifier, XGBClassifier (trees taken from the booster's native
+JSON dump), MLPClassifier, SVC(probability=True), soft-voting ensembles of these,
+and sigmoid or isotonic CalibratedClassifierCV around any of them (also an SVC
+without probability estimates). The scaler, label classes and feature pipeline
+are stored in the same file.
+
+Re-export an existing bundle from the crypto_predictor directory:
+    python -m model.export model/saved
+
+Published bundles of the artifact store are never modified: the re-export is a
+copy of the served bundle plus the export, published as a new bundle.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from model.lite_runtime import LITE_FORMAT_VERSION, TreeEnsemble, load_lite_bundle
+
+LITE_MODEL_FILE = 'model_lite.npz'
+
+# Largest allowed difference between the original and exported probabilities
+EXPORT_TOLERANCE = 1e-4
+
+
+class UnsupportedModelError(ValueError):
+    pass
+
+
+def _tree_arrays(tree, value):
+    """
+    Node arrays of one scikit-learn tree_ with leaf outputs `value` (n_nodes, n_outputs)
+    """
+    return {
+        'feature': tree.feature.astype(np.int32),
+        'threshold': tree.threshold.astype(np.float64),
+        'left': tree.children_left.astype(np.int32),
+        'right': tree.children_right.astype(np.int32),
+        'default_left': np.zeros(tree.node_count, dtype=bool),
+        'value': value,
+    }
+
+
+def _pack_trees(trees, offset, comparison, output):
+    """
+    Concatenate per-tree node arrays into the flat layout of TreeEnsemble
+    """
+    packed = {key: [] for key in ('feature', 'threshold', 'left', 'right', 'default_left', 'value')}
+    roots = []
+    start = 0
+    for tree in trees:
+        n_nodes = len(tree['feature'])
+        roots.append(start)
+        for key in ('left', 'right'):
+            # Child indices become global; leaves keep -1
+            packed[key].append(np.where(tree[key] >= 0, tree[key] + start, -1).astype(np.int32))
+        for key in ('feature', 'threshold', 'default_left', 'value'):
+            packed[key].append(tree[key])
+        start += n_nodes
+
+    arrays = {key: np.concatenate(values) for key, values in packed.items()}
+    arrays['roots'] = np.asarray(roots, dtype=np.int32)
+    arrays['offset'] = np.asarray(offset, dtype=np.float64)
+    return {'kind': 'trees', 'comparison': comparison, 'output': output}, arrays
+
+
+def _sum_trees(spec, arrays, X):
+    # Leaf sum of a packed ensemble, used to recover the boosting offset
+    return TreeEnsemble(arrays, spec).leaf_sum(X)
+
+
+def _export_forest(model, n_features):
+    trees = []
+    for estimator in model.estimators_:
+        value = estimator.tree_.value[:, 0, :].astype(np.float64)
+        # Leaf class fractions, normalised as in DecisionTreeClassifier.predict_proba
+        totals = value.sum(axis=1, keepdims=True)
+        value = np.divide(value, totals, out=np.zeros_like(value), where=totals > 0)
+        trees.append(_tree_arrays(estimator.tree_, value))
+    return _pack_trees(trees, np.zeros(model.n_classes_), 'le', 'mean')
+
+
+def _export_gradient_boosting(model, n_features):
+    n_outputs = model.estimators_.shape[1]
+    trees = []
+    for stage in model.estimators_:
+        for k, estimator in enumerate(stage):
+            value = np.zeros((estimator.tree_.node_count, n_outputs))
+            value[:, k] = model.learning_rate * estimator.tree_.value[:, 0, 0]
+            trees.append(_tree_arrays(estimator.tree_, value))
+
+    # The initial estimate is constant: decision_function minus the tree sum at any point
+    spec, arrays = _pack_trees(trees, np.zeros(n_outputs), 'le', 'softmax' if n_outputs > 1 else 'logistic')
+    probe = np.zeros((1, n_features), dtype=np.float32)
+    raw = np.asarray(model.decision_function(probe), dtype=np.float64).reshape(1, n_outputs)
+    arrays['offset'] = (raw - _sum_trees(spec, arrays, probe))[0]
+    return spec, arrays
+
+
+def _export_xgboost(model, n_features):
+    import xgboost as xgb
+
+    booster = model.get_booster()
+    dump = json.loads(booster.save_raw('json'))
+    objective = dump['learner']['objective']['name']
+    if objective not in ('multi:softprob', 'multi:softmax', 'binary:logistic'):
+        raise UnsupportedModelError(f"Unsupported XGBoost objective: {objective}")
+    booster_model = dump['learner']['gradient_booster'].get('model', {})
+    if 'trees' not in booster_model:
+        raise UnsupportedModelError("Only tree boosters (gbtree) can be exported")
+
+    n_outputs = 1 if objective == 'binary:logistic' else int(dump['learner']['learner_model_param']['num_class'])
+    trees = []
+    for tree, group in zip(booster_model['trees'], booster_model['tree_info']):
+        if any(tree.get('split_type', [])):
+            raise UnsupportedModelError("Categorical XGBoost splits are not supported")
+        left = np.asarray(tree['left_children'], dtype=np.int32)
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        value = np.zeros((len(left), n_outputs))
+        # Leaves carry their score in split_conditions
+        value[:, group] = np.where(left < 0, conditions, 0.0)
+        trees.append({
+            'feature': np.asarray(tree['split_indices'], dtype=np.int32),
+            'threshold': conditions,
+            'left': left,
+            'right': np.asarray(tree['right_children'], dtype=np.int32),
+            'default_left': np.asarray(tree['default_left'], dtype=bool),
+            'value': value,
+        })
+
+    # base_score is stored per objective in different forms; read the offset off the margin instead
+    spec, arrays = _pack_trees(trees, np.zeros(n_outputs), 'lt', 'softmax' if n_outputs > 1 else 'logistic')
+    probe = np.zeros((1, n_features), dtype=np.float32)
+    margin = booster.predict(xgb.DMatrix(probe), output_margin=True).reshape(1, n_outputs)
+    arrays['offset'] = (margin.astype(np.float64) - _sum_trees(spec, arrays, probe))[0]
+    return spec, arrays
+
+
+def _export_mlp(model, n_features):
+    arrays = {}
+    for i, (weight, bias) in enumerate(zip(model.coefs_, model.intercepts_)):
+        arrays[f'weight_{i}'] = weight
+        arrays[f'bias_{i}'] = bias
+    spec = {
+        'kind': 'mlp',
+        'n_layers': len(model.coefs_),
+        'activation': model.activation,
+        'out_activation': model.out_activation_,
+    }
+    return spec, arrays
+
+
+def _export_svm(model, n_features):
+    # libsvm's own sign convention (the public dual_coef_/intercept_ are flipped for two classes);
+    # the Platt parameters are empty unless the SVC was fitted with probability=True
+    arrays = {
+        'support_vectors': model.support_vectors_.astype(np.float64),
+        'dual_coef': model._dual_coef_.astype(np.float64),
+        'intercept': model._intercept_.astype(np.float64),
+        'prob_a': model._probA.astype(np.float64),
+        'prob_b': model._probB.astype(np.float64),
+        'n_support': model.n_support_.astype(np.int32),
+    }
+    spec = {
+        'kind': 'svm',
+        'kernel': model.kernel,
+        'gamma': float(model._gamma),
+        'coef0': float(model.coef0),
+        'degree': int(model.degree),
+    }
+    return spec, arrays
+
+
+def _exporter(model):
+    from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier, GradientBoostingClassifier
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.svm import SVC
+
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+        return _export_forest
+    if isinstance(model, GradientBoostingClassifier):
+        return _export_gradient_boosting
+    if isinstance(model, MLPClassifier):
+        return _export_mlp
+    if isinstance(model, SVC):
+        return _export_svm
+    if type(model).__name__ == 'XGBClassifier':
+        return _export_xgboost
+    raise UnsupportedModelError(f"Cannot export {type(model).__name__}")
+
+
+def _export_calibrated(model, n_features, arrays, prefix):
+    from sklearn.frozen import FrozenEstimator
+
+    members = []
+    for i, calibrated in enumerate(model.calibrated_classifiers_):
+        if calibrated.method not in ('sigmoid', 'isotonic'):
+            raise UnsupportedModelError(f"Unsupported calibration method: {calibrated.method}")
+        base = calibrated.estimator
+        if isinstance(base, FrozenEstimator):
+            base = base.estimator
+        # CalibratedClassifierCV prefers the decision function when there is one
+        response = 'decision_function' if hasattr(base, 'decision_function') else 'predict_proba'
+
+        member_prefix = f"{prefix}c{i}_"
+        own = {}
+        if calibrated.method == 'sigmoid':
+            own['cal_a'] = np.asarray([c.a_ for c in calibrated.calibrators], dtype=np.float64)
+            own['cal_b'] = np.asarray([c.b_ for c in calibrated.calibrators], dtype=np.float64)
+        else:
+            for k, c in enumerate(calibrated.calibrators):
+                own[f'cal_x_{k}'] = np.asarray(c.X_thresholds_, dtype=np.float64)
+                own[f'cal_y_{k}'] = np.asarray(c.y_thresholds_, dtype=np.float64)
+        arrays.update({f"{member_prefix}{key}": value for key, value in own.items()})
+        members.append({
+            'kind': 'calibrated',
+            'prefix': member_prefix,
+            'method': calibrated.method,
+            'response': response,
+            'class_indices': np.searchsorted(calibrated.classes, base.classes_).tolist(),
+            'n_classes': len(calibrated.classes),
+            'base': _export(base, n_features, arrays, f"{member_prefix}b_", response),
+        })
+    # With several calibrated classifiers (ensemble=True) their probabilities are averaged
+    if len(members) == 1:
+        return members[0]
+    return {'kind': 'voting', 'members': members, 'weights': None}
+
+
+def _export(model, n_features, arrays, prefix='m', response='predict_proba'):
+    """
+    Model spec for lite_runtime; the model's arrays are added to `arrays` under `prefix`
+
+    response is the method the runtime will call: 'predict_proba', or
+    'decision_function' for the base model of a calibrated one
+    """
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.ensemble import VotingClassifier
+    from sklearn.svm import SVC
+
+    if isinstance(model, CalibratedClassifierCV):
+        return _export_calibrated(model, n_features, arrays, prefix)
+    if response == 'predict_proba' and isinstance(model, SVC) and model.probability is not True:
+        raise UnsupportedModelError("An SVC without probability=True is only exported inside a CalibratedClassifierCV")
+    if isinstance(model, VotingClassifier):
+        if model.voting != 'soft':
+            raise UnsupportedModelError("Only soft-voting ensembles can be exported")
+        members = [_export(estimator, n_features, arrays, f"{prefix}{i}_")
+                   for i, estimator in enumerate(model.estimators_)]
+        weights = None if model.weights is None else [float(w) for w in model._weights_not_none]
+        return {'kind': 'voting', 'members': members, 'weights': weights}
+
+    spec, own = _exporter(model)(model, n_features)
+    spec['prefix'] = prefix
+    arrays.update({f"{prefix}{key}": value for key, value in own.items()})
+    return spec
+
+
+def export_model(model, scaler, label_encoder, pipeline, path, X_check=None):
+    """
+    Write model, scaler, label classes and feature pipeline to one .npz artifact
+
+    Args:
+        model: Fitted classifier trained on scaled features
+        scaler: Fitted StandardScaler
+        label_encoder: Fitted LabelEncoder
+        pipeline: Fitted FeaturePipeline
+        path: Output .npz path
+        X_check: Optional scaled feature rows; the exported probabilities must
+                 match the model's on them
+
+    Raises:
+        UnsupportedModelError: The model (or an ensemble member) cannot be exported
+    """
+    n_features = len(pipeline.features)
+    arrays = {}
+    meta = {
+        'format': LITE_FORMAT_VERSION,
+        'classes': [str(label) for label in label_encoder.classes_],
+        'pipeline': pipeline.to_dict(),
+        'model': _export(model, n_features, arrays),
+    }
+    arrays['scaler_mean'] = np.zeros(n_features) if scaler.mean_ is None else scaler.mean_
+    arrays['scaler_scale'] = np.ones(n_features) if scaler.scale_ is None else scaler.scale_
+    arrays['__meta__'] = np.asarray(json.dumps(meta))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    try:
+        if X_check is not None:
+            expected = model.predict_proba(X_check)
+            actual = load_lite_bundle(tmp_path).model.predict_proba(X_check)
+            error = np.max(np.abs(expected - actual)) if len(X_check) else 0.0
+            if not error <= EXPORT_TOLERANCE:
+                raise UnsupportedModelError(f"Exported model differs from the original by {error:.2e}")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def export_bundle(model_dir):
+    """
+    Export the pickled bundle in model_dir (a bundle directory) to model_dir/LITE_MODEL_FILE
+    """
+    from model.registry import load_bundle
+
+    bundle = load_bundle(model_dir)
+    return export_model(bundle.model, bundle.scaler, bundle.label_encoder, bundle.pipeline,
+                        os.path.join(model_dir, LITE_MODEL_FILE))
+
+
+def export_key(key):
+    """
+    Artifact store key of the re-exported copy of bundle key
+    """
+    return hashlib.sha256(f"{key}:lite-{LITE_FORMAT_VERSION}".encode()).hexdigest()[:16]
+
+
+def republish_with_export(model_dir, source_key=None):
+    """
+    Copy a bundle of the artifact store in model_dir, export the copy and publish it
+
+    Args:
+        model_dir: Model directory holding the artifact store
+        source_key: Bundle to export (default: the one LATEST points to)
+
+    Returns:
+        tuple: (key of the published bundle, path of its export)
+    """
+    from model.artifact_store import ArtifactStore
+    from model.registry import BUNDLE_FILES, OPTIONAL_BUNDLE_FILES, write_manifest
+
+    store = ArtifactStore(model_dir)
+    source_key = source_key or store.latest()
+    source_dir = store.bundle_dir(source_key)
+    key = export_key(source_key)
+    if not store.has(key):
+        with store.staging(key) as bundle_dir:
+            files = dict(BUNDLE_FILES, **OPTIONAL_BUNDLE_FILES)
+            files.pop('lite')
+            for name in files.values():
+                if os.path.exists(os.path.join(source_dir, name)):
+                    shutil.copy2(os.path.join(source_dir, name), os.path.join(bundle_dir, name))
+            export_bundle(bundle_dir)
+            write_manifest(bundle_dir, fingerprint=key)
+    store.publish(key)
+    return key, os.path.join(store.bundle_dir(key), LITE_MODEL_FILE)
+
+
+def main():
+    from model.registry import BUNDLES_DIR, LATEST_FILE, read_manifest, write_manifest
+
+    parser = argparse.ArgumentParser(description='Export a model bundle for the NumPy-only runtime')
+    parser.add_argument('model_dir', help='Model directory (its LATEST bundle is exported) or bundle directory')
+    args = parser.parse_args()
+
+    model_dir = os.path.abspath(args.model_dir)
+    store_dir, source_key = os.path.split(model_dir)
+    if os.path.exists(os.path.join(model_dir, LATEST_FILE)):
+        key, path = republish_with_export(model_dir)
+        print(f"Exported {path} ({os.path.getsize(path) / 1e6:.1f} MB), published as bundle {key}")
+    elif os.path.basename(store_dir) == BUNDLES_DIR:
+        # A bundle directory of the artifact store
+        key, path = republish_with_export(os.path.dirname(store_dir), source_key)
+        print(f"Exported {path} ({os.path.getsize(path) / 1e6:.1f} MB), published as bundle {key}")
+    else:
+        # A bundle written in place (no artifact store) is updated in place
+        path = export_bundle(model_dir)
+        version = write_manifest(model_dir, fingerprint=(read_manifest(model_dir) or {}).get('fingerprint'))
+        print(f"Exported {path} ({os.path.getsize(path) / 1e6:.1f} MB), bundle version {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+"""
+NumPy-only runtime for models exported by model/export.py.
+
+An exported artifact is a single .npz file holding the scaler, the label classes,
+the feature pipeline and the model itself as plain arrays (tree nodes, network
+weights, support vectors, calibration maps). Loading it needs neither scikit-learn nor XGBoost, so
+an API worker boots quickly and stays small.
+"""
+import json
+
+import numpy as np
+
+from features.pipeline import FeaturePipeline
+
+# 2 added probability-calibrated models; artifacts of earlier formats still load
+LITE_FORMAT_VERSION = 2
+
+# libsvm clips pairwise probabilities to this range before coupling them
+SVM_MIN_PROBABILITY = 1e-7
+
+
+def _softmax(raw):
+    raw = raw - raw.max(axis=1, keepdims=True)
+    np.exp(raw, out=raw)
+    raw /= raw.sum(axis=1, keepdims=True)
+    return raw
+
+
+def _logistic(raw):
+    return 1.0 / (1.0 + np.exp(-raw))
+
+
+def _binary(p):
+    # One positive-class column -> [negative, positive]
+    p = p.reshape(-1)
+    return np.column_stack([1.0 - p, p])
+
+
+class TreeEnsemble:
+    """
+    Any sum of decision trees: random forests (averaged leaf probabilities),
+    gradient boosting and XGBoost (summed leaf scores plus a constant offset,
+    followed by a softmax or logistic link).
+
+    The nodes of all trees live in shared flat arrays; every row walks all trees
+    at once, one tree level per step.
+    """
+
+    def __init__(self, arrays, spec):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.default_left = arrays['default_left']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.offset = arrays['offset']
+        self.strict = spec['comparison'] == 'lt'
+        self.output = spec['output']
+
+    def _leaves(self, X):
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        while True:
+            internal = self.left[nodes] >= 0
+            if not internal.any():
+                return nodes
+            x = X[rows, np.maximum(self.feature[nodes], 0)]
+            threshold = self.threshold[nodes]
+            go_left = x < threshold if self.strict else x <= threshold
+            go_left = np.where(np.isnan(x), self.default_left[nodes], go_left)
+            nodes = np.where(internal, np.where(go_left, self.left[nodes], self.right[nodes]), nodes)
+
+    def leaf_sum(self, X):
+        """
+        Sum of the leaf outputs every row reaches, shape (n_rows, n_outputs)
+        """
+        return self.value[self._leaves(X)].sum(axis=1)
+
+    def decision_function(self, X):
+        """
+        Raw boosting scores before the link function, as GradientBoostingClassifier.decision_function
+        """
+        raw = self.leaf_sum(X) + self.offset
+        return raw.ravel() if raw.shape[1] == 1 else raw
+
+    def predict_proba(self, X):
+        raw = self.leaf_sum(X)
+        if self.output == 'mean':
+            return raw / len(self.roots)
+        raw += self.offset
+        if self.output == 'softmax':
+            return _softmax(raw)
+        return _binary(_logistic(raw))
+
+
+class NeuralNetwork:
+    """
+    Forward pass of a multi-layer perceptron
+    """
+
+    ACTIVATIONS = {
+        'identity': lambda z: z,
+        'relu': lambda z: np.maximum(z, 0, out=z),
+        'tanh': np.tanh,
+        'logistic': _logistic,
+    }
+
+    def __init__(self, arrays, spec):
+        self.weights = [arrays[f'weight_{i}'] for i in range(spec['n_layers'])]
+        self.biases = [arrays[f'bias_{i}'] for i in range(spec['n_layers'])]
+        self.activation = self.ACTIVATIONS[spec['activation']]
+        self.out_activation = spec['out_activation']
+
+    def predict_proba(self, X):
+        activations = X.astype(self.weights[0].dtype, copy=False)
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            activations = activations @ weight + bias
+            if i < len(self.weights) - 1:
+                activations = self.activation(activations)
+        if self.out_activation == 'softmax':
+            return _softmax(activations)
+        return _binary(_logistic(activations))
+
+
+class SupportVectorMachine:
+    """
+    SVC decision function, and for an SVC fitted with probability=True libsvm's
+    probability estimates: one-vs-one decision values, Platt sigmoids per class
+    pair, then pairwise coupling (Wu, Lin and Weng, 2004) as in libsvm's
+    multiclass_probability
+    """
+
+    def __init__(self, arrays, spec):
+        self.support_vectors = arrays['support_vectors']
+        self.dual_coef = arrays['dual_coef']
+        self.intercept = arrays['intercept']
+        self.prob_a = arrays['prob_a']
+        self.prob_b = arrays['prob_b']
+        self.n_support = arrays['n_support']
+        self.kernel = spec['kernel']
+        self.gamma = spec['gamma']
+        self.coef0 = spec['coef0']
+        self.degree = spec['degree']
+
+    def _kernel(self, X):
+        sv = self.support_vectors
+        if self.kernel == 'linear':
+            return X @ sv.T
+        if self.kernel == 'rbf':
+            distances = (X ** 2).sum(axis=1)[:, None] + (sv ** 2).sum(axis=1)[None, :] - 2 * X @ sv.T
+            return np.exp(-self.gamma * np.maximum(distances, 0))
+        if self.kernel == 'poly':
+            return (self.gamma * X @ sv.T + self.coef0) ** self.degree
+        return np.tanh(self.gamma * X @ sv.T + self.coef0)
+
+    def _pairs(self):
+        n_classes = len(self.n_support)
+        return [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+
+    def _decisions(self, X):
+        """
+        libsvm's one-vs-one decision values, shape (n_rows, n_pairs); positive favours
+        the first class of the pair
+        """
+        kernel = self._kernel(X.astype(np.float64))
+        starts = np.concatenate([[0], np.cumsum(self.n_support)])
+        decisions = np.empty((len(X), len(self.intercept)))
+        for pair, (i, j) in enumerate(self._pairs()):
+            si, sj = slice(starts[i], starts[i + 1]), slice(starts[j], starts[j + 1])
+            decisions[:, pair] = (kernel[:, si] @ self.dual_coef[j - 1, si] + kernel[:, sj] @ self.dual_coef[i, sj]
+                                  + self.intercept[pair])
+        return decisions
+
+    def decision_function(self, X):
+        """
+        SVC.decision_function with decision_function_shape='ovr': one-vs-one votes
+        plus the scaled sum of confidences per class
+        """
+        decisions = self._decisions(X)
+        n_classes = len(self.n_support)
+        if n_classes == 2:
+            # scikit-learn flips libsvm's sign for two classes
+            return -decisions[:, 0]
+        votes = np.zeros((len(X), n_classes))
+        confidences = np.zeros((len(X), n_classes))
+        for pair, (i, j) in enumerate(self._pairs()):
+            confidences[:, i] += decisions[:, pair]
+            confidences[:, j] -= decisions[:, pair]
+            votes[:, i] += decisions[:, pair] >= 0
+            votes[:, j] += decisions[:, pair] < 0
+        return votes + confidences / (3 * (np.abs(confidences) + 1))
+
+    def _pairwise_probabilities(self, X):
+        if not len(self.prob_a):
+            raise ValueError("The SVC was fitted without probability estimates")
+        decisions = self._decisions(X)
+        n_classes = len(self.n_support)
+        pairwise = np.zeros((len(X), n_classes, n_classes))
+        for pair, (i, j) in enumerate(self._pairs()):
+            decision = decisions[:, pair]
+            # Numerically stable form of 1 / (1 + exp(A * decision + B))
+            f = decision * self.prob_a[pair] + self.prob_b[pair]
+            with np.errstate(over='ignore'):
+                p = np.where(f >= 0, np.exp(-f) / (1 + np.exp(-f)), 1 / (1 + np.exp(f)))
+            p = np.clip(p, SVM_MIN_PROBABILITY, 1 - SVM_MIN_PROBABILITY)
+            pairwise[:, i, j] = p
+            pairwise[:, j, i] = 1 - p
+        return pairwise
+
+    def predict_proba(self, X):
+        r = self._pairwise_probabilities(X)
+        n_rows, k = r.shape[0], r.shape[1]
+
+        # Q[t, t] = sum_{j != t} r[j, t]^2 and Q[t, j] = -r[j, t] * r[t, j]
+        rt = r.transpose(0, 2, 1)
+        Q = -rt * r
+        eye = np.eye(k, dtype=bool)
+        Q[:, eye] = (np.where(eye, 0.0, rt) ** 2).sum(axis=2)
+
+        p = np.full((n_rows, k), 1.0 / k)
+        eps = 0.005 / k
+        active = np.ones(n_rows, dtype=bool)
+        for _ in range(max(100, k)):
+            Qp = np.einsum('ntj,nj->nt', Q, p)
+            pQp = (p * Qp).sum(axis=1)
+            active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+            if not active.any():
+                break
+            a = np.nonzero(active)[0]
+            Qa, pa, Qpa, pQpa = Q[a], p[a], Qp[a], pQp[a]
+            for t in range(k):
+                diff = (-Qpa[:, t] + pQpa) / Qa[:, t, t]
+                pa[:, t] += diff
+                pQpa = (pQpa + diff * (diff * Qa[:, t, t] + 2 * Qpa[:, t])) / (1 + diff) / (1 + diff)
+                Qpa = (Qpa + diff[:, None] * Qa[:, t, :]) / (1 + diff[:, None])
+                pa /= (1 + diff[:, None])
+            p[a] = pa
+        return p
+
+
+class SoftVoting:
+    """
+    Weighted average of the members' class probabilities
+    """
+
+    def __init__(self, members, weights):
+        self.members = members
+        self.weights = weights
+
+    def predict_proba(self, X):
+        return np.average([member.predict_proba(X) for member in self.members], axis=0, weights=self.weights)
+
+
+class Calibrated:
+    """
+    CalibratedClassifierCV: a sigmoid or isotonic map per class of the base
+    model's decision function (or probabilities), normalised to sum to one
+    """
+
+    def __init__(self, base, arrays, spec):
+        self.base = base
+        self.response = spec['response']
+        self.method = spec['method']
+        self.class_indices = spec['class_indices']
+        self.n_classes = spec['n_classes']
+        self.arrays = arrays
+
+    def _calibrate(self, k, values):
+        if self.method == 'sigmoid':
+            return 1.0 / (1.0 + np.exp(self.arrays['cal_a'][k] * values + self.arrays['cal_b'][k]))
+        # Isotonic: piecewise linear between the thresholds, constant beyond them
+        return np.interp(values, self.arrays[f'cal_x_{k}'], self.arrays[f'cal_y_{k}'])
+
+    def predict_proba(self, X):
+        if self.response == 'decision_function':
+            predictions = self.base.decision_function(X)
+        else:
+            predictions = self.base.predict_proba(X)
+            if self.n_classes == 2:
+                predictions = predictions[:, 1]
+        predictions = predictions.reshape(len(X), -1)
+
+        proba = np.zeros((len(X), self.n_classes))
+        for k, (class_index, values) in enumerate(zip(self.class_indices, predictions.T)):
+            # With two classes the single calibrator is for the second one
+            proba[:, class_index + (self.n_classes == 2)] = self._calibrate(k, values)
+        if self.n_classes == 2:
+            proba[:, 0] = 1.0 - proba[:, 1]
+        else:
+            total = proba.sum(axis=1, keepdims=True)
+            # Rows every calibrator gives zero get the uniform distribution
+            proba = np.divide(proba, total, out=np.full_like(proba, 1 / self.n_classes), where=total != 0)
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        return proba
+
+
+MODEL_KINDS = {
+    'trees': TreeEnsemble,
+    'mlp': NeuralNetwork,
+    'svm': SupportVectorMachine,
+}
+
+
+def _build(spec, arrays):
+    if spec['kind'] == 'voting':
+        members = [_build(member, arrays) for member in spec['members']]
+        return SoftVoting(members, spec['weights'])
+    prefix = spec['prefix']
+    own = {key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)}
+    if spec['kind'] == 'calibrated':
+        return Calibrated(_build(spec['base'], arrays), own, spec)
+    return MODEL_KINDS[spec['kind']](own, spec)
+
+
+class LiteScaler:
+    """
+    StandardScaler.transform (same float32 in-place arithmetic)
+    """
+
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float32 if np.asarray(X).dtype == np.float32 else np.float64)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+
+class LiteLabels:
+    """
+    The part of LabelEncoder used at inference time
+    """
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def inverse_transform(self, y):
+        return self.classes_[np.asarray(y)]
+
+
+class LiteModel:
+    """
+    Exported classifier with the predict/predict_proba interface of the original
+    (inputs are scaled features, outputs are encoded class indices)
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def predict_proba(self, X):
+        return self.root.predict_proba(np.asarray(X))
+
+    def predict(self, X):
+        return self.predict_proba(X).argmax(axis=1)
+
+
+class LiteBundle:
+    """
+    Exported model with the attributes of a registry ModelBundle
+    (model, scaler, label_encoder, features, pipeline, version)
+    """
+
+    def __init__(self, model, scaler, label_encoder, pipeline, version):
+        self.model = model
+        self.scaler = scaler
+        self.label_encoder = label_encoder
+        self.pipeline = pipeline
+        self.features = pipeline.features
+        self.version = version
+
+
+def load_lite_bundle(path, version='unversioned'):
+    """
+    Load an exported artifact as a LiteBundle
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    meta = json.loads(str(arrays.pop('__meta__')))
+    if meta['format'] > LITE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported lite model format {meta['format']} in {path}")
+
+    pipeline = FeaturePipeline.from_dict(meta['pipeline'])
+    scaler = LiteScaler(arrays.pop('scaler_mean'), arrays.pop('scaler_scale'))
+    model = LiteModel(_build(meta['model'], arrays))
+    return LiteBundle(model, scaler, LiteLabels(meta['classes']), pipeline, version)
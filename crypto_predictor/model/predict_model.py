@@ -1,70 +1,40 @@
-import pandas as pd
-import os
-import joblib
 import numpy as np
 from datetime import datetime
+from model.registry import ModelBundle, get_registry
+from utils.log_sink import get_prediction_sink
+from utils.config import ABSTAIN_THRESHOLD
 
-def predict_action(model, latest_data):
+# Action returned when the model is not confident enough
+ABSTAIN_ACTION = 'Hold'
+
+def predict_action(model, latest_data, bundle=None):
     """
     Predict trading action based on latest data.
     
     Args:
-        model: Trained classifier model
-        latest_data: DataFrame row containing the latest data point with all features
+        model: Trained classifier model with predict_proba (None uses the model
+               from the registry bundle)
+        latest_data: DataFrame of recent rows from add_features (the last row is
+                     predicted), or a single row as a Series
+        bundle: ModelBundle to use (defaults to the registry's current bundle)
     
     Returns:
         str: Predicted action ('Buy', 'Sell', or 'Hold')
     """
     try:
-        # Load the saved scaler
-        scaler = joblib.load('model/saved/scaler.pkl')
-        
-        # Load the label encoder
-        label_encoder = joblib.load('model/saved/label_encoder.pkl')
-        
-        # Load the feature list
-        with open('model/saved/features.txt', 'r') as f:
-            features = [line.strip() for line in f.readlines()]
-        
-        # Create a copy of the data to avoid modifying the original
-        data = latest_data.copy()
-        
-        # Add derived features if not present
-        if 'RSI_Change' not in data:
-            # Since we only have the latest data point, we can't calculate diff
-            # Use a default value or estimate from historical data
-            data['RSI_Change'] = 0
-        
-        if 'MACD_Change' not in data:
-            data['MACD_Change'] = 0
-            
-        if 'MA_Ratio' not in data:
-            data['MA_Ratio'] = data['MA14'] / data['MA50']
-            
-        if 'Price_MA14_Ratio' not in data:
-            data['Price_MA14_Ratio'] = data['Close'] / data['MA14']
+        # Scaler, label encoder and feature pipeline come from the preloaded bundle
+        bundle = bundle or get_registry().get()
+        if bundle is None:
+            raise RuntimeError("No model bundle available")
+        if model is not None:
+            bundle = ModelBundle(model, bundle.scaler, bundle.label_encoder, bundle.features,
+                                 bundle.version, bundle.pipeline)
         
-        # Replace any inf values
-        for feature in features:
-            if pd.isna(data[feature]) or np.isinf(data[feature]):
-                data[feature] = 0
-        
-        # Extract features from latest data
-        feature_values = []
-        for feature in features:
-            if feature in data:
-                feature_values.append(data[feature])
-            else:
-                raise ValueError(f"Required feature '{feature}' not found in latest data")
-                
-        # Scale the features
-        scaled_features = scaler.transform([feature_values])
-        
-        # Make prediction
-        prediction_encoded = model.predict(scaled_features)[0]
-        
-        # Decode prediction back to string label
-        prediction = label_encoder.inverse_transform([prediction_encoded])[0]
+        # Same path as the batch predictions, so low-confidence rows abstain to Hold;
+        # a DataFrame gives the change features their previous row, a single row
+        # gets the training means
+        prediction, _ = predict_latest_batch({'latest': latest_data}, bundle)['latest']
+        data = latest_data.iloc[-1] if hasattr(latest_data, 'columns') else latest_data
         
         # Log the prediction
         log_prediction(prediction, data)
@@ -77,7 +47,7 @@ def predict_action(model, latest_data):
 
 def log_prediction(action, current_data):
     """
-    Log the prediction to a CSV file
+    Queue the prediction for the prediction log (written in batches by a background thread)
     
     Args:
         action: Predicted action ('Buy', 'Sell', or 'Hold')
@@ -93,17 +63,43 @@ def log_prediction(action, current_data):
         'Action': action,
     }
     
-    log_df = pd.DataFrame([log_data])
+    get_prediction_sink().log(log_data)
+
+def predict_latest_batch(frames, bundle=None, abstain_threshold=ABSTAIN_THRESHOLD):
+    """
+    Predict the action for the latest row of several feature frames at once.
     
-    # Ensure log directory exists
-    os.makedirs('logs', exist_ok=True)
-    log_file = 'logs/predictions_log.csv'
+    The latest rows are stacked into one matrix so that scaling and inference
+    run as a single scaler.transform and a single predict_proba call. Bundles
+    trained with calibration return calibrated probabilities.
     
-    # Check if log file exists
-    if os.path.exists(log_file):
-        log_df.to_csv(log_file, mode='a', header=False, index=False)
-    else:
-        log_df.to_csv(log_file, mode='w', header=True, index=False)
-        
-    print(f"Logged prediction: {action} on {log_data['Date']} with Close: {log_data['Close']:.2f}, RSI: {log_data['RSI']:.2f}")
-
+    Args:
+        frames: dict mapping a name (coin or ticker) to a DataFrame returned by add_features
+        bundle: ModelBundle to use (defaults to the registry's current bundle)
+        abstain_threshold: Rows whose highest probability is below this are
+                           predicted as 'Hold' (None to always take the most probable class)
+    
+    Returns:
+        dict: name -> (predicted action, probability per class as a dict)
+    """
+    bundle = bundle or get_registry().get()
+    if bundle is None:
+        raise RuntimeError("No model bundle available")
+    if not frames:
+        return {}
+    
+    names = list(frames)
+    rows = np.empty((len(names), len(bundle.features)), dtype=np.float32)
+    for i, name in enumerate(names):
+        rows[i] = bundle.pipeline.transform_latest(frames[name])
+    
+    probabilities = bundle.model.predict_proba(bundle.scaler.transform(rows))
+    classes = bundle.label_encoder.inverse_transform(np.arange(probabilities.shape[1]))
+    predictions = classes[np.argmax(probabilities, axis=1)]
+    if abstain_threshold is not None:
+        predictions = np.where(probabilities.max(axis=1) < abstain_threshold, ABSTAIN_ACTION, predictions)
+    
+    return {
+        name: (predictions[i], dict(zip(classes, probabilities[i])))
+        for i, name in enumerate(names)
+    }
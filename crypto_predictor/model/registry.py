@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+from features.pipeline import FeaturePipeline
+from utils.config import MODEL_DIR
+
+MANIFEST_FILE = 'bundle.json'
+
+# Content-addressed bundles (model/artifact_store.py) live in BUNDLES_DIR under the
+# model directory, and LATEST_FILE names the one being served
+BUNDLES_DIR = 'bundles'
+LATEST_FILE = 'LATEST'
+
+# Files that make up a model bundle, relative to the model directory
+BUNDLE_FILES = {
+    'model': 'best_model.pkl',
+    'scaler': 'scaler.pkl',
+    'label_encoder': 'label_encoder.pkl',
+    'features': 'features.txt',
+    'pipeline': 'feature_pipeline.json',
+}
+
+# Files listed in the manifest only when training produced them
+OPTIONAL_BUNDLE_FILES = {
+    'lite': 'model_lite.npz',  # NumPy-only export from model/export.py
+    'scores': 'training_scores.json',  # Test accuracies and search CV scores for reporting
+}
+
+
+class ModelBundle:
+    """
+    Everything needed to turn a feature row into a prediction, loaded together
+    """
+
+    def __init__(self, model, scaler, label_encoder, features, version, pipeline=None):
+        self.model = model
+        self.scaler = scaler
+        self.label_encoder = label_encoder
+        self.features = features
+        self.version = version
+        self.pipeline = pipeline or FeaturePipeline(features)
+
+
+def resolve_bundle_dir(model_dir=MODEL_DIR):
+    """
+    Directory of the bundle served from model_dir: the bundle LATEST points to,
+    or model_dir itself for a bundle written in place
+    """
+    try:
+        with open(os.path.join(model_dir, LATEST_FILE), 'r') as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        return model_dir
+    return os.path.join(model_dir, BUNDLES_DIR, key)
+
+
+def read_manifest(bundle_dir):
+    """
+    Manifest of the bundle in bundle_dir, or None if it has none
+    """
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(model_dir=MODEL_DIR, fingerprint=None):
+    """
+    Publish the bundle files in model_dir as a new version.
+
+    Call this after all bundle files have been written: registries only reload
+    once the manifest changes, so they never pick up a half-written bundle.
+
+    Args:
+        model_dir: Directory holding the bundle files
+        fingerprint: Training input fingerprint recorded with the bundle
+
+    Returns:
+        str: The new bundle version
+    """
+    manifest = dict(BUNDLE_FILES)
+    for key, name in OPTIONAL_BUNDLE_FILES.items():
+        if os.path.exists(os.path.join(model_dir, name)):
+            manifest[key] = name
+
+    digest = hashlib.sha256()
+    for name in manifest.values():
+        with open(os.path.join(model_dir, name), 'rb') as f:
+            digest.update(f.read())
+
+    manifest['version'] = digest.hexdigest()[:16]
+    manifest['created'] = datetime.now().isoformat()
+    if fingerprint is not None:
+        manifest['fingerprint'] = fingerprint
+
+    path = os.path.join(model_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return manifest['version']
+
+
+def load_bundle(model_dir=MODEL_DIR, backend='sklearn'):
+    """
+    Load a model bundle from disk (falls back to the bare files if there is no manifest)
+
+    Args:
+        model_dir: Model directory (the bundle LATEST points to is loaded) or bundle directory
+        backend: 'sklearn' unpickles the fitted estimators; 'lite' loads the
+                 NumPy-only export instead when the bundle has one
+    """
+    model_dir = resolve_bundle_dir(model_dir)
+    manifest = read_manifest(model_dir) or dict(BUNDLE_FILES, version='unversioned')
+
+    if backend == 'lite' and 'lite' in manifest:
+        from model.lite_runtime import load_lite_bundle
+        return load_lite_bundle(os.path.join(model_dir, manifest['lite']), manifest['version'])
+    if backend not in ('sklearn', 'lite'):
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    model = joblib.load(os.path.join(model_dir, manifest['model']))
+    scaler = joblib.load(os.path.join(model_dir, manifest['scaler']))
+    label_encoder = joblib.load(os.path.join(model_dir, manifest['label_encoder']))
+    with open(os.path.join(model_dir, manifest['features']), 'r') as f:
+        features = [line.strip() for line in f.readlines() if line.strip()]
+
+    # Bundles from before the feature pipeline was saved fill missing values with 0
+    pipeline = None
+    pipeline_path = os.path.join(model_dir, manifest.get('pipeline', BUNDLE_FILES['pipeline']))
+    if os.path.exists(pipeline_path):
+        pipeline = FeaturePipeline.load(pipeline_path)
+
+    return ModelBundle(model, scaler, label_encoder, features, manifest['version'], pipeline)
+
+
+class ModelRegistry:
+    """
+    Holds the current model bundle in memory and hot-swaps it when a new one is published.
+
+    The LATEST pointer and manifest are checked at most once every `check_interval` seconds. A new bundle
+    is fully loaded before it replaces the old one, so callers always see a
+    consistent model/scaler/encoder/features set.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, check_interval=5.0, backend='sklearn'):
+        self.model_dir = model_dir
+        self.check_interval = check_interval
+        self.backend = backend
+        self._bundle = None
+        self._manifest_stat = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _manifest_signature(self):
+        bundle_dir = resolve_bundle_dir(self.model_dir)
+        try:
+            stat = os.stat(os.path.join(bundle_dir, MANIFEST_FILE))
+            return (bundle_dir, stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def get(self):
+        """
+        Return the current ModelBundle, or None if no bundle could be loaded
+        """
+        if time.monotonic() < self._next_check:
+            return self._bundle
+
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return self._bundle
+            self._next_check = time.monotonic() + self.check_interval
+
+            signature = self._manifest_signature()
+            if self._bundle is not None and signature == self._manifest_stat:
+                return self._bundle
+
+            try:
+                bundle = load_bundle(self.model_dir, self.backend)
+            except Exception as e:
+                print(f"Error loading model bundle from {self.model_dir}: {e}")
+                return self._bundle
+
+            if self._bundle is None or bundle.version != self._bundle.version:
+                print(f"Loaded model bundle version {bundle.version}")
+            self._bundle = bundle
+            self._manifest_stat = signature
+            return self._bundle
+
+    def reload(self):
+        """
+        Force the manifest to be checked on the next get()
+        """
+        self._next_check = 0.0
+        return self.get()
+
+
+_registries = {}
+
+
+def get_registry(model_dir=MODEL_DIR, backend='sklearn'):
+    """
+    Process-wide registry for a model directory and inference backend
+    """
+    key = (model_dir, backend)
+    if key not in _registries:
+        _registries[key] = ModelRegistry(model_dir, backend=backend)
+    return _registries[key]
@@ -1,62 +1,392 @@
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
 from sklearn.model_selection import train_test_split, GridSearchCV, TimeSeriesSplit
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables the Halving* searches)
+from sklearn.model_selection import HalvingGridSearchCV, HalvingRandomSearchCV
+from sklearn.utils import Bunch
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, log_loss
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.frozen import FrozenEstimator
+import sklearn
 import xgboost as xgb
 import numpy as np
-import matplotlib.pyplot as plt
 import pandas as pd
 import joblib
+import json
 import os
+import tempfile
+import time
 from sklearn.svm import SVC
 from sklearn.neural_network import MLPClassifier
+from model.artifact_store import ArtifactStore, fingerprint
+from model.registry import write_manifest, BUNDLE_FILES, OPTIONAL_BUNDLE_FILES
+from model.export import export_model, UnsupportedModelError
+from model.execution import (CachedFit, thread_plan, with_threads, search_context, shared_matrix,
+                             prune_fit_cache, unwrap_params)
+from features.pipeline import FeaturePipeline, model_features
+from utils.config import (MODEL_DIR, REPORTS_DIR, SEARCH_MODE, SEARCH_TIME_BUDGET, FIT_CACHE_DIR,
+                          CALIBRATION_METHOD, CALIBRATION_FRACTION)
+from utils.profiler import profiler
 
-def train(df):
-    print("Starting enhanced model training...")
+# Rounds without validation improvement before XGBoost stops adding trees
+XGB_EARLY_STOPPING_ROUNDS = 20
+XGB_MAX_ESTIMATORS = 1000
+
+# Hyperparameter grids searched per model family
+PARAM_GRIDS = {
+    'Random Forest': {
+        'n_estimators': [100, 200],
+        'max_depth': [None, 10, 20],
+        'min_samples_split': [2, 5],
+        'class_weight': [None, 'balanced']
+    },
+    'XGBoost': {
+        'n_estimators': [100, 200],
+        'learning_rate': [0.01, 0.1],
+        'max_depth': [3, 5, 7],
+        'subsample': [0.8, 1.0],
+        'colsample_bytree': [0.8, 1.0]
+    },
+    'Gradient Boosting': {
+        'n_estimators': [100, 200],
+        'learning_rate': [0.01, 0.1],
+        'max_depth': [3, 5],
+        'subsample': [0.8, 1.0]
+    },
+}
+
+# Families trained with fixed parameters
+# (no internal cross-validated Platt scaling: the SVM is calibrated on the held-out slice)
+SVM_PARAMS = dict(random_state=42)
+NN_PARAMS = dict(hidden_layer_sizes=(100, 50), max_iter=500, early_stopping=True, random_state=42)
+
+# Share of the most recent rows held out to pick the best model
+TEST_FRACTION = 0.2
+CV_SPLITS = 5
+
+class SearchDeadline(Exception):
+    """
+    Raised inside a search to stop it once its deadline has passed
+    """
+
+class DeadlineSearchMixin:
+    """
+    Search that starts no new batch of candidates after `deadline`
+    
+    A grid is scored `batch_size` candidates at a time; successive halving stops
+    between its rounds. The best candidate is picked among those scored in time
+    (after a halving round, with that round's number of trees).
+    
+    The deadline is a soft limit: fits are not interrupted, so the batch or
+    round running at the deadline finishes, and the first batch or round of a
+    search is always scored in full (it may take most of a small budget).
+    
+    Attributes:
+        deadline: time.perf_counter() value (None for no limit)
+        batch_size: Candidates per batch (None to score each call's candidates at once)
+    """
+    deadline = None
+    batch_size = None
+    
+    def _run_search(self, evaluate_candidates, callback_ctx=None):
+        scored = False
+        
+        def evaluate_in_time(candidate_params, *args, **kwargs):
+            nonlocal scored
+            candidate_params = list(candidate_params)
+            step = self.batch_size or len(candidate_params)
+            for start in range(0, len(candidate_params), step):
+                if scored and self.deadline is not None and time.perf_counter() >= self.deadline:
+                    raise SearchDeadline
+                results = evaluate_candidates(candidate_params[start:start + step], *args, **kwargs)
+                scored = True
+            return results
+        
+        # Newer scikit-learn passes a callback context, older releases do not
+        context = {} if callback_ctx is None else {'callback_ctx': callback_ctx}
+        try:
+            super()._run_search(evaluate_in_time, **context)
+        except SearchDeadline:
+            print("Search budget exhausted, keeping the best candidate scored so far")
+
+class DeadlineGridSearchCV(DeadlineSearchMixin, GridSearchCV):
+    pass
+
+class DeadlineHalvingGridSearchCV(DeadlineSearchMixin, HalvingGridSearchCV):
+    pass
+
+class DeadlineHalvingRandomSearchCV(DeadlineSearchMixin, HalvingRandomSearchCV):
+    pass
+
+def tune(estimator, param_grid, X, y, cv, search, n_jobs, deadline, name, cache_dir=FIT_CACHE_DIR):
+    """
+    Hyperparameter search for one model family
+    
+    The search runs with the family's thread budget and every fit goes through
+    the fit cache (model/execution.py).
+    
+    Args:
+        estimator: Unfitted base estimator
+        param_grid: Parameter grid to search
+        X, y: Training data
+        cv: Cross-validation splitter
+        search: 'grid' for an exhaustive GridSearchCV, 'halving' or 'halving-random'
+                for successive halving over the number of trees
+        n_jobs: CPU budget of the search
+        deadline: time.perf_counter() value after which no more candidates are scored
+                  (None for no limit); a search that has not started by then is skipped
+        name: Model family name for logging and the thread budget
+        cache_dir: Fit cache directory (None to fit without caching)
+    
+    Returns:
+        tuple: (best fitted estimator, its cross-validation scores from
+               search_scores(), or None when the search was skipped)
+    """
+    workers, threads = thread_plan(name, n_jobs)
+    estimator = with_threads(estimator, threads)
+    if deadline is not None and time.perf_counter() >= deadline:
+        print(f"Search budget exhausted, fitting {name} with default parameters")
+        return CachedFit(estimator, cache_dir).fit(X, y).estimator_, None
+    
+    param_grid = dict(param_grid)
+    if search.startswith('halving'):
+        # The number of trees is the halving resource rather than a grid parameter
+        max_estimators = max(param_grid.pop('n_estimators', [estimator.get_params()['n_estimators'] or 100]))
+    # The searches set the wrapped estimator's parameters through CachedFit
+    param_grid = {f'estimator__{param}': values for param, values in param_grid.items()}
+    estimator = CachedFit(estimator, cache_dir)
+    
+    if search.startswith('halving'):
+        # Candidates are first scored with few trees; only the best third moves on
+        # to three times as many, until the survivors are fitted at full size
+        halving_params = dict(
+            cv=cv,
+            factor=3,
+            resource='estimator__n_estimators',
+            max_resources=max_estimators,
+            min_resources='exhaust',
+            scoring='accuracy',
+            n_jobs=workers,
+            random_state=42,
+            verbose=1
+        )
+        if search == 'halving-random':
+            search_cv = DeadlineHalvingRandomSearchCV(estimator, param_distributions=param_grid,
+                                                      n_candidates='exhaust', **halving_params)
+        else:
+            search_cv = DeadlineHalvingGridSearchCV(estimator, param_grid=param_grid, **halving_params)
+    else:
+        search_cv = DeadlineGridSearchCV(
+            estimator,
+            param_grid=param_grid,
+            cv=cv,
+            scoring='accuracy',
+            n_jobs=workers,
+            return_train_score=True,
+            verbose=1
+        )
+        # One candidate per worker between deadline checks
+        search_cv.batch_size = workers if deadline is not None else None
+    search_cv.deadline = deadline
+    
+    print(f"{name} search: {workers} workers x {threads} threads")
+    with search_context(threads):
+        search_cv.fit(X, y)
+    print(f"{name} Best Parameters: {unwrap_params(search_cv.best_params_)}")
+    return search_cv.best_estimator_.estimator_, search_scores(search_cv, cv, X)
+
+def search_scores(search_cv, cv, X):
+    """
+    Per-fold train and validation scores of the best candidate of a fitted search
+    
+    With a TimeSeriesSplit each fold trains on more rows than the previous one,
+    so these points are a learning curve that costs no extra fits
+    """
+    results = search_cv.cv_results_
+    best = search_cv.best_index_
+    folds = range(search_cv.n_splits_)
+    return {
+        'best_params': unwrap_params(search_cv.best_params_),
+        'train_sizes': [len(train_idx) for train_idx, _ in cv.split(X)],
+        'train_scores': [float(results[f'split{k}_train_score'][best]) for k in folds],
+        'test_scores': [float(results[f'split{k}_test_score'][best]) for k in folds],
+    }
+
+def fit_xgb_early_stopping(model, X, y, validation_fraction=0.2):
+    """
+    Pick the number of XGBoost trees by early stopping on the most recent slice
+    of the training data, then refit on all of it with that many trees
+    """
+    split_idx = int(len(X) * (1 - validation_fraction))
+    probe = xgb.XGBClassifier(**model.get_params())
+    probe.set_params(n_estimators=XGB_MAX_ESTIMATORS, early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS,
+                     eval_metric='mlogloss')
+    probe.fit(X[:split_idx], y[:split_idx], eval_set=[(X[split_idx:], y[split_idx:])], verbose=False)
+    
+    n_estimators = probe.best_iteration + 1
+    print(f"XGBoost early stopping chose {n_estimators} trees")
+    final = xgb.XGBClassifier(**model.get_params())
+    final.set_params(n_estimators=n_estimators, early_stopping_rounds=None)
+    return final.fit(X, y)
+
+def calibration_split(y, fraction=CALIBRATION_FRACTION):
+    """
+    Row at which the calibration slice at the end of the training rows starts
+    
+    The slice is the last `fraction` of the rows, started earlier if needed so
+    that it holds every class of y (a calibrator is fitted per class), as long
+    as the rows before it still hold every class too.
+    
+    Returns:
+        int: Start of the slice, or len(y) for no slice (fraction 0, or no split
+             leaves every class on both sides)
+    """
+    if not fraction or len(y) == 0:
+        return len(y)
+    classes = np.unique(y)
+    split = int(len(y) * (1 - fraction))
+    split = min(split, min(np.flatnonzero(y == label)[-1] for label in classes))
+    if len(np.unique(y[:split])) < len(classes):
+        return len(y)
+    return split
+
+def calibrate(model, X, y, method):
+    """
+    Calibrate the probabilities of a fitted classifier on held-out rows
+    
+    Args:
+        model: Fitted classifier (not refitted)
+        X, y: Held-out rows more recent than the model's training rows
+        method: 'sigmoid' (Platt scaling) or 'isotonic'
+    
+    Returns:
+        CalibratedClassifierCV with one calibrator per class
+    """
+    return CalibratedClassifierCV(FrozenEstimator(model), method=method, ensemble=False).fit(X, y)
+
+def prefit_voting_classifier(estimators, y):
+    """
+    Soft-voting ensemble built from already fitted estimators, without refitting them
+    
+    Args:
+        estimators: List of (name, fitted classifier) tuples
+        y: Encoded training labels the estimators were fitted on
+    """
+    ensemble = VotingClassifier(estimators=estimators, voting='soft')
+    ensemble.estimators_ = [estimator for _, estimator in estimators]
+    ensemble.named_estimators_ = Bunch(**dict(estimators))
+    ensemble.le_ = LabelEncoder().fit(y)
+    ensemble.classes_ = ensemble.le_.classes_
+    return ensemble
+
+def training_params(search, time_budget):
+    """
+    Everything besides the data that determines a training run, for the bundle fingerprint
+    """
+    return {
+        'search': search,
+        'time_budget': time_budget,
+        'param_grids': PARAM_GRIDS,
+        'svm': SVM_PARAMS,
+        'nn': NN_PARAMS,
+        'xgb_early_stopping': [XGB_EARLY_STOPPING_ROUNDS, XGB_MAX_ESTIMATORS],
+        'test_fraction': TEST_FRACTION,
+        'cv_splits': CV_SPLITS,
+        'calibration': [CALIBRATION_METHOD, CALIBRATION_FRACTION],
+        'versions': {'sklearn': sklearn.__version__, 'xgboost': xgb.__version__},
+    }
+
+def training_matrix(df):
+    """
+    Feature matrix and labels the models are trained on
+    
+    Args:
+        df: DataFrame with features and Signal labels
     
+    Returns:
+        tuple: (X, y, fitted FeaturePipeline)
+    """
     # Drop the last few rows where Next_Close is NaN
     df = df.dropna(subset=['Next_Close'])
     
-    # Define expanded feature set
-    features = [
-        'Close', 'Volume', 'MA14', 'MA50', 'Price_Change', 
-        'RSI', 'MACD', 'MACD_Signal', 'MACD_Hist', 'Volatility'
-    ]
-    
-    # Add additional ratio features
-    # Use .loc to avoid SettingWithCopyWarning
-    df.loc[:, 'RSI_Change'] = df['RSI'].diff()
-    df.loc[:, 'MACD_Change'] = df['MACD'].diff()
-    df.loc[:, 'MA_Ratio'] = df['MA14'] / df['MA50']
-    df.loc[:, 'Price_MA14_Ratio'] = df['Close'] / df['MA14']
-    
-    # Add more features to the list
-    additional_features = ['RSI_Change', 'MACD_Change', 'MA_Ratio', 'Price_MA14_Ratio']
-    features.extend(additional_features)
-    
-    # Replace infinite values with NaN and then fill NaN values
-    df = df.replace([np.inf, -np.inf], np.nan)
+    # Build the feature matrix (derived features, inf/NaN filled with column means)
+    pipeline = FeaturePipeline(model_features())
+    X = pipeline.fit_transform(df)
+    return X, df['Signal'], pipeline
+
+def train(df, model_dir=MODEL_DIR, reports_dir=REPORTS_DIR, n_jobs=-1,
+          search=SEARCH_MODE, time_budget=SEARCH_TIME_BUDGET, reports=False, force=False):
+    """
+    Tune and train the candidate models and publish the best one as a bundle
+    
+    Bundles are stored under a fingerprint of the training data, features and
+    parameters (model/artifact_store.py); if a bundle for the same inputs already
+    exists it is published again instead of training.
+    
+    Args:
+        df: DataFrame with features and Signal labels
+        model_dir: Model directory holding the bundle store
+        reports_dir: Directory for the plots when reports is set
+        n_jobs: CPU budget of the searches (split into workers and threads per
+                family by model/execution.py)
+        search: 'grid' (exhaustive), 'halving' (successive halving with XGBoost
+                early stopping) or 'halving-random'
+        time_budget: Soft limit in seconds on the hyperparameter searches (None for
+                     no limit): no batch of candidates or halving round starts
+                     after it, and families not searched yet keep their default
+                     parameters. Running batches finish and a started search
+                     always scores its first batch or round (see DeadlineSearchMixin)
+        reports: Also draw the feature importance and learning curve plots
+                 (otherwise run `python main.py report` when they are needed)
+        force: Train even if a bundle for the same inputs exists
+    
+    Returns:
+        The best fitted model
+    """
+    print("Starting enhanced model training...")
     
-    # Calculate column means for filling missing values (excluding infinite and NaN)
-    # This is better than filling with 0
-    col_means = df[features].mean()
+    X, y, pipeline = training_matrix(df)
     
-    # Fill NaN values with calculated means
-    df = df.fillna(col_means)
+    store = ArtifactStore(model_dir)
+    key = fingerprint(X, y, pipeline.features, training_params(search, time_budget))
+    if store.has(key) and not force:
+        print(f"Training inputs unchanged, reusing model bundle {key}")
+        best_model = joblib.load(os.path.join(store.bundle_dir(key), BUNDLE_FILES['model']))
+    else:
+        with store.staging(key) as bundle_dir, tempfile.TemporaryDirectory(prefix='train-') as scratch_dir:
+            best_model = fit_bundle(X, y, pipeline, bundle_dir, n_jobs, search, time_budget, key, scratch_dir)
     
-    # Double-check for any remaining NaNs or infinite values
-    # If any still exist, replace with appropriate values (0 or means)
-    if df[features].isnull().any().any() or np.isinf(df[features]).any().any():
-        print("Warning: Still found NaN or infinite values after initial cleaning. Applying final cleaning...")
-        df[features] = df[features].replace([np.inf, -np.inf], np.nan)
-        df[features] = df[features].fillna(0)
+    # Registries follow LATEST, so they switch to the complete new bundle at once
+    store.publish(key)
+    print(f"Published model bundle {key}")
     
-    X = df[features]
-    y = df['Signal']
+    if reports:
+        # Plots are drawn by the reporting stage, which imports matplotlib only when used
+        from reporting.reports import generate_reports
+        with profiler.stage('Reports'):
+            generate_reports(model_dir, reports_dir)
     
-    # Ensure X has no NaN or infinite values
-    X = X.replace([np.inf, -np.inf], 0)
-    X = X.fillna(0)
+    return best_model
+
+def fit_bundle(X, y, pipeline, model_dir, n_jobs, search, time_budget, key, scratch_dir):
+    """
+    Tune and train the candidate models on X, y and write the bundle files of
+    the best one to model_dir
+    
+    Args:
+        X: Feature matrix from pipeline.fit_transform
+        y: Signal labels
+        pipeline: Fitted FeaturePipeline
+        model_dir: Directory the bundle files are written to
+        n_jobs, search, time_budget: As for train()
+        key: Fingerprint recorded in the bundle manifest
+        scratch_dir: Directory for the memory-mapped training matrix
+    
+    Returns:
+        The best fitted model
+    """
+    features = pipeline.features
+    cv_scores = {}
     
     # Encode the target labels to integers
     label_encoder = LabelEncoder()
@@ -66,129 +396,102 @@ def train(df):
     label_mapping = {i: label for i, label in enumerate(label_encoder.classes_)}
     print(f"Label mapping: {label_mapping}")
     
-    # Create directory for saved models
-    os.makedirs('model/saved', exist_ok=True)
-    joblib.dump(label_encoder, 'model/saved/label_encoder.pkl')
+    joblib.dump(label_encoder, os.path.join(model_dir, 'label_encoder.pkl'))
     
     # Use time series split for better evaluation
-    tscv = TimeSeriesSplit(n_splits=5)
+    tscv = TimeSeriesSplit(n_splits=CV_SPLITS)
     
     # Scale the features
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
     
     # Save the scaler for prediction
-    joblib.dump(scaler, 'model/saved/scaler.pkl')
+    joblib.dump(scaler, os.path.join(model_dir, 'scaler.pkl'))
     
     # Split the data using time-based ordering (keep last 20% for testing)
-    split_idx = int(len(X_scaled) * 0.8)
+    split_idx = int(len(X_scaled) * (1 - TEST_FRACTION))
     X_train, X_test = X_scaled[:split_idx], X_scaled[split_idx:]
     y_train, y_test = y_encoded[:split_idx], y_encoded[split_idx:]
     
-    print(f"Training set size: {len(X_train)}, Test set size: {len(X_test)}")
+    # The most recent training rows are held out to calibrate the probabilities
+    calibration_idx = calibration_split(y_train)
+    X_train, X_calibration = X_train[:calibration_idx], X_train[calibration_idx:]
+    y_train, y_calibration = y_train[:calibration_idx], y_train[calibration_idx:]
+    
+    # Written once and memory-mapped: the search workers open the file instead
+    # of receiving a pickled copy of the matrix for every search
+    X_train = shared_matrix(X_train, scratch_dir)
+    
+    print(f"Training set size: {len(X_train)}, Calibration set size: {len(X_calibration)}, "
+          f"Test set size: {len(X_test)}")
     
     # Define models with hyperparameter tuning
+    deadline = time.perf_counter() + time_budget if time_budget else None
+    if search.startswith('halving'):
+        print("Using successive-halving search" + (f" with a {time_budget}s budget" if time_budget else ""))
     
     # 1. Random Forest with hyperparameter tuning
     print("Tuning Random Forest hyperparameters...")
-    rf_param_grid = {
-        'n_estimators': [100, 200],
-        'max_depth': [None, 10, 20],
-        'min_samples_split': [2, 5],
-        'class_weight': [None, 'balanced']
-    }
-    
-    rf_grid = GridSearchCV(
-        RandomForestClassifier(random_state=42),
-        param_grid=rf_param_grid,
-        cv=tscv,
-        scoring='accuracy',
-        n_jobs=-1,
-        verbose=1
-    )
-    
-    rf_grid.fit(X_train, y_train)
-    rf_best = rf_grid.best_estimator_
-    rf_accuracy = rf_best.score(X_test, y_test)
-    print(f"Random Forest Best Parameters: {rf_grid.best_params_}")
+    with profiler.stage('Random Forest'):
+        rf_best, cv_scores['Random Forest'] = tune(
+            RandomForestClassifier(random_state=42), PARAM_GRIDS['Random Forest'],
+            X_train, y_train, tscv, search, n_jobs, deadline, 'Random Forest')
+        rf_accuracy = rf_best.score(X_test, y_test)
     print(f"Random Forest Best Accuracy: {rf_accuracy:.4f}")
     
     # 2. XGBoost with hyperparameter tuning
     print("Tuning XGBoost hyperparameters...")
-    xgb_param_grid = {
-        'n_estimators': [100, 200],
-        'learning_rate': [0.01, 0.1],
-        'max_depth': [3, 5, 7],
-        'subsample': [0.8, 1.0],
-        'colsample_bytree': [0.8, 1.0]
-    }
-    
-    xgb_grid = GridSearchCV(
-        xgb.XGBClassifier(random_state=42, use_label_encoder=False, eval_metric='logloss'),
-        param_grid=xgb_param_grid,
-        cv=tscv,
-        scoring='accuracy',
-        n_jobs=-1,
-        verbose=1
-    )
-    
-    xgb_grid.fit(X_train, y_train)
-    xgb_best = xgb_grid.best_estimator_
-    xgb_accuracy = xgb_best.score(X_test, y_test)
-    print(f"XGBoost Best Parameters: {xgb_grid.best_params_}")
+    with profiler.stage('XGBoost'):
+        xgb_best, cv_scores['XGBoost'] = tune(
+            xgb.XGBClassifier(random_state=42, use_label_encoder=False, eval_metric='logloss'),
+            PARAM_GRIDS['XGBoost'], X_train, y_train, tscv, search, n_jobs, deadline, 'XGBoost')
+        if search.startswith('halving'):
+            # The final number of trees is chosen by early stopping
+            xgb_best = fit_xgb_early_stopping(xgb_best, X_train, y_train)
+        xgb_accuracy = xgb_best.score(X_test, y_test)
     print(f"XGBoost Best Accuracy: {xgb_accuracy:.4f}")
     
     # 3. Gradient Boosting
     print("Tuning Gradient Boosting hyperparameters...")
-    gb_param_grid = {
-        'n_estimators': [100, 200],
-        'learning_rate': [0.01, 0.1],
-        'max_depth': [3, 5],
-        'subsample': [0.8, 1.0]
-    }
-    
-    gb_grid = GridSearchCV(
-        GradientBoostingClassifier(random_state=42),
-        param_grid=gb_param_grid,
-        cv=tscv,
-        scoring='accuracy',
-        n_jobs=-1,
-        verbose=1
-    )
-    
-    gb_grid.fit(X_train, y_train)
-    gb_best = gb_grid.best_estimator_
-    gb_accuracy = gb_best.score(X_test, y_test)
-    print(f"Gradient Boosting Best Parameters: {gb_grid.best_params_}")
+    with profiler.stage('Gradient Boosting'):
+        gb_best, cv_scores['Gradient Boosting'] = tune(
+            GradientBoostingClassifier(random_state=42), PARAM_GRIDS['Gradient Boosting'],
+            X_train, y_train, tscv, search, n_jobs, deadline, 'Gradient Boosting')
+        gb_accuracy = gb_best.score(X_test, y_test)
     print(f"Gradient Boosting Best Accuracy: {gb_accuracy:.4f}")
     
     # 4. SVM 
     print("Training SVM model...")
-    svm_model = SVC(probability=True, random_state=42)
-    svm_model.fit(X_train, y_train)
-    svm_accuracy = svm_model.score(X_test, y_test)
+    with profiler.stage('SVM'):
+        # Platt scaling on the held-out rows gives the SVM its probabilities; without
+        # a calibration slice they are fitted on the training rows themselves
+        svm_model = SVC(**SVM_PARAMS).fit(X_train, y_train)
+        if len(y_calibration):
+            svm_model = calibrate(svm_model, X_calibration, y_calibration, 'sigmoid')
+        else:
+            svm_model = calibrate(svm_model, X_train, y_train, 'sigmoid')
+        svm_accuracy = svm_model.score(X_test, y_test)
     print(f"SVM Accuracy: {svm_accuracy:.4f}")
     
     # 5. Neural Network MLP
     print("Training Neural Network model...")
-    nn_model = MLPClassifier(hidden_layer_sizes=(100, 50), max_iter=500, 
-                            early_stopping=True, random_state=42)
-    nn_model.fit(X_train, y_train)
-    nn_accuracy = nn_model.score(X_test, y_test)
+    with profiler.stage('Neural Network'):
+        nn_model = MLPClassifier(**NN_PARAMS)
+        nn_model.fit(X_train, y_train)
+        nn_accuracy = nn_model.score(X_test, y_test)
     print(f"Neural Network Accuracy: {nn_accuracy:.4f}")
     
-    # Create ensemble model (voting classifier)
+    # Create ensemble model (soft voting) from the already fitted models
     print("Creating ensemble model...")
-    ensemble = VotingClassifier(estimators=[
-        ('rf', rf_best),
-        ('xgb', xgb_best),
-        ('gb', gb_best),
-        ('svm', svm_model),
-        ('nn', nn_model)
-    ], voting='soft')
-    
-    ensemble.fit(X_train, y_train)
-    ensemble_accuracy = ensemble.score(X_test, y_test)
+    with profiler.stage('Ensemble'):
+        ensemble = prefit_voting_classifier([
+            ('rf', rf_best),
+            ('xgb', xgb_best),
+            ('gb', gb_best),
+            ('svm', svm_model),
+            ('nn', nn_model)
+        ], y_train)
+        ensemble_accuracy = ensemble.score(X_test, y_test)
     print(f"Ensemble Model Accuracy: {ensemble_accuracy:.4f}")
     
     # Choose the best model based on test accuracy
@@ -206,6 +509,23 @@ def train(df):
     
     print(f"\nBest Model: {best_model_name} with accuracy: {best_accuracy:.4f}")
     
+    calibration = None
+    if not len(y_calibration):
+        print("No calibration slice holding every signal class, keeping uncalibrated probabilities")
+    elif CALIBRATION_METHOD and not (best_model is svm_model and CALIBRATION_METHOD == 'sigmoid'):
+        with profiler.stage('Calibration'):
+            uncalibrated_loss = log_loss(y_test, best_model.predict_proba(X_test), labels=best_model.classes_)
+            best_model = calibrate(best_model, X_calibration, y_calibration, CALIBRATION_METHOD)
+            calibration = {
+                'method': CALIBRATION_METHOD,
+                'test_log_loss': [uncalibrated_loss,
+                                  log_loss(y_test, best_model.predict_proba(X_test), labels=best_model.classes_)],
+                'test_accuracy': best_model.score(X_test, y_test),
+            }
+        print(f"Calibrated {best_model_name} ({CALIBRATION_METHOD}): test log loss "
+              f"{calibration['test_log_loss'][0]:.4f} -> {calibration['test_log_loss'][1]:.4f}, "
+              f"accuracy {calibration['test_accuracy']:.4f}")
+    
     # Detailed evaluation of best model
     y_pred = best_model.predict(X_test)
     
@@ -217,63 +537,59 @@ def train(df):
     print(classification_report(y_test_decoded, y_pred_decoded))
     
     # Feature importance for tree-based models
-    if hasattr(best_model, 'feature_importances_'):
-        importances = best_model.feature_importances_
+    if hasattr(models[best_model_name][0], 'feature_importances_'):
+        importances = models[best_model_name][0].feature_importances_
         indices = np.argsort(importances)[::-1]
         print("\nFeature Importance:")
         for i in range(len(features)):
             print(f"{features[indices[i]]}: {importances[indices[i]]:.4f}")
     
-        # Plot feature importance
-        plt.figure(figsize=(10, 6))
-        plt.title(f"Feature Importances ({best_model_name})")
-        plt.barh(range(len(indices)), importances[indices], align='center')
-        plt.yticks(range(len(indices)), [features[i] for i in indices])
-        plt.xlabel('Relative Importance')
-        os.makedirs('reports', exist_ok=True)
-        plt.savefig('reports/feature_importance.png')
-    
-    # Save all models separately
-    model_dir = 'model/saved/candidates'
-    os.makedirs(model_dir, exist_ok=True)
-    for name, (model, _) in models.items():
-        model_filename = os.path.join(model_dir, f"{name.lower().replace(' ', '_')}.pkl")
-        joblib.dump(model, model_filename)
-    
-    # Save the best model
-    joblib.dump(best_model, 'model/saved/best_model.pkl')
-    
-    # Save the feature list
-    with open('model/saved/features.txt', 'w') as f:
-        for feature in features:
-            f.write(f"{feature}\n")
-    
-    # Learning curve plot
-    try:
-        from sklearn.model_selection import learning_curve
-        
-        train_sizes, train_scores, test_scores = learning_curve(
-            best_model, X_scaled, y_encoded, cv=tscv, n_jobs=-1,
-            train_sizes=np.linspace(0.1, 1.0, 10), scoring='accuracy'
-        )
-        
-        train_mean = np.mean(train_scores, axis=1)
-        train_std = np.std(train_scores, axis=1)
-        test_mean = np.mean(test_scores, axis=1)
-        test_std = np.std(test_scores, axis=1)
-        
-        plt.figure(figsize=(10, 6))
-        plt.plot(train_sizes, train_mean, label='Training score', color='blue', marker='o')
-        plt.fill_between(train_sizes, train_mean - train_std, train_mean + train_std, alpha=0.15, color='blue')
-        plt.plot(train_sizes, test_mean, label='Cross-validation score', color='green', marker='s')
-        plt.fill_between(train_sizes, test_mean - test_std, test_mean + test_std, alpha=0.15, color='green')
-        plt.title('Learning Curve')
-        plt.xlabel('Training Examples')
-        plt.ylabel('Accuracy Score')
-        plt.legend(loc='lower right')
-        plt.grid(True)
-        plt.savefig('reports/learning_curve.png')
-    except Exception as e:
-        print(f"Could not generate learning curve: {e}")
+    with profiler.stage('Save bundle'):
+        # Save all models separately
+        candidates_dir = os.path.join(model_dir, 'candidates')
+        os.makedirs(candidates_dir, exist_ok=True)
+        for name, (model, _) in models.items():
+            model_filename = os.path.join(candidates_dir, f"{name.lower().replace(' ', '_')}.pkl")
+            joblib.dump(model, model_filename)
+    
+        # Save the best model
+        joblib.dump(best_model, os.path.join(model_dir, 'best_model.pkl'))
+    
+        # Save the feature list
+        with open(os.path.join(model_dir, 'features.txt'), 'w') as f:
+            for feature in features:
+                f.write(f"{feature}\n")
+    
+        # Save the imputation statistics with the bundle
+        pipeline.save(os.path.join(model_dir, 'feature_pipeline.json'))
+    
+        # Test accuracies and search CV scores, from which the reporting stage draws
+        # the learning curve without refitting
+        scores = {
+            'best_model': best_model_name,
+            'test_accuracy': {name: float(accuracy) for name, (_, accuracy) in models.items()},
+            'cv_scores': {name: family_scores for name, family_scores in cv_scores.items() if family_scores},
+            'calibration': calibration,
+        }
+        with open(os.path.join(model_dir, OPTIONAL_BUNDLE_FILES['scores']), 'w') as f:
+            json.dump(scores, f, indent=2, default=str)
+    
+        # NumPy-only export for the API workers, checked against the model on the test set
+        lite_path = os.path.join(model_dir, OPTIONAL_BUNDLE_FILES['lite'])
+        try:
+            export_model(best_model, scaler, label_encoder, pipeline, lite_path, X_check=X_test)
+            print(f"Exported lite model to {lite_path}")
+        except UnsupportedModelError as e:
+            # A stale export must not be published next to the new model
+            if os.path.exists(lite_path):
+                os.remove(lite_path)
+            print(f"Could not export lite model: {e}")
+    
+        # The manifest completes the bundle
+        version = write_manifest(model_dir, fingerprint=key)
+        print(f"Wrote model bundle version {version}")
+    
+    # Keep the fit cache within FIT_CACHE_BYTES_LIMIT, dropping the least recently used fits
+    prune_fit_cache()
     
     return best_model
@@ -0,0 +1,315 @@
+"""
+Walk-forward evaluation.
+
+A training window rolls forward through the history. Every `retrain_every` bars
+each model family is refitted on the window and then predicts the next
+`retrain_every` bars, which it has never seen, so accuracy and backtest figures
+are out of sample (unlike main.evaluate_model, which scores the full history).
+
+Refits warm-start where the estimator supports it: XGBoost continues boosting
+from the previous booster, the random forest and gradient boosting add trees
+with warm_start, and the MLP runs a few partial_fit epochs. Every
+`full_refit_every`-th refit starts from scratch so the models do not grow
+without bound. As in model.train_model, the SVM is fitted without libsvm's
+internal probability cross-validation and Platt-scaled on the most recent rows
+of its training window. The feature pipeline and scaler are fitted once on the first
+window and the scaled feature matrix is built once; every fold trains and
+predicts on views of it.
+
+Run from the crypto_predictor directory:
+    python -m model.walk_forward --ticker ETH-USD --train-window 730 --retrain-every 30
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.svm import SVC
+
+from backtest.engine import run_backtest, signals_to_positions, summarize
+from features.pipeline import FeaturePipeline, model_features
+from model.train_model import calibrate, calibration_split
+from utils.config import (TICKER, START_DATE, END_DATE, INTERVAL, RANDOM_STATE, REPORTS_DIR,
+                          WALK_FORWARD_TRAIN_WINDOW, WALK_FORWARD_RETRAIN_EVERY, WALK_FORWARD_FULL_REFIT_EVERY)
+
+# Trees or boosting rounds added by a warm-started refit
+WARM_TREES = 20
+WARM_BOOSTING_ROUNDS = 20
+# partial_fit epochs of a warm-started MLP refit
+WARM_EPOCHS = 5
+
+
+def _make_random_forest(n_jobs):
+    return RandomForestClassifier(n_estimators=100, warm_start=True, n_jobs=n_jobs, random_state=RANDOM_STATE)
+
+
+def _warm_random_forest(model, X, y):
+    # Existing trees are kept, the new ones are grown on the current window
+    model.n_estimators += WARM_TREES
+    return model.fit(X, y)
+
+
+def _make_xgboost(n_jobs):
+    return xgb.XGBClassifier(n_estimators=100, learning_rate=0.1, max_depth=5, eval_metric='mlogloss',
+                             n_jobs=n_jobs, random_state=RANDOM_STATE)
+
+
+def _warm_xgboost(model, X, y):
+    # Continue boosting from the previous booster on the current window
+    booster = model.get_booster()
+    model.set_params(n_estimators=WARM_BOOSTING_ROUNDS)
+    return model.fit(X, y, xgb_model=booster, verbose=False)
+
+
+def _make_gradient_boosting(n_jobs):
+    return GradientBoostingClassifier(n_estimators=100, learning_rate=0.1, max_depth=3, warm_start=True,
+                                      random_state=RANDOM_STATE)
+
+
+def _warm_gradient_boosting(model, X, y):
+    model.n_estimators += WARM_BOOSTING_ROUNDS
+    return model.fit(X, y)
+
+
+def _make_svm(n_jobs):
+    return SVC(random_state=RANDOM_STATE)
+
+
+def _fit_svm(model, X, y):
+    # The tail of the window calibrates the probabilities
+    split = calibration_split(y)
+    if split == len(y):
+        # No tail holding every class: fit and calibrate on the whole window
+        return calibrate(model.fit(X, y), X, y, 'sigmoid')
+    return calibrate(model.fit(X[:split], y[:split]), X[split:], y[split:], 'sigmoid')
+
+
+def _make_neural_network(n_jobs):
+    # Without early stopping, so later refits can continue with partial_fit
+    return MLPClassifier(hidden_layer_sizes=(100, 50), max_iter=200, random_state=RANDOM_STATE)
+
+
+def _warm_neural_network(model, X, y):
+    for _ in range(WARM_EPOCHS):
+        model.partial_fit(X, y)
+    return model
+
+
+# Model family -> (factory taking n_jobs, fit or None for the estimator's own fit,
+#                  warm refit or None to always refit from scratch)
+MODEL_FAMILIES = {
+    'Random Forest': (_make_random_forest, None, _warm_random_forest),
+    'XGBoost': (_make_xgboost, None, _warm_xgboost),
+    'Gradient Boosting': (_make_gradient_boosting, None, _warm_gradient_boosting),
+    'SVM': (_make_svm, _fit_svm, None),
+    'Neural Network': (_make_neural_network, None, _warm_neural_network),
+}
+
+# Soft vote over the probabilities of the other families being evaluated
+ENSEMBLE = 'Ensemble'
+
+
+class FoldMatrices:
+    """
+    Scaled feature matrix and encoded labels for the whole history, built once.
+
+    The feature pipeline and scaler are fitted on the first training window only,
+    so nothing after it leaks into the inputs. Fold slices are views into the
+    cached arrays, so refits never rebuild or copy features.
+    """
+
+    def __init__(self, df, train_window, features=None):
+        self.pipeline = FeaturePipeline(features or model_features())
+        self.pipeline.fit(df.iloc[:train_window])
+        self.scaler = StandardScaler().fit(self.pipeline.transform(df.iloc[:train_window]))
+
+        X = self.pipeline.transform(df)
+        self.X = np.ascontiguousarray(self.scaler.transform(X), dtype=np.float32)
+        self.label_encoder = LabelEncoder().fit(df['Signal'])
+        self.y = self.label_encoder.transform(df['Signal'])
+        self.index = df.index
+
+    def __len__(self):
+        return len(self.y)
+
+    def slice(self, start, stop):
+        return self.X[start:stop], self.y[start:stop]
+
+
+def fold_bounds(n_rows, train_window, retrain_every, expanding=False):
+    """
+    (train_start, train_end, test_end) row bounds of every walk-forward fold
+    """
+    if n_rows <= train_window:
+        raise ValueError(f"Need more than {train_window} rows for walk-forward evaluation, got {n_rows}")
+    bounds = []
+    for train_end in range(train_window, n_rows, retrain_every):
+        train_start = 0 if expanding else train_end - train_window
+        bounds.append((train_start, train_end, min(train_end + retrain_every, n_rows)))
+    return bounds
+
+
+def _aligned_proba(model, X, n_classes):
+    """
+    predict_proba with one column per encoded class, even for classes the model never saw
+    """
+    proba = np.zeros((len(X), n_classes))
+    proba[:, model.classes_] = model.predict_proba(X)
+    return proba
+
+
+def walk_forward(df, families=None, train_window=WALK_FORWARD_TRAIN_WINDOW,
+                 retrain_every=WALK_FORWARD_RETRAIN_EVERY, full_refit_every=WALK_FORWARD_FULL_REFIT_EVERY,
+                 warm_start=True, expanding=False, n_jobs=-1):
+    """
+    Roll a training window through df, refitting every family at each step
+
+    Args:
+        df: DataFrame with features and Signal labels (as passed to train)
+        families: Model family names from MODEL_FAMILIES, plus optionally 'Ensemble',
+                  a soft vote over the other listed families (default: all of them)
+        train_window: Bars in each training window
+        retrain_every: Bars predicted out of sample before the next refit
+        full_refit_every: Every n-th refit starts from scratch (warm_start only)
+        warm_start: Continue from the previous fold's models where supported
+        expanding: Train on all bars up to the fold instead of a fixed-length window
+        n_jobs: Threads for the random forest and XGBoost
+
+    Returns:
+        tuple: (predictions, fit_seconds) where predictions is a DataFrame with the
+               actual Signal, the fold number and one column of out-of-sample
+               predicted signals per family, and fit_seconds maps each family to
+               its total refit time
+    """
+    df = df.dropna(subset=['Next_Close'])
+    families = list(families or list(MODEL_FAMILIES) + [ENSEMBLE])
+    base_families = [name for name in families if name != ENSEMBLE]
+    if not base_families:
+        # An ensemble on its own votes over every family
+        base_families = list(MODEL_FAMILIES)
+    unknown = set(base_families) - set(MODEL_FAMILIES)
+    if unknown:
+        raise ValueError(f"Unknown model families: {sorted(unknown)}")
+
+    data = FoldMatrices(df, train_window)
+    n_classes = len(data.label_encoder.classes_)
+    bounds = fold_bounds(len(data), train_window, retrain_every, expanding)
+    print(f"Walk-forward: {len(bounds)} folds, {train_window} bar window, refit every {retrain_every} bars"
+          + (" (warm start)" if warm_start else ""))
+
+    models = {}
+    fit_seconds = {name: 0.0 for name in base_families}
+    predicted = {name: np.empty(len(data) - train_window, dtype=np.int64) for name in families}
+    fold_ids = np.empty(len(data) - train_window, dtype=np.int64)
+
+    for fold, (train_start, train_end, test_end) in enumerate(bounds):
+        X_train, y_train = data.slice(train_start, train_end)
+        X_test, _ = data.slice(train_end, test_end)
+        out = slice(train_end - train_window, test_end - train_window)
+        fold_ids[out] = fold
+
+        if len(np.unique(y_train)) < n_classes:
+            # Warm starts and the soft vote need every class in the window
+            if not models:
+                raise ValueError("The first training window must contain every signal class")
+            print(f"Fold {fold}: window is missing a signal class, keeping the previous models")
+        else:
+            cold = not warm_start or not models or fold % full_refit_every == 0
+            for name in base_families:
+                make, fit, warm = MODEL_FAMILIES[name]
+                started = time.perf_counter()
+                if cold or warm is None:
+                    model = make(n_jobs)
+                    models[name] = fit(model, X_train, y_train) if fit else model.fit(X_train, y_train)
+                else:
+                    models[name] = warm(models[name], X_train, y_train)
+                fit_seconds[name] += time.perf_counter() - started
+
+        probabilities = {name: _aligned_proba(models[name], X_test, n_classes) for name in base_families}
+        for name in families:
+            if name == ENSEMBLE:
+                proba = np.mean([probabilities[member] for member in base_families], axis=0)
+            else:
+                proba = probabilities[name]
+            predicted[name][out] = proba.argmax(axis=1)
+
+    test_index = data.index[train_window:]
+    predictions = pd.DataFrame({'Actual': df['Signal'].to_numpy()[train_window:], 'Fold': fold_ids},
+                               index=test_index)
+    for name in families:
+        predictions[name] = data.label_encoder.inverse_transform(predicted[name])
+    return predictions, fit_seconds
+
+
+def summarize_walk_forward(df, predictions, fit_seconds=None, periods_per_year=365):
+    """
+    Out-of-sample accuracy and backtest metrics of every family, plus buy and hold
+
+    Returns:
+        DataFrame: One row per family with accuracy, refit seconds and the
+                   backtest.engine metrics
+    """
+    families = [column for column in predictions.columns if column not in ('Actual', 'Fold')]
+    returns = df['Next_Day_Return'].reindex(predictions.index).to_numpy()
+    positions = np.column_stack([signals_to_positions(predictions[families].to_numpy()),
+                                 np.ones(len(predictions))])
+    summary = summarize(run_backtest(returns, positions, periods_per_year=periods_per_year),
+                        families + ['Buy & Hold'])
+
+    actual = predictions['Actual'].to_numpy()
+    summary.insert(0, 'accuracy', [np.mean(predictions[name].to_numpy() == actual) for name in families] + [np.nan])
+    if fit_seconds is not None:
+        summary.insert(1, 'fit_seconds', [fit_seconds.get(name, np.nan) for name in families] + [np.nan])
+    return summary
+
+
+def main():
+    from data.cache import interval_to_timedelta
+    from data.fetch_data import fetch_crypto_data
+    from features.store import stored_features, training_columns
+    from labels.create_labels import generate_labels
+
+    parser = argparse.ArgumentParser(description='Walk-forward out-of-sample evaluation')
+    parser.add_argument('--ticker', default=TICKER)
+    parser.add_argument('--interval', default=INTERVAL)
+    parser.add_argument('--start', default=START_DATE)
+    parser.add_argument('--end', default=END_DATE)
+    parser.add_argument('--train-window', type=int, default=WALK_FORWARD_TRAIN_WINDOW)
+    parser.add_argument('--retrain-every', type=int, default=WALK_FORWARD_RETRAIN_EVERY)
+    parser.add_argument('--full-refit-every', type=int, default=WALK_FORWARD_FULL_REFIT_EVERY)
+    parser.add_argument('--families', nargs='+', default=None,
+                        help=f"Model families (default: all of {list(MODEL_FAMILIES) + [ENSEMBLE]})")
+    parser.add_argument('--no-warm-start', action='store_true', help='Refit every model from scratch')
+    parser.add_argument('--expanding', action='store_true', help='Expanding instead of rolling window')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--reports-dir', default=REPORTS_DIR)
+    args = parser.parse_args()
+
+    df = fetch_crypto_data(args.ticker, args.start, args.end, args.interval, compact=False)
+    df = generate_labels(stored_features(df, args.ticker, args.interval, columns=training_columns()))
+
+    started = time.perf_counter()
+    predictions, fit_seconds = walk_forward(
+        df, families=args.families, train_window=args.train_window, retrain_every=args.retrain_every,
+        full_refit_every=args.full_refit_every, warm_start=not args.no_warm_start,
+        expanding=args.expanding, n_jobs=args.n_jobs
+    )
+    print(f"Walk-forward finished in {time.perf_counter() - started:.1f}s")
+
+    periods_per_year = pd.Timedelta(days=365) / interval_to_timedelta(args.interval)
+    summary = summarize_walk_forward(df, predictions, fit_seconds, periods_per_year)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(summary)
+
+    os.makedirs(args.reports_dir, exist_ok=True)
+    predictions.to_csv(os.path.join(args.reports_dir, 'walk_forward_predictions.csv'))
+    summary.to_csv(os.path.join(args.reports_dir, 'walk_forward_summary.csv'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Train models for many (ticker, interval) jobs in parallel.
+
+Each job runs fetch -> features -> labels -> train -> evaluate and writes its
+bundle to <output>/<ticker>_<interval>/model (reports next to it). Jobs are
+spread over a process pool, and the CPU budget is split between the workers so
+the n_jobs=-1 style parallelism inside each job does not oversubscribe the cores.
+
+Usage:
+    python pipeline.py --intervals 1d 1h --workers 4 --cpus 16
+"""
+import argparse
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.config import SUPPORTED_COINS, START_DATE, END_DATE, JOBS_DIR, SEARCH_MODE, SEARCH_TIME_BUDGET
+
+
+def job_dir(output_root, ticker, interval):
+    """
+    Directory a (ticker, interval) job writes its bundle and reports to
+    """
+    return os.path.join(output_root, f"{ticker}_{interval}")
+
+
+def _limit_threads(threads):
+    """
+    Process pool initializer: cap native thread pools (BLAS/OpenMP) in the worker
+    """
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(threads)
+
+
+def run_job(ticker, interval, output_root=JOBS_DIR, threads=-1, start_date=START_DATE, end_date=END_DATE,
+            search=SEARCH_MODE, time_budget=SEARCH_TIME_BUDGET):
+    """
+    Run the full training pipeline for one ticker and interval
+
+    Returns:
+        dict: Job summary (ticker, interval, bundle directory, status and wall time)
+    """
+    from data.fetch_data import fetch_crypto_data
+    from features.store import stored_features, training_columns
+    from labels.create_labels import generate_labels
+    from model.train_model import train
+    from main import evaluate_model
+
+    started = time.perf_counter()
+    directory = job_dir(output_root, ticker, interval)
+    model_dir = os.path.join(directory, 'model')
+    reports_dir = os.path.join(directory, 'reports')
+
+    df = fetch_crypto_data(ticker, start_date, end_date, interval, compact=False)
+    if df.empty:
+        raise ValueError(f"No data for {ticker} ({interval})")
+    df = stored_features(df, ticker, interval, columns=training_columns())
+    df = generate_labels(df)
+    model = train(df, model_dir=model_dir, reports_dir=reports_dir, n_jobs=threads,
+                  search=search, time_budget=time_budget)
+    evaluate_model(df, model, model_dir=model_dir, reports_dir=reports_dir, interval=interval)
+
+    return {
+        'ticker': ticker,
+        'interval': interval,
+        'model_dir': model_dir,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def run_jobs(jobs, workers=None, cpus=None, output_root=JOBS_DIR, search=SEARCH_MODE, time_budget=SEARCH_TIME_BUDGET):
+    """
+    Run (ticker, interval) jobs over a process pool
+
+    Args:
+        jobs: List of (ticker, interval) tuples
+        workers: Number of worker processes (default: one per job, capped by cpus)
+        cpus: Total CPU budget shared by all workers (default: all cores)
+        output_root: Directory under which each job gets its own bundle directory
+        search, time_budget: Hyperparameter search mode and budget passed to train
+
+    Returns:
+        list: One summary dict per job, failed jobs carry an 'error' entry
+    """
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, min(workers or len(jobs), len(jobs), cpus))
+    threads = max(1, cpus // workers)
+    print(f"Running {len(jobs)} jobs on {workers} workers with {threads} threads each")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_limit_threads, initargs=(threads,)) as pool:
+        futures = {
+            pool.submit(run_job, ticker, interval, output_root, threads,
+                        search=search, time_budget=time_budget): (ticker, interval)
+            for ticker, interval in jobs
+        }
+        for future in as_completed(futures):
+            ticker, interval = futures[future]
+            try:
+                result = future.result()
+                print(f"Finished {ticker} ({interval}) in {result['seconds']:.1f}s")
+            except Exception as e:
+                traceback.print_exc()
+                result = {'ticker': ticker, 'interval': interval, 'error': str(e)}
+                print(f"Failed {ticker} ({interval}): {e}")
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train models for several tickers and intervals in parallel')
+    parser.add_argument('--tickers', nargs='+', default=list(SUPPORTED_COINS.values()),
+                        help='Yahoo Finance tickers (default: all supported coins)')
+    parser.add_argument('--intervals', nargs='+', default=['1d'], help='Bar intervals, e.g. 1d 1h')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes')
+    parser.add_argument('--cpus', type=int, default=None, help='Total CPU budget shared by the workers')
+    parser.add_argument('--output', default=JOBS_DIR, help='Root directory for the per-job bundles')
+    parser.add_argument('--search', default=SEARCH_MODE, choices=['grid', 'halving', 'halving-random'],
+                        help='Hyperparameter search mode')
+    parser.add_argument('--time-budget', type=float, default=SEARCH_TIME_BUDGET,
+                        help='Soft limit in seconds on the hyperparameter search per job: no new '
+                             'candidate batch or halving round starts after it, but running ones and '
+                             'the first of each search started in time always finish')
+    args = parser.parse_args()
+
+    jobs = [(ticker, interval) for ticker in args.tickers for interval in args.intervals]
+    results = run_jobs(jobs, workers=args.workers, cpus=args.cpus, output_root=args.output,
+                       search=args.search, time_budget=args.time_budget)
+
+    failed = [result for result in results if 'error' in result]
+    print(f"\n{len(results) - len(failed)} of {len(results)} jobs succeeded")
+    for result in failed:
+        print(f"  {result['ticker']} ({result['interval']}): {result['error']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Reporting stage: plots for a trained model bundle.
+
+Kept out of the training path so that training neither imports matplotlib nor
+refits the model for a learning curve. The learning curve is drawn from the
+cross-validation scores the hyperparameter searches already computed (saved as
+training_scores.json in the bundle); with full_learning_curve the best model is
+refitted over ten training sizes instead, as sklearn's learning_curve does.
+
+Usage (from the crypto_predictor directory):
+    python main.py report
+    python main.py report --full-learning-curve
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from model.registry import load_bundle, resolve_bundle_dir, OPTIONAL_BUNDLE_FILES
+from utils.config import MODEL_DIR, REPORTS_DIR
+
+
+def _pyplot():
+    # Imported on first use: matplotlib adds about a second to start-up
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def uncalibrated(model):
+    """
+    The fitted classifier inside a CalibratedClassifierCV (the model itself otherwise)
+    """
+    calibrated = getattr(model, 'calibrated_classifiers_', None)
+    if not calibrated:
+        return model
+    base = calibrated[0].estimator
+    # Calibrated after training: the classifier is wrapped in a FrozenEstimator
+    return getattr(base, 'estimator', base)
+
+
+def load_training_scores(model_dir=MODEL_DIR):
+    """
+    Test accuracies and search CV scores saved by train(), or None for bundles
+    trained before they were saved
+    """
+    path = os.path.join(resolve_bundle_dir(model_dir), OPTIONAL_BUNDLE_FILES['scores'])
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def plot_feature_importance(bundle, model_name, reports_dir=REPORTS_DIR):
+    """
+    Bar chart of the best model's feature importances (tree-based models only)
+
+    Returns:
+        str: Path of the plot, or None if the model has no feature importances
+    """
+    model = uncalibrated(bundle.model)
+    if not hasattr(model, 'feature_importances_'):
+        return None
+    plt = _pyplot()
+
+    importances = model.feature_importances_
+    indices = np.argsort(importances)[::-1]
+    features = bundle.features
+
+    plt.figure(figsize=(10, 6))
+    plt.title(f"Feature Importances ({model_name})")
+    plt.barh(range(len(indices)), importances[indices], align='center')
+    plt.yticks(range(len(indices)), [features[i] for i in indices])
+    plt.xlabel('Relative Importance')
+    path = os.path.join(reports_dir, 'feature_importance.png')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def plot_cv_learning_curve(scores, reports_dir=REPORTS_DIR):
+    """
+    Learning curve from the saved search CV scores: each TimeSeriesSplit fold
+    trains on more rows than the one before, so the best candidate's fold scores
+    trace training and validation accuracy against training size
+
+    Returns:
+        str: Path of the plot, or None if no family was tuned by a search
+    """
+    cv_scores = scores.get('cv_scores') or {}
+    if not cv_scores:
+        return None
+    plt = _pyplot()
+
+    best_model = scores['best_model']
+    # The best model's family first, drawn in the original colours
+    families = sorted(cv_scores, key=lambda name: name != best_model)
+
+    plt.figure(figsize=(10, 6))
+    for i, name in enumerate(families):
+        family = cv_scores[name]
+        highlighted = i == 0 and name == best_model
+        train_color, test_color = ('blue', 'green') if highlighted else (None, None)
+        width = 2 if highlighted else 1
+        test_line, = plt.plot(family['train_sizes'], family['test_scores'], marker='s', color=test_color,
+                              linewidth=width, label=f'{name} cross-validation score')
+        plt.plot(family['train_sizes'], family['train_scores'], marker='o', linestyle='--',
+                 color=train_color or test_line.get_color(), linewidth=width, label=f'{name} training score')
+
+    title = 'Learning Curve'
+    if best_model not in cv_scores:
+        title += f" (tuned models; best model: {best_model})"
+    plt.title(title)
+    plt.xlabel('Training Examples')
+    plt.ylabel('Accuracy Score')
+    plt.legend(loc='best', fontsize='small')
+    plt.grid(True)
+    path = os.path.join(reports_dir, 'learning_curve.png')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def plot_full_learning_curve(bundle, df, reports_dir=REPORTS_DIR, n_jobs=-1):
+    """
+    Learning curve that refits the best model on ten training sizes per
+    TimeSeriesSplit fold (50 fits; for the ensemble every member is refitted).
+    A calibrated model is refitted without its calibration.
+
+    Args:
+        bundle: Loaded ModelBundle
+        df: Labelled DataFrame the bundle was trained on
+    """
+    from sklearn.model_selection import learning_curve, TimeSeriesSplit
+    plt = _pyplot()
+
+    df = df.dropna(subset=['Next_Close'])
+    X_scaled = bundle.scaler.transform(bundle.pipeline.transform(df))
+    y_encoded = bundle.label_encoder.transform(df['Signal'])
+
+    train_sizes, train_scores, test_scores = learning_curve(
+        uncalibrated(bundle.model), X_scaled, y_encoded, cv=TimeSeriesSplit(n_splits=5), n_jobs=n_jobs,
+        train_sizes=np.linspace(0.1, 1.0, 10), scoring='accuracy'
+    )
+
+    train_mean = np.mean(train_scores, axis=1)
+    train_std = np.std(train_scores, axis=1)
+    test_mean = np.mean(test_scores, axis=1)
+    test_std = np.std(test_scores, axis=1)
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(train_sizes, train_mean, label='Training score', color='blue', marker='o')
+    plt.fill_between(train_sizes, train_mean - train_std, train_mean + train_std, alpha=0.15, color='blue')
+    plt.plot(train_sizes, test_mean, label='Cross-validation score', color='green', marker='s')
+    plt.fill_between(train_sizes, test_mean - test_std, test_mean + test_std, alpha=0.15, color='green')
+    plt.title('Learning Curve')
+    plt.xlabel('Training Examples')
+    plt.ylabel('Accuracy Score')
+    plt.legend(loc='lower right')
+    plt.grid(True)
+    path = os.path.join(reports_dir, 'learning_curve.png')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def plot_confusion_matrix(reports_dir=REPORTS_DIR):
+    """
+    Heatmap of reports/confusion_matrix.csv written by main.evaluate_model
+
+    Returns:
+        str: Path of the plot, or None if there is no confusion matrix yet
+    """
+    csv_path = os.path.join(reports_dir, 'confusion_matrix.csv')
+    if not os.path.exists(csv_path):
+        return None
+    import seaborn as sns
+    plt = _pyplot()
+
+    cm_df = pd.read_csv(csv_path, index_col=0)
+    plt.figure(figsize=(6, 5))
+    sns.heatmap(cm_df, annot=True, fmt='d', cmap='Blues')
+    plt.title('Confusion Matrix')
+    plt.xlabel('Predicted')
+    plt.ylabel('Actual')
+    path = os.path.join(reports_dir, 'confusion_matrix.png')
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def generate_reports(model_dir=MODEL_DIR, reports_dir=REPORTS_DIR, full_learning_curve=False, df=None,
+                     n_jobs=-1):
+    """
+    Draw the report plots for the bundle in model_dir
+
+    Args:
+        model_dir: Bundle directory
+        reports_dir: Directory the plots are written to
+        full_learning_curve: Refit the best model for the learning curve instead
+                             of using the saved CV scores (needs df)
+        df: Labelled DataFrame the bundle was trained on
+        n_jobs: Parallel jobs for the full learning curve
+
+    Returns:
+        list: Paths of the plots written
+    """
+    os.makedirs(reports_dir, exist_ok=True)
+    bundle = load_bundle(model_dir)
+    scores = load_training_scores(model_dir)
+    model_name = scores['best_model'] if scores else type(bundle.model).__name__
+
+    written = [plot_feature_importance(bundle, model_name, reports_dir)]
+    if full_learning_curve:
+        if df is None:
+            raise ValueError("The full learning curve needs the training DataFrame")
+        written.append(plot_full_learning_curve(bundle, df, reports_dir, n_jobs))
+    elif scores is None:
+        print("No training scores in the bundle (trained before they were saved); "
+              "use --full-learning-curve for a learning curve")
+    else:
+        learning_curve_path = plot_cv_learning_curve(scores, reports_dir)
+        if learning_curve_path is None:
+            print("No cross-validation scores were recorded (every search was skipped); "
+                  "use --full-learning-curve for a learning curve")
+        written.append(learning_curve_path)
+    written.append(plot_confusion_matrix(reports_dir))
+
+    written = [path for path in written if path is not None]
+    for path in written:
+        print(f"Wrote {path}")
+    return written
@@ -0,0 +1,181 @@
+"""
+Prediction logic shared by the Flask (api_service.py) and ASGI (asgi_service.py) services
+"""
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Add the repository root to the path so the crypto_predictor package resolves
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto_predictor.data.cache import OHLCVCache, interval_to_timedelta, default_end, is_intraday
+from crypto_predictor.features.store import FeatureStore, stored_features
+from crypto_predictor.model.predict_model import predict_latest_batch
+from crypto_predictor.model.registry import get_registry
+from crypto_predictor.utils.config import SUPPORTED_COINS, INFERENCE_BACKEND, INTERVAL, API_LOOKBACK_BARS
+from crypto_predictor.utils.prediction_cache import make_prediction_cache, candle_window
+
+# Local OHLCV cache: requests only download the bars that are not cached yet
+ohlcv_cache = OHLCVCache()
+
+# Feature store: requests only compute the indicators of bars it does not hold yet,
+# from the stored history (the same values training used)
+feature_store = FeatureStore()
+
+# Load the model bundle once; the registry hot-swaps it when training publishes a new one.
+# The 'lite' backend serves the NumPy-only export, so workers never import sklearn or xgboost
+registry = get_registry(backend=INFERENCE_BACKEND)
+if registry.get() is not None:
+    print("Model and related files loaded successfully")
+else:
+    print("Error loading model: no model bundle available")
+
+# Responses are reused until the current candle closes or a new model is published
+prediction_cache = make_prediction_cache()
+
+# The API serves the interval the model is trained on, and downloads enough bars of
+# it to compute the indicators for the latest bar
+SERVICE_INTERVAL = INTERVAL
+LOOKBACK = API_LOOKBACK_BARS * interval_to_timedelta(SERVICE_INTERVAL)
+DATE_FORMAT = '%Y-%m-%d %H:%M' if is_intraday(SERVICE_INTERVAL) else '%Y-%m-%d'
+
+# Columns build_response reads besides the model features
+RESPONSE_COLUMNS = ['Close', 'RSI', 'MACD', 'Volatility']
+
+# Time the service predicts at: None follows the system clock, a callable returning
+# a (UTC) Timestamp replaces it (benchmarks/replay.py replays history this way)
+clock = None
+
+def service_now():
+    """
+    The clock's current time, or None for the system clock
+    """
+    return clock() if clock is not None else None
+
+def fetch_recent_data(tickers):
+    """
+    Fetch the last API_LOOKBACK_BARS bars for several tickers in one go
+    
+    Returns:
+        dict: ticker -> OHLCV DataFrame
+    """
+    end = default_end(SERVICE_INTERVAL, service_now())
+    start_date = pd.Timestamp(end) - LOOKBACK
+    
+    print(f"Fetching data for {', '.join(tickers)} from {start_date} to {end}")
+    return ohlcv_cache.get_many(tickers, start_date, end, interval=SERVICE_INTERVAL)
+
+def prediction_key(coin_name, bundle):
+    """
+    Cache key for a coin's prediction and the seconds it stays valid
+    
+    The key changes when a new candle opens or a new model bundle is published.
+    """
+    candle_start, ttl = candle_window(SERVICE_INTERVAL, service_now())
+    return f"{coin_name}|{SERVICE_INTERVAL}|{candle_start.isoformat()}|{bundle.version}", ttl
+
+def feature_frame(coin_name, data, bundle=None):
+    """
+    Stored features for downloaded bars (appending the new ones first), limited to
+    the columns the bundle and the response use
+    """
+    features = list(bundle.features) if bundle is not None else []
+    columns = list(dict.fromkeys(features + RESPONSE_COLUMNS))
+    return stored_features(data, SUPPORTED_COINS[coin_name], SERVICE_INTERVAL, columns=columns, store=feature_store)
+
+def predict_from_data(coin_name, data, bundle):
+    """
+    Build features from downloaded bars and predict one coin (the CPU-bound part)
+    
+    Returns:
+        dict: The response payload, or None if there is no data
+    """
+    if data is None or data.empty:
+        return None
+    df = feature_frame(coin_name, data, bundle)
+    prediction, probabilities = predict_latest_batch({coin_name: df}, bundle)[coin_name]
+    return build_response(coin_name, df, prediction, probabilities)
+
+def predict_coin(coin_name, bundle):
+    """
+    Download, build features and predict one coin
+    
+    Returns:
+        dict: The response payload, or None if no data could be fetched
+    """
+    ticker = SUPPORTED_COINS[coin_name]
+    return predict_from_data(coin_name, fetch_recent_data([ticker]).get(ticker), bundle)
+
+def build_response(coin_name, df, prediction, probabilities):
+    """
+    Build the JSON payload for one coin's prediction
+    """
+    latest_data = df.iloc[-1]
+    
+    # Calculate confidence score (highest probability)
+    confidence_score = int(max(probabilities.values()) * 100)
+    # Below ABSTAIN_THRESHOLD the prediction is Hold instead of the most probable class
+    abstained = prediction != max(probabilities, key=probabilities.get)
+    
+    # Create the response
+    historical_prices = df['Close'].tolist()[-8:]  # Last 8 bars of prices
+    dates = [d.strftime(DATE_FORMAT) for d in df.index.tolist()[-8:]]  # Last 8 bars
+    
+    # Predicted price - simple projection based on trend
+    last_price = historical_prices[-1]
+    if prediction == 'Buy':
+        # Project slight increase
+        predicted_prices = [None, None, None, None, None, 
+                           last_price * 1.01, 
+                           last_price * 1.02, 
+                           last_price * 1.025]
+    elif prediction == 'Sell':
+        # Project slight decrease
+        predicted_prices = [None, None, None, None, None, 
+                           last_price * 0.99, 
+                           last_price * 0.98, 
+                           last_price * 0.975]
+    else:  # Hold
+        # Project stability
+        predicted_prices = [None, None, None, None, None, 
+                           last_price * 1.003, 
+                           last_price * 1.005, 
+                           last_price * 1.002]
+    
+    return {
+        'coinName': coin_name,
+        'predictedTrend': prediction,
+        'confidenceScore': confidence_score,
+        'probabilities': {label: round(float(p), 4) for label, p in probabilities.items()},
+        'abstained': bool(abstained),
+        'currentPrice': latest_data['Close'],
+        'rsi': round(latest_data['RSI'], 2) if 'RSI' in latest_data else None,
+        'macd': round(latest_data['MACD'], 4) if 'MACD' in latest_data else None,
+        'volatility': round(latest_data['Volatility'], 4) if 'Volatility' in latest_data else None,
+        'historicalData': {
+            'dates': dates,
+            'prices': historical_prices,
+            'predicted': predicted_prices
+        },
+        'timestamp': datetime.now().isoformat()
+    }
+
+def mock_response(coin_name, df):
+    """
+    Random prediction used when no model bundle is loaded
+    """
+    trends = ['Buy', 'Hold', 'Sell']
+    trend = trends[np.random.randint(0, len(trends))]
+    confidence = np.random.randint(60, 100)
+    
+    return {
+        'coinName': coin_name,
+        'predictedTrend': trend,
+        'confidenceScore': confidence,
+        'currentPrice': df.iloc[-1]['Close'],
+        'timestamp': datetime.now().isoformat(),
+        'note': 'Model not loaded - using mock prediction'
+    }
@@ -0,0 +1,45 @@
+"""
+Compact dtypes for the fetch -> features -> labels frames (COMPACT_DTYPES in utils/config.py).
+
+Prices, indicators and returns are stored as float32, Volume as the smallest
+unsigned integer type that holds it, and Signal as a categorical (int8 codes),
+which roughly halves the memory of the labelled frame.
+Indicators are still computed in float64 from the float32 prices; only the
+stored results are rounded to float32.
+
+Error bound: rounding Close to float32 changes it by at most 2**-24 relative, so
+the price-level indicators (MA14, MA50, MACD, MACD_Signal, MACD_Hist, Volatility)
+stay within 2**-23 * max|Close| of the float64 pipeline and Price_Change within
+2**-22 absolute. RSI depends on bar-to-bar differences, which lose relatively more
+precision on small moves: it stays within 0.01 points on minute bars. Labels only
+differ where two indicators are within that error of each other (about 1 bar in
+100,000 on minute data); benchmarks/bench_memory.py measures all of this.
+"""
+import numpy as np
+import pandas as pd
+
+FLOAT_DTYPE = np.float32
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+
+def compact_ohlcv(df):
+    """
+    Convert OHLCV columns to compact dtypes in place and return df
+
+    Volume is rounded to whole units; missing volume becomes 0, as add_features
+    would fill it anyway.
+    """
+    for column in PRICE_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(FLOAT_DTYPE)
+    if 'Volume' in df.columns:
+        volume = df['Volume'].fillna(0).round()
+        df['Volume'] = pd.to_numeric(volume.astype(np.uint64), downcast='unsigned')
+    return df
+
+
+def compact_float(series):
+    """
+    A float64 working Series rounded to the compact float dtype
+    """
+    return series.astype(FLOAT_DTYPE)
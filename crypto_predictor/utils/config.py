@@ -1,13 +1,118 @@
+import os
+
 # Configuration file
 TICKER = 'BTC-USD'  # Bitcoin by default
 START_DATE = '2020-01-01'  # Extended timeframe for more historical data
 END_DATE = None  # None will fetch data up to today
-INTERVAL = '1d'  # Daily data
+INTERVAL = '1d'  # Bar interval: '1d' (daily), or intraday such as '1h', '5m', '1m'
+
+# Indicator windows, in bars of the interval
+MA_SHORT_WINDOW = 14
+MA_LONG_WINDOW = 50
+RSI_WINDOW = 14
+MACD_FAST_SPAN = 12
+MACD_SLOW_SPAN = 26
+MACD_SIGNAL_SPAN = 9
+VOLATILITY_WINDOW = 14
+
+# Extended indicator set (features/kernels.py): Bollinger bands, average true range,
+# windowed on-balance volume and the stochastic oscillator, also used as model features
+EXTENDED_INDICATORS = False
+BOLLINGER_WINDOW = 20
+BOLLINGER_STD = 2
+ATR_WINDOW = 14
+OBV_WINDOW = 20
+STOCH_WINDOW = 14
+STOCH_SMOOTH = 3
+
+# Yahoo Finance limits for intraday bars, in days: the longest range a single request
+# may span, and how far back the history goes. Longer ranges are downloaded in chunks;
+# intervals that are not listed have no limit.
+PROVIDER_MAX_REQUEST_DAYS = {'1m': 7, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '90m': 59,
+                             '60m': 729, '1h': 729}
+PROVIDER_HISTORY_DAYS = {'1m': 29, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '90m': 59,
+                         '60m': 729, '1h': 729}
+PROVIDER_TIMEOUT = 20  # Seconds before a single Yahoo Finance request is abandoned
 
 # Model Parameters
 TEST_SIZE = 0.2
 RANDOM_STATE = 42
+SEARCH_MODE = 'grid'  # 'grid' (exhaustive) or 'halving' (successive halving, much faster)
+# Soft limit in seconds on hyperparameter search (None for no limit): no candidate batch or
+# halving round starts after it and later families keep their defaults; running batches and
+# the first batch or round of each search started in time still finish
+SEARCH_TIME_BUDGET = None
+
+# Training execution (model/execution.py): threads each fit of a family's search uses
+# (the search runs cores // threads fits at once), and the size of the fit cache
+ESTIMATOR_THREADS = {'Random Forest': 1, 'XGBoost': 4, 'Gradient Boosting': 1}
+FIT_CACHE_BYTES_LIMIT = '2G'
+
+# Probability calibration: the most recent CALIBRATION_FRACTION of the training rows are
+# held out, the SVM is Platt-scaled on them and the chosen model is calibrated on them
+# with CALIBRATION_METHOD ('sigmoid', 'isotonic' (needs about 1000+ rows) or None)
+CALIBRATION_METHOD = 'sigmoid'
+CALIBRATION_FRACTION = 0.1
+
+# Predictions whose highest class probability is below this are returned as 'Hold'
+# (None always returns the most probable class)
+ABSTAIN_THRESHOLD = None
+
+# Walk-forward evaluation (model/walk_forward.py), in bars
+WALK_FORWARD_TRAIN_WINDOW = 730  # Training window length
+WALK_FORWARD_RETRAIN_EVERY = 30  # Bars predicted out of sample between refits
+WALK_FORWARD_FULL_REFIT_EVERY = 6  # Every n-th refit starts from scratch instead of warm-starting
+
+# Model bundles kept in the artifact store (model/artifact_store.py); older ones are deleted
+ARTIFACT_STORE_KEEP = 10
+
+# Store prices/indicators as float32, Volume as integer and Signal as categorical
+# (about half the memory; error bound documented in utils/compact.py)
+COMPACT_DTYPES = False
 
 # Trading Parameters
 RSI_OVERSOLD = 30
 RSI_OVERBOUGHT = 70
+
+# Prediction logging: 'csv', 'parquet' or 'sqlite' (WAL mode, best with several workers)
+PREDICTION_LOG_BACKEND = 'csv'
+
+# API model runtime: 'lite' (NumPy-only export, fast worker start) or 'sklearn' (pickled estimators).
+# Bundles without an export are served with the pickles either way.
+INFERENCE_BACKEND = 'lite'
+
+# API prediction cache: 'memory' (per worker, LRU) or 'redis' (shared, needs the redis package)
+PREDICTION_CACHE_BACKEND = 'memory'
+PREDICTION_CACHE_MAX_ENTRIES = 1024
+REDIS_URL = 'redis://localhost:6379/0'
+
+# Bars of history the API downloads to compute the indicators for the latest bar
+# (at least MA_LONG_WINDOW)
+API_LOOKBACK_BARS = 60
+
+# ASGI service (asgi_service.py)
+API_FETCH_CONCURRENCY = 8  # Downloads in flight at once
+API_FETCH_TIMEOUT = 30  # Seconds a download may run before it is reported as failed
+API_INFERENCE_WORKERS = os.cpu_count() or 1  # Threads running features and predict_proba
+
+# Paths (anchored at the crypto_predictor directory so they work from any cwd)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, 'data', 'cache')  # Local OHLCV cache
+FEATURE_STORE_DIR = os.path.join(BASE_DIR, 'data', 'features')  # Stored features (features/store.py)
+MODEL_DIR = os.path.join(BASE_DIR, 'model', 'saved')  # Trained model bundle
+REPORTS_DIR = os.path.join(BASE_DIR, 'reports')  # Evaluation reports and plots
+LOG_DIR = os.path.join(BASE_DIR, 'logs')  # Prediction logs
+JOBS_DIR = os.path.join(MODEL_DIR, 'jobs')  # Per ticker/interval bundles from pipeline.py
+FIT_CACHE_DIR = os.path.join(BASE_DIR, 'model', 'fit_cache')  # Cached search fits (None to disable)
+
+# Dictionary of supported cryptocurrencies and their Yahoo Finance tickers
+SUPPORTED_COINS = {
+    'Bitcoin': 'BTC-USD',
+    'Ethereum': 'ETH-USD',
+    'Cardano': 'ADA-USD',
+    'Solana': 'SOL-USD',
+    'Binance Coin': 'BNB-USD',
+    'XRP': 'XRP-USD',
+    'Dogecoin': 'DOGE-USD',
+    'Polkadot': 'DOT-USD'
+}
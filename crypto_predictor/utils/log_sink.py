@@ -0,0 +1,226 @@
+import atexit
+import csv
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: CSV appends are not locked across processes
+    fcntl = None
+
+from utils.config import LOG_DIR, PREDICTION_LOG_BACKEND
+
+# Column order of the prediction log
+LOG_FIELDS = ['Date', 'Close', 'RSI', 'MACD', 'Volatility', 'Action']
+
+
+class CSVBackend:
+    """
+    Appends batches to a CSV file under an exclusive file lock, so several
+    worker processes can share one log
+    """
+
+    def __init__(self, path, fields=LOG_FIELDS):
+        self.path = path
+        self.fields = fields
+
+    def write(self, records):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', newline='') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                writer = csv.DictWriter(f, fieldnames=self.fields, extrasaction='ignore')
+                # The offset from open() predates the lock: another process may have
+                # written the header since
+                if f.seek(0, os.SEEK_END) == 0:
+                    writer.writeheader()
+                writer.writerows(records)
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def close(self):
+        pass
+
+
+class ParquetBackend:
+    """
+    Writes every batch as its own Parquet file in a directory (readable as one
+    dataset with pandas.read_parquet(directory))
+    """
+
+    def __init__(self, directory, fields=LOG_FIELDS):
+        self.directory = directory
+        self.fields = fields
+
+    def write(self, records):
+        import pandas as pd
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        path = os.path.join(self.directory, f"part-{stamp}-{os.getpid()}.parquet")
+        pd.DataFrame.from_records(records, columns=self.fields).to_parquet(f"{path}.tmp", engine='pyarrow', index=False)
+        os.replace(f"{path}.tmp", path)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Inserts batches into a SQLite table in WAL mode, which lets many writers and
+    readers share the database without blocking each other for long
+    """
+
+    def __init__(self, path, fields=LOG_FIELDS, table='predictions'):
+        self.path = path
+        self.fields = fields
+        self.table = table
+        self._connection = None
+
+    def _connect(self):
+        # Opened lazily so the connection belongs to the flushing thread
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            columns = ', '.join(f'"{field}"' for field in self.fields)
+            self._connection.execute(f'CREATE TABLE IF NOT EXISTS {self.table} ({columns})')
+        return self._connection
+
+    def write(self, records):
+        connection = self._connect()
+        placeholders = ', '.join('?' for _ in self.fields)
+        rows = [tuple(_sql_value(record.get(field)) for field in self.fields) for record in records]
+        with connection:
+            connection.executemany(f'INSERT INTO {self.table} VALUES ({placeholders})', rows)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _sql_value(value):
+    # numpy scalars are not understood by sqlite3
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class PredictionLogSink:
+    """
+    Queues log records in memory and writes them in batches from a background thread.
+
+    log() only appends to a queue; the thread flushes whenever max_batch records
+    are waiting or flush_interval seconds have passed since the first unflushed
+    record. Pending records are flushed on close(), which runs at interpreter exit.
+    """
+
+    def __init__(self, backend, max_batch=256, flush_interval=1.0):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='prediction-log-sink', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record):
+        """
+        Queue one record (a dict keyed by the backend's fields)
+        """
+        if not self._closed:
+            self._queue.put(record)
+
+    def flush(self, timeout=None):
+        """
+        Block until every record queued so far has been written
+        """
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """
+        Flush what is pending and stop the background thread
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self.backend.close()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.backend.write(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} prediction log records: {e}")
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+
+            if isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.max_batch:
+                    continue
+
+            # Batch full, interval elapsed, flush requested or shutting down
+            self._write(batch)
+            batch = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+
+def make_backend(kind=PREDICTION_LOG_BACKEND, log_dir=LOG_DIR):
+    """
+    Backend for the prediction log: 'csv', 'parquet' or 'sqlite'
+    """
+    if kind == 'csv':
+        return CSVBackend(os.path.join(log_dir, 'predictions_log.csv'))
+    if kind == 'parquet':
+        return ParquetBackend(os.path.join(log_dir, 'predictions'))
+    if kind == 'sqlite':
+        return SQLiteBackend(os.path.join(log_dir, 'predictions.db'))
+    raise ValueError(f"Unknown prediction log backend: {kind}")
+
+
+_default_sink = None
+_default_sink_lock = threading.Lock()
+
+
+def get_prediction_sink():
+    """
+    Process-wide prediction log sink using PREDICTION_LOG_BACKEND
+    """
+    global _default_sink
+    if _default_sink is None:
+        with _default_sink_lock:
+            if _default_sink is None:
+                _default_sink = PredictionLogSink(make_backend())
+    return _default_sink
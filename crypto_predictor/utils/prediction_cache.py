@@ -0,0 +1,245 @@
+"""
+Cache for API predictions.
+
+A prediction only changes when a new candle opens (or a new model is published),
+so responses are cached under (coin, interval, start of the current candle,
+model version) until the candle ends. Concurrent requests for a key that is
+being computed wait for that one computation instead of each downloading data.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from data.cache import interval_to_timedelta
+from utils.config import PREDICTION_CACHE_BACKEND, PREDICTION_CACHE_MAX_ENTRIES, REDIS_URL
+
+# Daily and intraday candles are aligned to the epoch, weekly ones to Mondays
+EPOCH = pd.Timestamp('1970-01-01', tz='UTC')
+WEEK_EPOCH = pd.Timestamp('1970-01-05', tz='UTC')
+
+
+def candle_window(interval, now=None):
+    """
+    Start of the candle that is currently forming and the seconds until it ends
+
+    Args:
+        interval: Yahoo Finance interval ('5m', '1h', '1d', '1wk', '1mo', ...)
+        now: Reference time (default: the current UTC time)
+
+    Returns:
+        tuple: (candle start as a UTC Timestamp, seconds until the next candle)
+    """
+    now = pd.Timestamp(now or datetime.now(timezone.utc))
+    now = now.tz_localize('UTC') if now.tzinfo is None else now.tz_convert('UTC')
+
+    if interval.endswith('mo'):
+        months = int(interval[:-2])
+        first_month = (now.month - 1) // months * months + 1
+        start = pd.Timestamp(year=now.year, month=first_month, day=1, tz='UTC')
+        end = start + pd.DateOffset(months=months)
+    else:
+        length = interval_to_timedelta(interval)
+        anchor = WEEK_EPOCH if interval.endswith('wk') else EPOCH
+        start = anchor + ((now - anchor) // length) * length
+        end = start + length
+    return start, (end - now).total_seconds()
+
+
+class MemoryBackend:
+    """
+    In-process LRU store with per-entry expiry
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Shared store for several API workers. Values are stored as JSON with a Redis
+    expiry, so any client with get(name) and set(name, value, ex=seconds) works
+    (redis.Redis, or a local fake).
+    """
+
+    def __init__(self, client, prefix='prediction:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        payload = self.client.get(self.prefix + key)
+        return None if payload is None else json.loads(payload)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+
+class _Flight:
+    """
+    A computation other requests for the same key can wait on
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PredictionCache:
+    """
+    Read-through cache with request coalescing and hit/miss counters.
+
+    get_or_compute() returns the cached value for a key, or runs `compute` once
+    while concurrent callers for the same key wait for its result;
+    get_or_compute_async() does the same for coroutines on one event loop.
+    Coalescing is per process; with a RedisBackend the cached values are shared
+    between processes.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute, ttl):
+        """
+        Args:
+            key: Cache key (a string)
+            compute: Callable returning a JSON-serialisable value
+            ttl: Seconds the computed value stays valid
+
+        Returns:
+            The cached or freshly computed value
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self._count('coalesced')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        self._count('misses')
+        try:
+            flight.value = compute()
+            if flight.value is not None:
+                self.backend.set(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def get_or_compute_async(self, key, compute, ttl):
+        """
+        get_or_compute for asyncio: `compute` is a coroutine function, and
+        concurrent callers await the in-flight task instead of blocking the loop
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            self._count('coalesced')
+            # Shielded so a cancelled waiter does not cancel the shared computation
+            return await asyncio.shield(flight)
+
+        async def compute_and_store():
+            value = await compute()
+            if value is not None:
+                self.backend.set(key, value, ttl)
+            return value
+
+        self._count('misses')
+        # A task, so the computation finishes for the waiters even if this caller is cancelled
+        flight = self._async_flights[key] = asyncio.ensure_future(compute_and_store())
+        flight.add_done_callback(lambda _: self._async_flights.pop(key, None))
+        return await asyncio.shield(flight)
+
+    def get(self, key):
+        """
+        Cached value for key or None, counted as a hit or miss
+        """
+        value = self.backend.get(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value, ttl):
+        self.backend.set(key, value, ttl)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """
+        Hit/miss counters; coalesced requests waited on another request's computation
+        """
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': (self.hits + self.coalesced) / requests if requests else 0.0,
+            }
+
+
+def make_prediction_cache(kind=PREDICTION_CACHE_BACKEND, redis_url=REDIS_URL):
+    """
+    Prediction cache with a 'memory' or 'redis' backend (the redis package is only
+    needed for the latter)
+    """
+    if kind == 'memory':
+        return PredictionCache(MemoryBackend())
+    if kind == 'redis':
+        import redis
+        return PredictionCache(RedisBackend(redis.Redis.from_url(redis_url)))
+    raise ValueError(f"Unknown prediction cache backend: {kind}")
@@ -0,0 +1,168 @@
+"""
+Per-stage timing and memory profile of a pipeline run.
+
+Code marks its stages with `with profiler.stage('name'):`; stages can be nested
+(the model families inside training, for example). While the profiler is
+disabled, which is the default, stage() hands out one shared no-op context
+manager, so instrumented code costs an attribute lookup per stage.
+
+Each stage records wall time, CPU time of this process (work done in joblib
+worker processes is not included), the resident set size at its end and how
+far the process' peak RSS grew during it, and with trace_allocations the peak
+of Python allocations above the level at the start of the stage (tracemalloc
+slows allocation-heavy code down, so it is a separate switch).
+"""
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: no RSS figures
+    resource = None
+
+from utils.config import REPORTS_DIR
+
+PROFILE_REPORT_FILE = 'profile.json'
+
+_DISABLED = nullcontext()
+
+
+def _rss_mb():
+    """
+    Current and peak resident set size in MB (None where unavailable)
+    """
+    if resource is None:
+        return None, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        current = None
+    return current, peak
+
+
+class StageProfiler:
+    """
+    Records a list of stage measurements in the order the stages finished
+    """
+
+    def __init__(self, enabled=False, trace_allocations=False):
+        self.records = []
+        self.enabled = False
+        self.trace_allocations = False
+        self._open = []
+        if enabled:
+            self.enable(trace_allocations)
+
+    def enable(self, trace_allocations=False):
+        self.enabled = True
+        self.trace_allocations = trace_allocations
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        if self.trace_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.enabled = False
+        self.trace_allocations = False
+
+    def stage(self, name):
+        """
+        Context manager measuring the enclosed block as stage `name`
+        """
+        if not self.enabled:
+            return _DISABLED
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name):
+        frame = {'name': name, 'depth': len(self._open), 'traced_peak': 0}
+        if self.trace_allocations:
+            # The enclosing stages keep the peak reached so far, then each stage
+            # tracks its own from here
+            current, peak = tracemalloc.get_traced_memory()
+            for parent in self._open:
+                parent['traced_peak'] = max(parent['traced_peak'], peak)
+            tracemalloc.reset_peak()
+            frame['traced_start'] = current
+        _, peak_rss_start = _rss_mb()
+        self._open.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self._open.pop()
+            rss, peak_rss = _rss_mb()
+            record = {
+                'stage': name,
+                'depth': frame['depth'],
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                'rss_mb': rss,
+                'peak_rss_mb': peak_rss,
+                'peak_rss_growth_mb': None if peak_rss is None else peak_rss - peak_rss_start,
+            }
+            if self.trace_allocations:
+                traced_peak = max(frame['traced_peak'], tracemalloc.get_traced_memory()[1])
+                for parent in self._open:
+                    parent['traced_peak'] = max(parent['traced_peak'], traced_peak)
+                tracemalloc.reset_peak()
+                record['traced_peak_mb'] = (traced_peak - frame['traced_start']) / 2**20
+            self.records.append(record)
+
+    def ordered_records(self):
+        """
+        Records in the order the stages started (parents before their children)
+        """
+        ordered = []
+        pending = {}
+        # A stage finishes after its children, which are pending until then
+        for record in self.records:
+            children = pending.pop(record['depth'] + 1, [])
+            pending.setdefault(record['depth'], []).extend([record] + children)
+        for depth in sorted(pending):
+            ordered.extend(pending[depth])
+        return ordered
+
+    def summary(self):
+        """
+        Table of the recorded stages, children indented under their parent
+        """
+        header = f"{'Stage':<36} {'Wall':>9} {'CPU':>9} {'RSS':>9} {'Peak RSS':>9}"
+        lines = [header + (f" {'Alloc peak':>10}" if self.trace_allocations else '')]
+        for record in self.ordered_records():
+            name = '  ' * record['depth'] + record['stage']
+            rss = '' if record['rss_mb'] is None else f"{record['rss_mb']:.0f} MB"
+            peak = '' if record['peak_rss_mb'] is None else f"{record['peak_rss_mb']:.0f} MB"
+            line = f"{name:<36} {record['wall_seconds']:8.2f}s {record['cpu_seconds']:8.2f}s {rss:>9} {peak:>9}"
+            if 'traced_peak_mb' in record:
+                line += f" {record['traced_peak_mb']:7.1f} MB"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def write_report(self, reports_dir=REPORTS_DIR, filename=PROFILE_REPORT_FILE):
+        """
+        Write the records as JSON and return the file path
+        """
+        os.makedirs(reports_dir, exist_ok=True)
+        path = os.path.join(reports_dir, filename)
+        report = {
+            'created': datetime.now().isoformat(),
+            'trace_allocations': self.trace_allocations,
+            'stages': self.ordered_records(),
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return path
+
+
+# Shared profiler: enabled by main.py --profile, used by the pipeline stages
+profiler = StageProfiler()